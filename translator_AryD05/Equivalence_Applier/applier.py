@@ -5,93 +5,1029 @@ It uses a complexity-based approach to generate equivalent formulae within speci
 
 
 
-from Formula.structure import Formula, And, Or, Not, Implication, Biconditional, Variable, Truth, Falsity, Next, Finally, Globally, Until, Release
+import heapq
+import threading
+import time
+from collections import deque, OrderedDict
+from functools import lru_cache
+from concurrent.futures import ProcessPoolExecutor
+from Formula.structure import interned_count, Formula, And, Or, Not, Implication, Biconditional, Variable, Truth, Falsity, Next, Finally, Globally, Until, Release
 from Formula.parser import parse_formula
-from .equivalences import EQUIVALENCES
-from typing import List, Callable, Tuple
+from Formula.serialization import encode_formulae, decode_formulae
+from Formula.canonical import ac_canonical
+from .equivalences import EQUIVALENCES, EQUIVALENCES_BY_OPERATION, AC_EQUIVALENCES, index_equivalences
+from .egraph import iter_egraph_equivalences
+from .filter import operator_mask
+from typing import Iterator, List, Callable, Tuple, Optional, Iterable
+
+
+# Largest number of equivalence tuples other than EQUIVALENCES whose index, or whose
+# tuple without AC_EQUIVALENCES, is kept
+EQUIVALENCE_TUPLES = 32
+
+
+@lru_cache(maxsize=EQUIVALENCE_TUPLES)
+def _index(equivalences: Tuple[Callable[[Formula], Formula]]):
+    return index_equivalences(equivalences)
+
+
+def equivalence_index(equivalences: Tuple[Callable[[Formula], Formula]]):
+    '''
+    Return the root-operation index of a tuple of equivalences, building it on first use.
+
+    @param equivalences: A tuple of equivalence functions
+    @return: A dictionary from each operation to the equivalences applicable at that root
+    '''
+
+    # This is called for every node rewritten, so the default equivalences are recognised
+    # by identity rather than by hashing the whole tuple
+    if equivalences is EQUIVALENCES:
+        return EQUIVALENCES_BY_OPERATION
+    return _index(tuple(equivalences))
+
+
+class DispatchCounter:
+    '''
+    Counts the equivalence calls made, and skipped thanks to root-operation dispatch,
+    while applying equivalences.
+    '''
+
+    def __init__(self):
+        self.invoked = 0
+        self.skipped = 0
+
+    def rewrite(self, formula: Formula, applicable: Tuple[Callable[[Formula], Formula]]) -> List[Formula]:
+        '''
+        Call equivalences on a formula, counting the calls.
+
+        @param formula: The formula to rewrite
+        @param applicable: The equivalences registered for the root operation of the formula
+        @return: The formulae the equivalences changed the formula into
+        '''
+
+        self.invoked += len(applicable)
+        results = []
+        for equivalence in applicable:
+            new_formula = equivalence(formula)
+            if new_formula != formula:
+                results.append(new_formula)
+        return results
+
+    def __repr__(self):
+        return f"DispatchCounter(invoked={self.invoked}, skipped={self.skipped})"
+
+
+class RuleStats:
+    '''
+    What a RuleProfile recorded about one equivalence: the calls made to it, the calls that
+    changed the formula, the calls producing a formula no equivalence had produced before
+    in the profile, and the seconds spent in it.
+    '''
+
+    __slots__ = ('calls', 'changed', 'new', 'seconds')
+
+    def __init__(self):
+        self.calls = 0
+        self.changed = 0
+        self.new = 0
+        self.seconds = 0.0
+
+    def __repr__(self):
+        return f"RuleStats(calls={self.calls}, changed={self.changed}, new={self.new}, seconds={self.seconds:.6f})"
+
+
+class RuleProfile(DispatchCounter):
+    '''
+    A DispatchCounter that also profiles each equivalence, to find the rules a search spends
+    its time in and those that rarely produce anything new. Pass one as the counter of
+    iter_equivalences or apply_equivalences, then read rules or report(). Timing every call
+    slows the search down, so only pass one when profiling.
+
+    Calls answered from a RewriteMemo are not made, and so not recorded. The egraph engine
+    and parallel workers do not call equivalences in this process and cannot be profiled.
+    '''
+
+    def __init__(self):
+        super().__init__()
+        # RuleStats by the name of the equivalence
+        self.rules = {}
+        self._produced = set()
+
+    def rewrite(self, formula: Formula, applicable: Tuple[Callable[[Formula], Formula]]) -> List[Formula]:
+        self.invoked += len(applicable)
+        results = []
+        for equivalence in applicable:
+            stats = self.rules.get(equivalence.__name__)
+            if stats is None:
+                stats = self.rules[equivalence.__name__] = RuleStats()
+            start = time.perf_counter()
+            new_formula = equivalence(formula)
+            stats.seconds += time.perf_counter() - start
+            stats.calls += 1
+            if new_formula != formula:
+                stats.changed += 1
+                results.append(new_formula)
+                if new_formula not in self._produced:
+                    self._produced.add(new_formula)
+                    stats.new += 1
+        return results
+
+    def report(self) -> List[dict]:
+        '''
+        @return: A dictionary for each equivalence called, with its name under 'rule' and its
+                 calls, changed, new and seconds, slowest first
+        '''
+
+        rows = [{'rule': name, 'calls': stats.calls, 'changed': stats.changed, 'new': stats.new, 'seconds': stats.seconds}
+                for name, stats in self.rules.items()]
+        return sorted(rows, key=lambda row: (-row['seconds'], row['rule']))
+
+    def __repr__(self):
+        return f"RuleProfile(rules={len(self.rules)}, invoked={self.invoked}, skipped={self.skipped})"
+
+
+# Largest number of formulae, summed over all entries, a RewriteMemo holds by default
+REWRITE_MEMO_SIZE = 1000000
+
+
+class RewriteMemo:
+    '''
+    A bounded memo of the variants a rewriting mode generates for a subformula. The
+    variants only depend on the subformula and on how many levels below it may still be
+    rewritten, and formulae are hash-consed, so a subtree that appears in many formulae
+    of a search (e.g. A or !B) is rewritten once. The formulae a search expands are not
+    memoised themselves, as each is only expanded once. One memo is shared by the whole
+    of a search, and can be passed to further searches to share it across them. When the
+    memo holds more than max_formulae formulae, the least recently used entries are evicted.
+    A memo is not thread-safe.
+    '''
+
+    def __init__(self, max_formulae: int = REWRITE_MEMO_SIZE):
+        self.max_formulae = max_formulae
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.size = 0
+        self._entries = OrderedDict()
+        # The equivalence tuples used in keys, by id, kept so that their ids are not reused
+        self._equivalences = {}
+
+
+    def __repr__(self):
+        return (f"RewriteMemo(entries={len(self._entries)}, formulae={self.size}, hits={self.hits}, "
+                f"misses={self.misses}, hit_rate={self.hit_rate:.2%})")
+
+
+    def __len__(self):
+        return len(self._entries)
+
+
+    @property
+    def hit_rate(self) -> float:
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups else 0.0
+
+
+    def get(self, rewrite: Callable, equivalences: Tuple[Callable[[Formula], Formula]], formula: Formula, remaining: int) -> Optional[List[Formula]]:
+        '''
+        Look up the variants of a subformula, counting a hit or a miss.
+
+        @param rewrite: The rewriting function that generated the variants
+        @param equivalences: The tuple of equivalence functions applied
+        @param formula: The subformula
+        @param remaining: The number of levels below the subformula that may be rewritten
+        @return: The list of variants, which must not be modified, or None if not memoised
+        '''
+
+        key = (rewrite, id(equivalences), formula, remaining)
+        results = self._entries.get(key)
+        if results is None:
+            self.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return results
+
+
+    def put(self, rewrite: Callable, equivalences: Tuple[Callable[[Formula], Formula]], formula: Formula, remaining: int, results: List[Formula]):
+        '''
+        Memoise the variants of a subformula, evicting least recently used entries to stay
+        within max_formulae.
+
+        @param rewrite: The rewriting function that generated the variants
+        @param equivalences: The tuple of equivalence functions applied
+        @param formula: The subformula
+        @param remaining: The number of levels below the subformula that may be rewritten
+        @param results: The list of variants
+        '''
+
+        # Each entry counts as one more than its number of variants, so that entries with
+        # no variants are bounded too
+        if len(results) + 1 > self.max_formulae:
+            return
+        self._equivalences[id(equivalences)] = equivalences
+        key = (rewrite, id(equivalences), formula, remaining)
+        previous = self._entries.pop(key, None)
+        if previous is not None:
+            self.size -= len(previous) + 1
+        self._entries[key] = results
+        self.size += len(results) + 1
+        while self.size > self.max_formulae:
+            evicted = self._entries.popitem(last=False)[1]
+            self.size -= len(evicted) + 1
+            self.evictions += 1
+
+
+    def clear(self):
+        '''
+        Remove every entry and reset the statistics.
+        '''
+
+        self._entries.clear()
+        self._equivalences.clear()
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+
+# Default number of seconds between two reports of a SearchStats
+STATS_INTERVAL = 1.0
+
+# Rough bytes taken by each distinct formula node alive, with its entry in the hash-consing
+# table, and by each formula held in the seen set or the frontier of a search
+FORMULA_BYTES = 300
+SEEN_ENTRY_BYTES = 40
+FRONTIER_ENTRY_BYTES = 8
+
+
+class SearchStats:
+    '''
+    The progress of a search, kept up to date by the search as it runs. Pass one as the
+    stats of iter_equivalences, with a callback to be called with it every interval seconds
+    while the search runs and once more when it ends. The bfs and goal engines fill in every
+    field; the egraph engine only counts the formulae generated.
+
+    Fields:
+    - generated: formulae yielded by the search
+    - expanded: formulae whose successors have been generated
+    - frontier: formulae waiting to be expanded
+    - seen: distinct formulae looked at, including those over the complexity limit
+    - rejected: formulae dropped for being over the complexity limit
+    - level: the number of rewriting steps from the input to the formulae being expanded,
+             with the bfs engine
+    - complexity: the complexity of the formula being expanded, or with parallel workers
+                  the largest in the level being expanded
+    - elapsed: seconds since the stats were created
+    - memory: rough estimate, in bytes, of the memory taken by the formulae alive and by
+              the seen set and frontier of the search
+    - peak_memory: the largest memory estimate made so far
+    - done: whether the search has ended
+    '''
+
+    FIELDS = ('generated', 'expanded', 'frontier', 'seen', 'rejected', 'level', 'complexity', 'elapsed', 'memory', 'peak_memory', 'done')
+
+    def __init__(self, callback: Optional[Callable[['SearchStats'], None]] = None, interval: float = STATS_INTERVAL):
+        '''
+        @param callback: Optional function called with the stats as the search progresses
+        @param interval: Seconds between two calls of the callback while the search runs
+        '''
+
+        self.callback = callback
+        self.interval = interval
+        self.generated = 0
+        self.expanded = 0
+        self.frontier = 0
+        self.seen = 0
+        self.rejected = 0
+        self.level = 0
+        self.complexity = 0
+        self.elapsed = 0.0
+        self.memory = 0
+        self.peak_memory = 0
+        self.done = False
+        # Stats copied from a search in another process keep that process's memory estimate
+        self._remote = False
+        self._start = time.perf_counter()
+        self._next = self._start + interval
+
+    @property
+    def rate(self) -> float:
+        '''
+        @return: The formulae generated per second
+        '''
+
+        return self.generated / self.elapsed if self.elapsed > 0 else 0.0
+
+    def tick(self):
+        '''
+        Called by the search after each step, to call the callback once the interval has passed.
+        '''
+
+        if self.callback is not None:
+            now = time.perf_counter()
+            if now >= self._next:
+                self._next = now + self.interval
+                self._measure(now)
+                self.callback(self)
+
+    def finish(self):
+        '''
+        Mark the search as ended and call the callback a last time. Later calls do nothing.
+        '''
+
+        if self.done:
+            return
+        self.done = True
+        self._measure(time.perf_counter())
+        if self.callback is not None:
+            self.callback(self)
+
+    def update(self, snapshot: dict):
+        '''
+        Take the fields of a snapshot made by to_dict, as sent by a search running in another
+        process, and call the callback with them.
+
+        @param snapshot: The fields of the stats of the other search
+        '''
+
+        for field in self.FIELDS:
+            setattr(self, field, snapshot[field])
+        self._remote = True
+        if self.callback is not None:
+            self.callback(self)
+
+    def _measure(self, now: float):
+        self.elapsed = now - self._start
+        if not self._remote:
+            self.memory = (interned_count() * FORMULA_BYTES + self.seen * SEEN_ENTRY_BYTES
+                           + self.frontier * FRONTIER_ENTRY_BYTES)
+            self.peak_memory = max(self.peak_memory, self.memory)
+
+    def to_dict(self) -> dict:
+        '''
+        @return: The fields and the rate as a dictionary, ready to be sent as JSON
+        '''
+
+        snapshot = {field: getattr(self, field) for field in self.FIELDS}
+        snapshot['elapsed'] = round(self.elapsed, 3)
+        snapshot['rate'] = round(self.rate, 1)
+        return snapshot
+
+    def __repr__(self):
+        return (f"SearchStats(generated={self.generated}, frontier={self.frontier}, seen={self.seen}, "
+                f"rejected={self.rejected}, level={self.level}, done={self.done})")
+
+
+def _reporting(search: Iterable[Formula], stats: SearchStats) -> Iterator[Formula]:
+    # Count the formulae a search yields, and finish the stats however the search ends
+    try:
+        for formula in search:
+            stats.generated += 1
+            yield formula
+    finally:
+        stats.finish()
+
+
+class CancelToken:
+    '''
+    Tells a running search to stop. The search checks the token between steps and ends
+    its iterator, so the formulae found so far are kept. A token is cancelled either
+    explicitly with cancel(), from any thread, or once its timeout has passed.
+    '''
+
+    def __init__(self, timeout: Optional[float] = None):
+        '''
+        @param timeout: Seconds after which the token cancels itself, or None for no deadline
+        '''
+
+        self._event = threading.Event()
+        self.deadline = time.monotonic() + timeout if timeout is not None else None
+
+    def cancel(self):
+        self._event.set()
+
+    @property
+    def cancelled(self) -> bool:
+        if self._event.is_set():
+            return True
+        if self.deadline is not None and time.monotonic() >= self.deadline:
+            self._event.set()
+            return True
+        return False
+
+    def remaining(self) -> Optional[float]:
+        '''
+        @return: Seconds left until the deadline (0 once cancelled), or None if there is no deadline
+        '''
+
+        if self._event.is_set():
+            return 0.0
+        if self.deadline is None:
+            return None
+        return max(0.0, self.deadline - time.monotonic())
+
+    def __repr__(self):
+        return f"CancelToken(cancelled={self.cancelled})"
 
 
 def formula_complexity(formula: Formula) -> int:
     '''
     Calculate the complexity of a given formula.
+    Complexity is computed once when a formula is built, so this is O(1).
 
     @param formula: The formula to calculate complexity for
     @return: An integer representing the formula's complexity
     '''
 
-    if isinstance(formula, (Variable, Truth, Falsity)):
-        return 1
-    elif isinstance(formula, (Not, Next, Finally, Globally)):
-        return 1 + formula_complexity(formula.operand)
-    elif isinstance(formula, (And, Or, Implication, Biconditional, Until, Release)):
-        return 1 + formula_complexity(formula.left) + formula_complexity(formula.right)
-    return 1
+    return formula.complexity
 
 
-def apply_equivalences_to_subformulae(formula: Formula, equivalences: Tuple[Callable[[Formula], Formula]], max_depth: int, depth: int = 0) -> List[Formula]:
+def apply_equivalences_to_subformulae(formula: Formula, equivalences: Tuple[Callable[[Formula], Formula]], max_depth: int, depth: int = 0, counter: Optional[DispatchCounter] = None, rewrite_memo: Optional[RewriteMemo] = None) -> List[Formula]:
     '''
     Apply equivalences to subformulae of the given formula up to a maximum depth.
+    Only the equivalences registered for the root operation of each subformula are called.
 
     @param formula: The formula to apply equivalences to
     @param equivalences: A tuple of equivalence functions to apply
     @param max_depth: The maximum depth to apply equivalences
     @param depth: The current depth in the recursion
+    @param counter: Optional DispatchCounter recording the equivalence calls made and skipped
+    @param rewrite_memo: Optional RewriteMemo to look the variants of each subformula up in
     @return: A list of equivalent formulae
     '''
     
     if depth > max_depth:
         return [formula]
+    # Searches expand each formula once, so only proper subformulae are worth memoising
+    memoise = rewrite_memo is not None and depth > 0
+    if memoise:
+        cached = rewrite_memo.get(apply_equivalences_to_subformulae, equivalences, formula, max_depth - depth)
+        if cached is not None:
+            return cached
 
     results = [formula]  # Start with the original formula
     
-    # Apply equivalences at the current level
-    for equivalence in equivalences:
-        new_formula = equivalence(formula)
-        if str(new_formula) != str(formula):
-            results.append(new_formula)
+    # Apply the equivalences for this root operation at the current level
+    applicable = equivalence_index(equivalences)[formula.operation]
+    if counter is not None:
+        counter.skipped += len(equivalences) - len(applicable)
+        results.extend(counter.rewrite(formula, applicable))
+    else:
+        for equivalence in applicable:
+            new_formula = equivalence(formula)
+            if new_formula != formula:
+                results.append(new_formula)
 
     # Apply equivalences to subformulae
     if isinstance(formula, (Not, Next, Finally, Globally)):
-        sub_results = apply_equivalences_to_subformulae(formula.operand, equivalences, max_depth, depth + 1)
+        sub_results = apply_equivalences_to_subformulae(formula.operand, equivalences, max_depth, depth + 1, counter, rewrite_memo)
         results.extend([formula.__class__(sub) for sub in sub_results])
     elif isinstance(formula, (And, Or, Implication, Biconditional, Until, Release)):
-        left_results = apply_equivalences_to_subformulae(formula.left, equivalences, max_depth, depth + 1)
-        right_results = apply_equivalences_to_subformulae(formula.right, equivalences, max_depth, depth + 1)
+        left_results = apply_equivalences_to_subformulae(formula.left, equivalences, max_depth, depth + 1, counter, rewrite_memo)
+        right_results = apply_equivalences_to_subformulae(formula.right, equivalences, max_depth, depth + 1, counter, rewrite_memo)
         for left in left_results:
             for right in right_results:
                 results.append(formula.__class__(left, right))
 
+    if memoise:
+        rewrite_memo.put(apply_equivalences_to_subformulae, equivalences, formula, max_depth - depth, results)
     return results
 
 
-def apply_equivalences(formula_str: str, complexity_threshold: float, max_depth: int) -> List[Formula]:
+def rewrite_single_sites(formula: Formula, equivalences: Tuple[Callable[[Formula], Formula]], max_depth: int, depth: int = 0, counter: Optional[DispatchCounter] = None, rewrite_memo: Optional[RewriteMemo] = None) -> List[Formula]:
     '''
-    Apply equivalences to a formula string, generating equivalent formulae within complexity constraints.
+    Generate the one-step neighbours of a formula: every formula obtained by applying a
+    single equivalence at a single position no deeper than max_depth. All subtrees
+    away from the rewritten position are shared with the original formula.
 
-    @param formula_str: The input formula as a string
-    @param complexity_threshold: The maximum allowed complexity as a factor of the original formula's complexity
+    @param formula: The formula to rewrite
+    @param equivalences: A tuple of equivalence functions to apply
     @param max_depth: The maximum depth to apply equivalences
-    @return: A list of equivalent formulae
+    @param depth: The current depth in the recursion
+    @param counter: Optional DispatchCounter recording the equivalence calls made and skipped
+    @param rewrite_memo: Optional RewriteMemo to look the neighbours of each subformula up in
+    @return: A list of neighbouring formulae, not including the formula itself
     '''
-    
-    formula = parse_formula(formula_str)
-    original_complexity = formula_complexity(formula)
 
-    results = [formula]
-    queue = [formula]
-    seen = {str(formula)}
+    if depth > max_depth:
+        return []
+    memoise = rewrite_memo is not None and depth > 0
+    if memoise:
+        cached = rewrite_memo.get(rewrite_single_sites, equivalences, formula, max_depth - depth)
+        if cached is not None:
+            return cached
+
+    applicable = equivalence_index(equivalences)[formula.operation]
+    if counter is not None:
+        counter.skipped += len(equivalences) - len(applicable)
+        results = counter.rewrite(formula, applicable)
+    else:
+        results = []
+        for equivalence in applicable:
+            new_formula = equivalence(formula)
+            if new_formula != formula:
+                results.append(new_formula)
+
+    if isinstance(formula, (Not, Next, Finally, Globally)):
+        for sub in rewrite_single_sites(formula.operand, equivalences, max_depth, depth + 1, counter, rewrite_memo):
+            results.append(formula.__class__(sub))
+    elif isinstance(formula, (And, Or, Implication, Biconditional, Until, Release)):
+        for left in rewrite_single_sites(formula.left, equivalences, max_depth, depth + 1, counter, rewrite_memo):
+            results.append(formula.__class__(left, formula.right))
+        for right in rewrite_single_sites(formula.right, equivalences, max_depth, depth + 1, counter, rewrite_memo):
+            results.append(formula.__class__(formula.left, right))
+
+    if memoise:
+        rewrite_memo.put(rewrite_single_sites, equivalences, formula, max_depth - depth, results)
+    return results
+
+
+@lru_cache(maxsize=EQUIVALENCE_TUPLES)
+def _without_ac(equivalences: Tuple[Callable[[Formula], Formula]]) -> Tuple[Callable[[Formula], Formula]]:
+    # The same tuple is returned for equal arguments, so it can key the rewrite memo
+    return tuple(equivalence for equivalence in equivalences if equivalence not in AC_EQUIVALENCES)
+
+
+def _chain(cls, operands: List[Formula]) -> Formula:
+    # Nest operands to the right under a binary class
+    result = operands[-1]
+    for operand in reversed(operands[:-1]):
+        result = cls(operand, result)
+    return result
+
+
+def rewrite_modulo_ac(formula: Formula, equivalences: Tuple[Callable[[Formula], Formula]], max_depth: int, depth: int = 0, counter: Optional[DispatchCounter] = None, rewrite_memo: Optional[RewriteMemo] = None, memo: Optional[dict] = None) -> List[Formula]:
+    '''
+    Generate the one-step neighbours of a formula in AC-normal form, in AC-normal form.
+    Commutativity and associativity of & and | are not applied; instead, the other
+    equivalences are applied to a chain of conjunctions or disjunctions as if its operands
+    were in any order: to each operand against the rest of the chain, on either side, and to
+    each pair of operands. Operands of a chain count as one level below the chain.
+
+    @param formula: The formula to rewrite, in AC-normal form
+    @param equivalences: A tuple of equivalence functions to apply
+    @param max_depth: The maximum depth to apply equivalences
+    @param depth: The current depth in the recursion
+    @param counter: Optional DispatchCounter recording the equivalence calls made and skipped
+    @param rewrite_memo: Optional RewriteMemo to look the neighbours of each subformula up in
+    @param memo: Dictionary of normal forms shared by the recursion
+    @return: A list of neighbouring formulae in AC-normal form, which may include the formula itself
+    '''
+
+    if depth > max_depth:
+        return []
+    if memo is None:
+        memo = {}
+
+    equivalences = _without_ac(tuple(equivalences))
+    memoise = rewrite_memo is not None and depth > 0
+    results = rewrite_memo.get(rewrite_modulo_ac, equivalences, formula, max_depth - depth) if memoise else None
+    if results is None:
+        results = _rewrite_modulo_ac(formula, equivalences, max_depth, depth, counter, rewrite_memo, memo)
+        if memoise:
+            rewrite_memo.put(rewrite_modulo_ac, equivalences, formula, max_depth - depth, results)
+
+    if depth == 0:
+        return [ac_canonical(result, memo) for result in results]
+    return results
+
+
+def _rewrite_modulo_ac(formula: Formula, equivalences: Tuple[Callable[[Formula], Formula]], max_depth: int, depth: int, counter: Optional[DispatchCounter], rewrite_memo: Optional[RewriteMemo], memo: dict) -> List[Formula]:
+    # The neighbours of a formula as in rewrite_modulo_ac, with equivalences already
+    # without AC_EQUIVALENCES, not yet in AC-normal form
+    index = equivalence_index(equivalences)
+
+    def rewrites(node):
+        applicable = index[node.operation]
+        if counter is not None:
+            counter.skipped += len(equivalences) - len(applicable)
+            return counter.rewrite(node, applicable)
+        results = []
+        for equivalence in applicable:
+            new_formula = equivalence(node)
+            if new_formula != node:
+                results.append(new_formula)
+        return results
+
+    results = []
+    if isinstance(formula, (And, Or)):
+        cls = type(formula)
+        operands = []
+        stack = [formula]
+        while stack:
+            node = stack.pop()
+            if type(node) is cls:
+                stack.append(node.right)
+                stack.append(node.left)
+            else:
+                operands.append(node)
+
+        for i, operand in enumerate(operands):
+            rest = _chain(cls, operands[:i] + operands[i + 1:])
+            results.extend(rewrites(cls(operand, rest)))
+            results.extend(rewrites(cls(rest, operand)))
+            for j in range(i + 1, len(operands)):
+                others = [other for k, other in enumerate(operands) if k != i and k != j]
+                for pair in (cls(operand, operands[j]), cls(operands[j], operand)):
+                    for new_pair in rewrites(pair):
+                        results.append(cls(new_pair, _chain(cls, others)) if others else new_pair)
+            for sub in rewrite_modulo_ac(operand, equivalences, max_depth, depth + 1, counter, rewrite_memo, memo):
+                results.append(_chain(cls, operands[:i] + [sub] + operands[i + 1:]))
+    else:
+        results.extend(rewrites(formula))
+        if isinstance(formula, (Not, Next, Finally, Globally)):
+            for sub in rewrite_modulo_ac(formula.operand, equivalences, max_depth, depth + 1, counter, rewrite_memo, memo):
+                results.append(formula.__class__(sub))
+        elif isinstance(formula, (Implication, Biconditional, Until, Release)):
+            for left in rewrite_modulo_ac(formula.left, equivalences, max_depth, depth + 1, counter, rewrite_memo, memo):
+                results.append(formula.__class__(left, formula.right))
+            for right in rewrite_modulo_ac(formula.right, equivalences, max_depth, depth + 1, counter, rewrite_memo, memo):
+                results.append(formula.__class__(formula.left, right))
+
+    return results
+
+
+# Ways of generating the successors of a formula in apply_equivalences
+REWRITING_MODES = {
+    # Every combination of rewrites of the subformulae, as one step
+    'product': apply_equivalences_to_subformulae,
+    # One rewrite at one position per step; the search composes them
+    'single_site': rewrite_single_sites,
+    # One rewrite per step on formulae in AC-normal form, treating chains of & and | as
+    # unordered; the search then visits one formula per class of AC-equivalent formulae
+    'ac': rewrite_modulo_ac,
+}
+
+
+# Smallest number of formulae sent to a worker process at once when expanding in parallel
+MIN_CHUNK_SIZE = 32
+
+# The RewriteMemo of a worker process, kept between the chunks it expands
+_worker_rewrite_memo = None
+
+
+def _expand(frontier: List[Formula], max_complexity: float, max_depth: int, rewriting: str, counter: Optional[DispatchCounter], cancel: Optional[CancelToken] = None, rewrite_memo: Optional[RewriteMemo] = None, stats: Optional[SearchStats] = None) -> Tuple[List[Formula], int]:
+    # The distinct successors of a list of formulae within max_complexity, in discovery
+    # order, and the number of distinct successors over it
+    successors = REWRITING_MODES[rewriting]
+    expanded = {}
+    rejected = set()
+    for formula in frontier:
+        if cancel is not None and cancel.cancelled:
+            break
+        for new_formula in successors(formula, EQUIVALENCES, max_depth, counter=counter, rewrite_memo=rewrite_memo):
+            if new_formula.complexity <= max_complexity:
+                expanded[new_formula] = None
+            else:
+                rejected.add(new_formula)
+        if stats is not None:
+            stats.expanded += 1
+            stats.tick()
+    return list(expanded), len(rejected)
+
+
+def expand_frontier_chunk(encoded: str, max_complexity: float, max_depth: int, rewriting: str, deadline: Optional[float] = None) -> Tuple[str, int, int, int]:
+    '''
+    Expand part of a search frontier in a worker process.
+
+    @param encoded: The formulae to expand, encoded with encode_formulae
+    @param max_complexity: The maximum complexity of successors to return
+    @param max_depth: The maximum depth to apply equivalences
+    @param rewriting: The rewriting mode, a key of REWRITING_MODES
+    @param deadline: Optional time.time() after which the chunk is abandoned
+    @return: The encoded distinct successors, the equivalence calls made and skipped, and
+             the number of distinct successors over max_complexity
+    '''
+
+    global _worker_rewrite_memo
+    if _worker_rewrite_memo is None:
+        _worker_rewrite_memo = RewriteMemo()
+
+    counter = DispatchCounter()
+    cancel = CancelToken(deadline - time.time()) if deadline is not None else None
+    expanded, rejected = _expand(decode_formulae(encoded), max_complexity, max_depth, rewriting, counter, cancel, _worker_rewrite_memo)
+    if cancel is not None and cancel.cancelled:
+        # The parent has stopped waiting, so sending the successors back is wasted work
+        expanded = []
+    return encode_formulae(expanded), counter.invoked, counter.skipped, rejected
+
+
+def _chunks(frontier: List[Formula], workers: int) -> List[List[Formula]]:
+    # A few chunks per worker so that uneven chunks balance out
+    size = max(MIN_CHUNK_SIZE, -(-len(frontier) // (workers * 4)))
+    return [frontier[start:start + size] for start in range(0, len(frontier), size)]
+
+
+def iter_parallel_closure(formula: Formula, max_complexity: float, max_depth: int, workers: int, counter: Optional[DispatchCounter] = None, rewriting: str = 'product', cancel: Optional[CancelToken] = None, rewrite_memo: Optional[RewriteMemo] = None, stats: Optional[SearchStats] = None) -> Iterator[Formula]:
+    '''
+    Yield the same formulae, in the same order, as the breadth-first search in
+    iter_equivalences, expanding each level of the search across a pool of worker processes.
+    Workers receive and return formulae in the compact encoding of Formula.serialization
+    and drop duplicates within their chunk; the parent removes duplicates across chunks and levels.
+
+    @param formula: The formula to start from
+    @param max_complexity: The maximum complexity of generated formulae
+    @param max_depth: The maximum depth to apply equivalences
+    @param workers: The number of worker processes
+    @param counter: Optional DispatchCounter recording the equivalence calls made and skipped
+    @param rewriting: The rewriting mode, a key of REWRITING_MODES
+    @param cancel: Optional CancelToken; once cancelled, chunks not yet started are
+                   dropped and the iterator ends. Running chunks stop at the token's
+                   deadline, but finish their work if it is cancelled explicitly.
+    @param rewrite_memo: Optional RewriteMemo used for levels expanded in this process;
+                         each worker process keeps a memo of its own
+    @param stats: Optional SearchStats, updated as each chunk of a level comes back. A formula
+                  over the complexity limit is counted as rejected in every chunk and level
+                  that generates it.
+    @return: An iterator over equivalent formulae, starting with formula itself
+    '''
+
+    yield formula
+    seen = {formula}
+    frontier = [formula]
+    if stats is not None:
+        stats.frontier = stats.seen = 1
+
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        while frontier and not (cancel is not None and cancel.cancelled):
+            if stats is not None:
+                stats.complexity = max(candidate.complexity for candidate in frontier)
+            chunks = _chunks(frontier, workers)
+            if len(chunks) == 1:
+                # Not worth the round trip to a worker
+                expanded, rejected = _expand(frontier, max_complexity, max_depth, rewriting, counter, cancel, rewrite_memo, stats)
+                levels = [expanded]
+                if stats is not None:
+                    stats.rejected += rejected
+            else:
+                # Workers cannot see the token, so they are given its deadline as a wall-clock time
+                remaining = cancel.remaining() if cancel is not None else None
+                deadline = time.time() + remaining if remaining is not None else None
+                futures = [pool.submit(expand_frontier_chunk, encode_formulae(chunk), max_complexity, max_depth, rewriting, deadline)
+                           for chunk in chunks]
+                levels = []
+                for chunk, future in zip(chunks, futures):
+                    encoded, invoked, skipped, rejected = future.result()
+                    if cancel is not None and cancel.cancelled:
+                        # Chunks received after cancellation are dropped rather than decoded
+                        for pending in futures:
+                            pending.cancel()
+                        break
+                    levels.append(decode_formulae(encoded))
+                    if counter is not None:
+                        counter.invoked += invoked
+                        counter.skipped += skipped
+                    if stats is not None:
+                        stats.expanded += len(chunk)
+                        stats.rejected += rejected
+                        stats.tick()
+
+            frontier = []
+            for expanded in levels:
+                for new_formula in expanded:
+                    if new_formula not in seen:
+                        seen.add(new_formula)
+                        frontier.append(new_formula)
+                        yield new_formula
+            if stats is not None:
+                stats.frontier = len(frontier)
+                stats.seen = len(seen)
+                if frontier:
+                    stats.level += 1
+
+
+def disallowed_count(formula: Formula, allowed_mask: int, memo: Optional[dict] = None) -> int:
+    '''
+    Count the nodes of a formula whose operation is not allowed.
+
+    @param formula: The formula to measure
+    @param allowed_mask: Bitmask of allowed operations, as built by filter.operator_mask
+    @param memo: Optional dictionary caching counts of subformulae between calls
+    @return: The number of nodes with a disallowed operation, 0 if the formula passes the filter
+    '''
+
+    if formula.operator_mask & ~allowed_mask == 0:
+        return 0
+    if memo is not None:
+        cached = memo.get(formula)
+        if cached is not None:
+            return cached
+
+    count = 1 if formula.operation.bit & ~allowed_mask else 0
+    for child in formula.children():
+        count += disallowed_count(child, allowed_mask, memo)
+
+    if memo is not None:
+        memo[formula] = count
+    return count
+
+
+def goal_directed_closure(formula: Formula, max_complexity: float, max_depth: int, allowed_mask: int, count: Optional[int] = None, counter: Optional[DispatchCounter] = None, rewriting: str = 'product', cancel: Optional[CancelToken] = None, rewrite_memo: Optional[RewriteMemo] = None, stats: Optional[SearchStats] = None) -> Iterator[Formula]:
+    '''
+    Yield the formulae reachable from a formula by applying equivalences, expanding the most
+    promising formula first: the one with the fewest nodes using disallowed operations, then
+    the least complex. Formulae that pass the filter are therefore found long before the
+    rest of the closure, and the search can stop once enough of them have been found.
+
+    @param formula: The formula to start from
+    @param max_complexity: The maximum complexity of generated formulae
+    @param max_depth: The maximum depth to apply equivalences
+    @param allowed_mask: Bitmask of allowed operations, as built by filter.operator_mask
+    @param count: Stop once this many formulae using only allowed operations have been
+                  yielded, or None to go on through the whole closure
+    @param counter: Optional DispatchCounter recording the equivalence calls made and skipped
+    @param rewriting: The rewriting mode, a key of REWRITING_MODES
+    @param cancel: Optional CancelToken, checked before each formula is expanded
+    @param rewrite_memo: Optional RewriteMemo of the variants of subformulae
+    @param stats: Optional SearchStats updated after each formula is expanded; the level is not tracked
+    @return: An iterator over equivalent formulae, starting with formula itself
+    '''
+
+    successors = REWRITING_MODES[rewriting]
+    memo = {}
+    found = 0
+
+    def priority(candidate):
+        return (disallowed_count(candidate, allowed_mask, memo), candidate.complexity)
+
+    yield formula
+    if formula.operator_mask & ~allowed_mask == 0:
+        found += 1
+    # Entries are (heuristic, complexity, order of discovery, formula); the order of discovery
+    # breaks ties, so formulae themselves are never compared
+    queue = [priority(formula) + (0, formula)]
+    seen = {formula}
+    discovered = 1
+
+    while queue and (count is None or found < count):
+        if cancel is not None and cancel.cancelled:
+            return
+        current_formula = heapq.heappop(queue)[-1]
+
+        for new_formula in successors(current_formula, EQUIVALENCES, max_depth, counter=counter, rewrite_memo=rewrite_memo):
+            if new_formula in seen:
+                continue
+            seen.add(new_formula)
+
+            if new_formula.complexity <= max_complexity:
+                heapq.heappush(queue, priority(new_formula) + (discovered, new_formula))
+                discovered += 1
+                yield new_formula
+                if new_formula.operator_mask & ~allowed_mask == 0:
+                    found += 1
+                    if count is not None and found >= count:
+                        return
+            elif stats is not None:
+                stats.rejected += 1
+
+        if stats is not None:
+            stats.expanded += 1
+            stats.frontier = len(queue)
+            stats.seen = len(seen)
+            stats.complexity = current_formula.complexity
+            stats.tick()
+
+
+ENGINES = ('bfs', 'egraph', 'goal')
+
+
+def breadth_first_closure(formula: Formula, max_complexity: float, max_depth: int, counter: Optional[DispatchCounter] = None, rewriting: str = 'product', cancel: Optional[CancelToken] = None, rewrite_memo: Optional[RewriteMemo] = None, stats: Optional[SearchStats] = None) -> Iterator[Formula]:
+    '''
+    Yield the formulae reachable from a formula by applying equivalences, in breadth-first
+    order, skipping any more complex than max_complexity.
+
+    @param formula: The formula to start from
+    @param max_complexity: The maximum complexity of generated formulae
+    @param max_depth: The maximum depth to apply equivalences
+    @param counter: Optional DispatchCounter recording the equivalence calls made and skipped
+    @param rewriting: The rewriting mode, a key of REWRITING_MODES
+    @param cancel: Optional CancelToken, checked before each formula is expanded
+    @param rewrite_memo: Optional RewriteMemo of the variants of subformulae
+    @param stats: Optional SearchStats updated after each formula is expanded
+    @return: An iterator over equivalent formulae, starting with formula itself
+    '''
+
+    successors = REWRITING_MODES[rewriting]
+
+    yield formula
+    queue = deque([formula])
+    # Formulae are hash-consed, so each one is its own canonical key. Candidates over the
+    # complexity limit are remembered too, so they are only ever looked at once.
+    seen = {formula}
+    # Formulae are expanded in the order they were queued, so a level ends once every
+    # formula queued before its first formula was expanded has been
+    level_end = 1
 
     while queue:
-        current_formula = queue.pop(0)
+        if cancel is not None and cancel.cancelled:
+            return
+        if stats is not None and stats.expanded >= level_end:
+            stats.level += 1
+            level_end = stats.expanded + len(queue)
+        current_formula = queue.popleft()
 
-        new_formulas = apply_equivalences_to_subformulae(current_formula, EQUIVALENCES, max_depth)
+        new_formulas = successors(current_formula, EQUIVALENCES, max_depth, counter=counter, rewrite_memo=rewrite_memo)
         
         for new_formula in new_formulas:
-            new_complexity = formula_complexity(new_formula)
-            
-            if str(new_formula) not in seen and new_complexity <= original_complexity * complexity_threshold:
-                results.append(new_formula)
+            if new_formula in seen:
+                continue
+            seen.add(new_formula)
+
+            if new_formula.complexity <= max_complexity:
                 queue.append(new_formula)
-                seen.add(str(new_formula))
+                yield new_formula
+            elif stats is not None:
+                stats.rejected += 1
+
+        if stats is not None:
+            stats.expanded += 1
+            stats.frontier = len(queue)
+            stats.seen = len(seen)
+            stats.complexity = current_formula.complexity
+            stats.tick()
+
+
+def iter_equivalences(formula_str: str, complexity_threshold: float, max_depth: int, counter: Optional[DispatchCounter] = None, rewriting: str = 'product', engine: str = 'bfs', extraction: str = 'all', count: Optional[int] = None, allowed_operators: Optional[List[str]] = None, workers: Optional[int] = None, cancel: Optional[CancelToken] = None, rewrite_memo: Optional[RewriteMemo] = None, stats: Optional[SearchStats] = None) -> Iterator[Formula]:
+    '''
+    Generate equivalent formulae for a formula string lazily, as they are discovered.
+    Arguments are checked and the formula parsed straight away; the search itself only
+    runs as the iterator is consumed, so a caller can stop early or show partial results.
+    Only the formulae still to be expanded and the set of formulae seen are kept in memory.
+
+    @param formula_str: The input formula as a string
+    @param complexity_threshold: The maximum allowed complexity as a factor of the original formula's complexity
+    @param max_depth: The maximum depth to apply equivalences
+    @param counter: Optional DispatchCounter recording the equivalence calls made and skipped,
+                    or RuleProfile also profiling each equivalence
+    @param rewriting: 'product' to combine rewrites of all subformulae in each step,
+                      'single_site' to apply one equivalence at one position per step, or
+                      'ac' to search over AC-normal forms, so that formulae differing only
+                      by the order and bracketing of & and | are generated once
+    @param engine: 'bfs' to enumerate equivalent formulae by breadth-first search,
+                   'egraph' to saturate an e-graph and extract formulae from it, or 'goal'
+                   to search best-first towards formulae using only allowed_operators
+    @param extraction: With the egraph engine, 'all' for every formula within the complexity
+                       limit, 'smallest' for the count smallest, or 'best' for the smallest
+                       formula using only allowed_operators
+    @param count: The number of formulae to extract with 'smallest', or with the goal engine
+                  the number of formulae using only allowed_operators to stop after
+    @param allowed_operators: The operators the 'best' extraction and the goal engine aim
+                              for, e.g. ['!', '&', '|']
+    @param workers: With the bfs engine, the number of worker processes to expand each level
+                    of the search across; None or 1 searches in this process
+    @param cancel: Optional CancelToken that stops the search early; the iterator then ends
+                   after the formulae found so far
+    @param rewrite_memo: Optional RewriteMemo of the variants of subformulae, to share it
+                         across searches or read its hit rate afterwards; by default each
+                         search uses a new one
+    @param stats: Optional SearchStats kept up to date as the search runs, whose callback
+                  reports the progress of the search
+    @return: An iterator over equivalent formulae, starting with the parsed formula
+    '''
+    
+    if engine not in ENGINES:
+        raise ValueError(f"Unknown engine '{engine}'. Use one of: {', '.join(ENGINES)}")
+    if rewriting not in REWRITING_MODES:
+        raise ValueError(f"Unknown rewriting mode '{rewriting}'. Use one of: {', '.join(REWRITING_MODES)}")
+
+    formula = parse_formula(formula_str)
+    max_complexity = formula_complexity(formula) * complexity_threshold
+    if rewriting == 'ac':
+        formula = ac_canonical(formula)
+    if rewrite_memo is None:
+        rewrite_memo = RewriteMemo()
+
+    if isinstance(counter, RuleProfile) and (engine == 'egraph' or (workers is not None and workers > 1)):
+        raise ValueError("Equivalences can only be profiled with the bfs or goal engine, without workers")
+
+    if engine == 'goal':
+        if allowed_operators is None:
+            raise ValueError("The goal engine needs allowed_operators to search towards")
+        search = goal_directed_closure(formula, max_complexity, max_depth, operator_mask(allowed_operators), count, counter,
+                                       rewriting, cancel, rewrite_memo, stats)
+    elif engine == 'egraph':
+        allowed_mask = operator_mask(allowed_operators) if allowed_operators is not None else None
+        search = iter_egraph_equivalences(formula, max_complexity, max_depth, extraction, count, allowed_mask, cancel=cancel)
+    elif workers is not None and workers > 1:
+        search = iter_parallel_closure(formula, max_complexity, max_depth, workers, counter, rewriting, cancel, rewrite_memo, stats)
+    else:
+        search = breadth_first_closure(formula, max_complexity, max_depth, counter, rewriting, cancel, rewrite_memo, stats)
+
+    return _reporting(search, stats) if stats is not None else search
+
+
+def apply_equivalences(formula_str: str, complexity_threshold: float, max_depth: int, counter: Optional[DispatchCounter] = None, rewriting: str = 'product', engine: str = 'bfs', extraction: str = 'all', count: Optional[int] = None, allowed_operators: Optional[List[str]] = None, workers: Optional[int] = None, cancel: Optional[CancelToken] = None, rewrite_memo: Optional[RewriteMemo] = None, stats: Optional[SearchStats] = None) -> List[Formula]:
+    '''
+    Apply equivalences to a formula string, generating equivalent formulae within complexity constraints.
+    Takes the same arguments as iter_equivalences, and collects every formula it generates;
+    if the search is cancelled, the formulae found until then.
+
+    @param formula_str: The input formula as a string
+    @param complexity_threshold: The maximum allowed complexity as a factor of the original formula's complexity
+    @param max_depth: The maximum depth to apply equivalences
+    @return: A list of equivalent formulae
+    '''
 
-    return results
\ No newline at end of file
+    return list(iter_equivalences(formula_str, complexity_threshold, max_depth, counter, rewriting, engine, extraction,
+                                  count, allowed_operators, workers, cancel, rewrite_memo, stats))
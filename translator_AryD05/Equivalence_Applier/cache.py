@@ -0,0 +1,405 @@
+'''
+This module provides caches of generated equivalences: a persistent cache stored in a
+SQLite database, so that running the same formula again (in CI, or on another day) does
+not repeat the search, and an in-memory memo that also answers for formulae differing
+only in the names of their variables.
+
+Entries are keyed by the parsed formula, the complexity threshold, the maximum depth,
+the search options that change the result and a version of the rule set, so editing
+the equivalences invalidates every entry made with the old rules. The formulae are
+stored compressed in the encoding of Formula.serialization. When the database grows
+beyond its size limit the least recently used entries are evicted.
+
+The in-memory memo keys searches by the alpha-normal form of the formula instead, and
+renames the stored formulae back to the caller's variables on every hit.
+'''
+
+
+
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+import zlib
+from collections import OrderedDict
+from contextlib import contextmanager
+from typing import Dict, Iterator, List, Optional, Tuple
+from Formula.structure import Formula
+from Formula.parser import parse_formula
+from Formula.serialization import encode_formula, encode_formulae, decode_formulae
+from Formula.canonical import alpha_normal, rename_variables, ac_canonical
+from .equivalences import EQUIVALENCES
+
+
+# Directory used when no cache directory is given and TRANSLATOR_CACHE_DIR is not set
+DEFAULT_CACHE_DIR = os.path.join(os.path.expanduser('~'), '.cache', 'translator_AryD05')
+
+DATABASE_NAME = 'closures.sqlite3'
+
+# Largest total size, in bytes, of the stored formulae before entries are evicted
+DEFAULT_MAX_BYTES = 256 * 1024 * 1024
+
+# Seconds to wait for another process holding a lock on the database
+LOCK_TIMEOUT = 10.0
+
+# Largest number of searches kept by a RenamingMemo
+DEFAULT_MAX_ENTRIES = 256
+
+_SCHEMA = '''
+CREATE TABLE IF NOT EXISTS closures (
+    key TEXT PRIMARY KEY,
+    formula TEXT NOT NULL,
+    complexity REAL NOT NULL,
+    depth INTEGER NOT NULL,
+    options TEXT NOT NULL,
+    version TEXT NOT NULL,
+    data BLOB NOT NULL,
+    size INTEGER NOT NULL,
+    last_used REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS closures_last_used ON closures (last_used);
+CREATE TABLE IF NOT EXISTS stats (
+    name TEXT PRIMARY KEY,
+    value INTEGER NOT NULL
+);
+'''
+
+
+def ruleset_version(equivalences: Tuple = EQUIVALENCES) -> str:
+    '''
+    Compute a version string for a rule set that changes whenever a rule is added,
+    removed, reordered or edited.
+
+    @param equivalences: A tuple of equivalence functions
+    @return: A short hexadecimal digest of the rules' names and compiled code
+    '''
+
+    digest = hashlib.sha256()
+    for function in equivalences:
+        code = function.__code__
+        digest.update(function.__qualname__.encode())
+        digest.update(code.co_code)
+        digest.update(repr(code.co_consts).encode())
+        digest.update(repr(code.co_names).encode())
+        digest.update(repr(sorted(operation.name for operation in getattr(function, 'operations', ()))).encode())
+    return digest.hexdigest()[:16]
+
+
+RULESET_VERSION = ruleset_version()
+
+
+def result_options(engine: str = 'bfs', rewriting: str = 'product', extraction: str = 'all', count: Optional[int] = None,
+                   allowed_operators=None, **ignored) -> Dict[str, object]:
+    '''
+    Select the search options that change which formulae are generated. Options that only
+    change how the search runs, such as workers or cancel, are dropped, as are options
+    the chosen engine does not use.
+
+    @param engine: The search engine, 'bfs', 'egraph' or 'goal'
+    @param rewriting: The rewriting mode used by the bfs and goal engines
+    @param extraction: How the egraph engine extracts formulae
+    @param count: The number of formulae extracted or found
+    @param allowed_operators: The allowed operator symbols
+    @param ignored: Any other options of iter_equivalences
+    @return: A dictionary of the options relevant to the result
+    '''
+
+    options = {'engine': engine}
+    if engine == 'egraph':
+        options['extraction'] = extraction
+        if extraction == 'smallest':
+            options['count'] = count
+    else:
+        options['rewriting'] = rewriting
+    if engine == 'goal':
+        options['count'] = count
+    if engine == 'goal' or (engine == 'egraph' and extraction == 'best'):
+        options['allowed_operators'] = sorted(allowed_operators or ())
+    return options
+
+
+class ClosureCache:
+    '''
+    A size-bounded, least-recently-used cache of generated equivalences in a SQLite file.
+    Each operation opens its own connection, so one cache can be shared between threads
+    and several processes can use the same directory.
+    '''
+
+    def __init__(self, directory: Optional[str] = None, max_bytes: int = DEFAULT_MAX_BYTES, version: str = RULESET_VERSION):
+        '''
+        @param directory: The directory holding the database, by default TRANSLATOR_CACHE_DIR
+                          or DEFAULT_CACHE_DIR
+        @param max_bytes: The largest total size of the stored formulae
+        @param version: The rule-set version entries are stored and looked up under
+        '''
+
+        self.directory = directory or os.environ.get('TRANSLATOR_CACHE_DIR') or DEFAULT_CACHE_DIR
+        self.path = os.path.join(self.directory, DATABASE_NAME)
+        self.max_bytes = max_bytes
+        self.version = version
+        os.makedirs(self.directory, exist_ok=True)
+        with self._connect() as connection:
+            connection.executescript(_SCHEMA)
+
+
+    def __repr__(self):
+        return f"ClosureCache({self.path!r})"
+
+
+    @contextmanager
+    def _connect(self) -> Iterator[sqlite3.Connection]:
+        # Commit on success, roll back on error, and always close the connection
+        connection = sqlite3.connect(self.path, timeout=LOCK_TIMEOUT)
+        try:
+            with connection:
+                yield connection
+        finally:
+            connection.close()
+
+
+    def key(self, formula_str: str, complexity_threshold: float, max_depth: int, **options) -> Tuple[str, str, str]:
+        '''
+        Compute the key of a search.
+
+        @param formula_str: The input formula as a string
+        @param complexity_threshold: The complexity threshold
+        @param max_depth: The maximum depth to apply equivalences
+        @param options: The keyword arguments passed to iter_equivalences
+        @return: A tuple (key, formula, options) of the key, the parsed formula in prefix
+                 notation, and the relevant options as JSON
+        @raise FormulaSyntaxError: If the formula is not well-formed
+        '''
+
+        # Printing drops brackets that the structure keeps, as in (A & B) & C and A & (B & C),
+        # so the key is built from the lossless encoding instead
+        formula = encode_formula(parse_formula(formula_str))
+        relevant = json.dumps(result_options(**options), sort_keys=True)
+        text = json.dumps([formula, float(complexity_threshold), int(max_depth), relevant, self.version])
+        return hashlib.sha256(text.encode()).hexdigest(), formula, relevant
+
+
+    def get(self, formula_str: str, complexity_threshold: float, max_depth: int, **options) -> Optional[List[Formula]]:
+        '''
+        Look up the equivalences of a formula, counting a hit or a miss.
+
+        @param formula_str: The input formula as a string
+        @param complexity_threshold: The complexity threshold
+        @param max_depth: The maximum depth to apply equivalences
+        @param options: The keyword arguments passed to iter_equivalences
+        @return: The stored formulae, in the order they were generated, or None if the
+                 search is not in the cache
+        '''
+
+        key = self.key(formula_str, complexity_threshold, max_depth, **options)[0]
+        with self._connect() as connection:
+            row = connection.execute('SELECT data FROM closures WHERE key = ?', (key,)).fetchone()
+            if row is not None:
+                connection.execute('UPDATE closures SET last_used = ? WHERE key = ?', (time.time(), key))
+            self._count(connection, 'misses' if row is None else 'hits')
+        if row is None:
+            return None
+        return decode_formulae(zlib.decompress(row[0]).decode())
+
+
+    def put(self, formula_str: str, complexity_threshold: float, max_depth: int, equivalents: List[Formula], **options):
+        '''
+        Store the complete result of a search, then evict least recently used entries
+        until the cache is within its size limit.
+
+        @param formula_str: The input formula as a string
+        @param complexity_threshold: The complexity threshold
+        @param max_depth: The maximum depth to apply equivalences
+        @param equivalents: Every formula the search generated
+        @param options: The keyword arguments passed to iter_equivalences
+        '''
+
+        key, formula, relevant = self.key(formula_str, complexity_threshold, max_depth, **options)
+        data = zlib.compress(encode_formulae(equivalents).encode())
+        if len(data) > self.max_bytes:
+            return
+        with self._connect() as connection:
+            connection.execute('INSERT OR REPLACE INTO closures VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)',
+                               (key, formula, float(complexity_threshold), int(max_depth), relevant, self.version,
+                                data, len(data), time.time()))
+            self._evict(connection)
+
+
+    def _evict(self, connection: sqlite3.Connection):
+        total = connection.execute('SELECT COALESCE(SUM(size), 0) FROM closures').fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        evicted = 0
+        for key, size in connection.execute('SELECT key, size FROM closures ORDER BY last_used').fetchall():
+            if total <= self.max_bytes:
+                break
+            connection.execute('DELETE FROM closures WHERE key = ?', (key,))
+            total -= size
+            evicted += 1
+        self._count(connection, 'evictions', evicted)
+
+
+    def _count(self, connection: sqlite3.Connection, name: str, amount: int = 1):
+        connection.execute('INSERT OR IGNORE INTO stats VALUES (?, 0)', (name,))
+        connection.execute('UPDATE stats SET value = value + ? WHERE name = ?', (amount, name))
+
+
+    def stats(self) -> Dict[str, float]:
+        '''
+        Report the use of the cache since it was created or last cleared.
+
+        @return: A dictionary of the hits, misses, evictions, hit rate, number of entries and
+                 total size in bytes
+        '''
+
+        with self._connect() as connection:
+            counts = dict(connection.execute('SELECT name, value FROM stats').fetchall())
+            entries, size = connection.execute('SELECT COUNT(*), COALESCE(SUM(size), 0) FROM closures').fetchone()
+        hits = counts.get('hits', 0)
+        misses = counts.get('misses', 0)
+        return {
+            'hits': hits,
+            'misses': misses,
+            'evictions': counts.get('evictions', 0),
+            'hit_rate': hits / (hits + misses) if hits + misses else 0.0,
+            'entries': entries,
+            'bytes': size,
+        }
+
+
+    def clear(self):
+        '''
+        Remove every entry and reset the statistics.
+        '''
+
+        with self._connect() as connection:
+            connection.execute('DELETE FROM closures')
+            connection.execute('DELETE FROM stats')
+
+
+class RenamingMemo:
+    '''
+    An in-memory, least-recently-used memo of generated equivalences keyed by the
+    alpha-normal form of the formula, so that "A <-> B" and "req <-> grant" share an entry.
+    The memo is safe to share between threads.
+    '''
+
+    def __init__(self, max_entries: int = DEFAULT_MAX_ENTRIES):
+        '''
+        @param max_entries: The largest number of searches kept
+        '''
+
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+
+    def __repr__(self):
+        return f"RenamingMemo(entries={len(self._entries)}, hits={self.hits}, misses={self.misses})"
+
+
+    def __len__(self):
+        return len(self._entries)
+
+
+    def key(self, formula_str: str, complexity_threshold: float, max_depth: int, **options) -> Tuple[tuple, Dict[str, str]]:
+        '''
+        Compute the key of a search.
+
+        @param formula_str: The input formula as a string
+        @param complexity_threshold: The complexity threshold
+        @param max_depth: The maximum depth to apply equivalences
+        @param options: The keyword arguments passed to iter_equivalences
+        @return: A tuple (key, names) of the key and the renaming from the formula's variables
+                 to those of its alpha-normal form
+        @raise FormulaSyntaxError: If the formula is not well-formed
+        '''
+
+        normal, names = alpha_normal(parse_formula(formula_str))
+        relevant = json.dumps(result_options(**options), sort_keys=True)
+        return (normal, float(complexity_threshold), int(max_depth), relevant), names
+
+
+    def get(self, formula_str: str, complexity_threshold: float, max_depth: int, **options) -> Optional[List[Formula]]:
+        '''
+        Look up the equivalences of a formula, or of any formula that differs from it only
+        in the names of its variables.
+
+        @param formula_str: The input formula as a string
+        @param complexity_threshold: The complexity threshold
+        @param max_depth: The maximum depth to apply equivalences
+        @param options: The keyword arguments passed to iter_equivalences
+        @return: The stored formulae in the formula's own variables, or None if no such
+                 search is in the memo
+        '''
+
+        key, names = self.key(formula_str, complexity_threshold, max_depth, **options)
+        with self._lock:
+            normal_equivalents = self._entries.get(key)
+            if normal_equivalents is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+
+        original = {normal: name for name, normal in names.items()}
+        memo = {}
+        equivalents = [rename_variables(formula, original, memo) for formula in normal_equivalents]
+        if options.get('rewriting') == 'ac':
+            # AC-normal forms order operands by name, which renaming does not preserve
+            memo = {}
+            equivalents = [ac_canonical(formula, memo) for formula in equivalents]
+        return equivalents
+
+
+    def put(self, formula_str: str, complexity_threshold: float, max_depth: int, equivalents: List[Formula], **options):
+        '''
+        Store the complete result of a search, evicting the least recently used search if
+        the memo is full.
+
+        @param formula_str: The input formula as a string
+        @param complexity_threshold: The complexity threshold
+        @param max_depth: The maximum depth to apply equivalences
+        @param equivalents: Every formula the search generated
+        @param options: The keyword arguments passed to iter_equivalences
+        '''
+
+        key, names = self.key(formula_str, complexity_threshold, max_depth, **options)
+        memo = {}
+        normal_equivalents = [rename_variables(formula, names, memo) for formula in equivalents]
+        with self._lock:
+            self._entries[key] = normal_equivalents
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+
+    def stats(self) -> Dict[str, float]:
+        '''
+        Report the use of the memo.
+
+        @return: A dictionary of the hits, misses, hit rate and number of entries
+        '''
+
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': self.hits / lookups if lookups else 0.0,
+                'entries': len(self._entries),
+            }
+
+
+    def clear(self):
+        '''
+        Remove every entry and reset the statistics.
+        '''
+
+        with self._lock:
+            self._entries.clear()
+            self.hits = 0
+            self.misses = 0
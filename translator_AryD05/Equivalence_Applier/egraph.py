@@ -0,0 +1,394 @@
+'''
+This module provides an e-graph (equality saturation) engine for generating equivalent formulae.
+Rather than enumerating every equivalent formula explicitly, the e-graph stores formulae as
+e-classes of equivalent subterms that share structure, saturates it with the equivalences,
+and then extracts formulae from the root e-class.
+
+Equivalences are plain functions on Formula objects, so they are applied to shallow terms
+built from each e-node: positions down to TERM_DEPTH are concrete operators, and below that
+(or in place of any concrete choice) an e-class is represented by a placeholder variable.
+Placeholders are only ever compared for equality, which is then e-class equality.
+'''
+
+
+
+from itertools import chain, islice, product
+from typing import Dict, Iterator, List, Optional, Tuple, Callable
+from Formula.structure import Formula, Variable
+from .equivalences import EQUIVALENCES, index_equivalences
+
+
+# Prefix of placeholder variable names. The parser never produces names containing '#'.
+PLACEHOLDER_PREFIX = '#'
+
+# Depth below the root of a term down to which e-classes are expanded into concrete operators
+TERM_DEPTH = 3
+
+# Maximum number of expansions of one e-class used when building terms
+MAX_EXPANSIONS = 16
+
+EXTRACTIONS = ('all', 'smallest', 'best')
+
+
+class EGraph:
+    '''
+    An e-graph over formulae. E-nodes are tuples of a Formula class followed by the ids of
+    its child e-classes (or the name, for variables); e-classes are merged with union-find
+    and congruence is restored by rebuild().
+    '''
+
+    def __init__(self):
+        self._parent = []
+        # Canonical class id -> e-nodes of the class, as an insertion-ordered dict
+        self.classes = {}
+        # Canonical e-node -> class id
+        self._memo = {}
+
+    def find(self, class_id: int) -> int:
+        parent = self._parent
+        while parent[class_id] != class_id:
+            parent[class_id] = parent[parent[class_id]]
+            class_id = parent[class_id]
+        return class_id
+
+    def canonical(self, enode: tuple) -> tuple:
+        if enode[0] is Variable:
+            return enode
+        return (enode[0],) + tuple(self.find(child) for child in enode[1:])
+
+    def add_enode(self, enode: tuple) -> int:
+        enode = self.canonical(enode)
+        class_id = self._memo.get(enode)
+        if class_id is not None:
+            return self.find(class_id)
+
+        class_id = len(self._parent)
+        self._parent.append(class_id)
+        self.classes[class_id] = {enode: None}
+        self._memo[enode] = class_id
+        return class_id
+
+    def add(self, formula: Formula) -> int:
+        '''
+        Add a formula, which may contain placeholders, to the e-graph.
+
+        @param formula: The formula to add
+        @return: The id of the e-class containing the formula
+        '''
+
+        if isinstance(formula, Variable):
+            if formula.name.startswith(PLACEHOLDER_PREFIX):
+                return self.find(int(formula.name[len(PLACEHOLDER_PREFIX):]))
+            return self.add_enode((Variable, formula.name))
+        return self.add_enode((type(formula),) + tuple(self.add(child) for child in formula.children()))
+
+    def merge(self, first: int, second: int) -> bool:
+        '''
+        Merge two e-classes. Call rebuild() afterwards to restore congruence.
+
+        @return: True if the classes were different
+        '''
+
+        first, second = self.find(first), self.find(second)
+        if first == second:
+            return False
+        if len(self.classes[first]) < len(self.classes[second]):
+            first, second = second, first
+        self._parent[second] = first
+        self.classes[first].update(self.classes.pop(second))
+        return True
+
+    def rebuild(self):
+        '''
+        Re-canonicalise every e-node and merge e-classes that now contain the same e-node,
+        until the e-graph is congruence-closed again.
+        '''
+
+        while True:
+            memo = {}
+            congruent = []
+            for class_id, enodes in self.classes.items():
+                for enode in enodes:
+                    other = memo.setdefault(self.canonical(enode), class_id)
+                    if other != class_id:
+                        congruent.append((other, class_id))
+            if not congruent:
+                break
+            for first, second in congruent:
+                self.merge(first, second)
+
+        self.classes = {class_id: dict.fromkeys(self.canonical(enode) for enode in enodes)
+                        for class_id, enodes in self.classes.items()}
+        self._memo = memo
+
+    def enode_count(self) -> int:
+        return sum(len(enodes) for enodes in self.classes.values())
+
+    def costs(self) -> Dict[int, int]:
+        '''
+        @return: The complexity of the smallest formula in each e-class
+        '''
+
+        return self._costs(lambda enode: True)
+
+    def _costs(self, allowed) -> Dict[int, float]:
+        costs = {class_id: float('inf') for class_id in self.classes}
+        changed = True
+        while changed:
+            changed = False
+            for class_id, enodes in self.classes.items():
+                for enode in enodes:
+                    if not allowed(enode):
+                        continue
+                    cost = 1 if enode[0] is Variable else 1 + sum(costs[self.find(child)] for child in enode[1:])
+                    if cost < costs[class_id]:
+                        costs[class_id] = cost
+                        changed = True
+        return costs
+
+    def depths(self, root: int) -> Dict[int, int]:
+        '''
+        @return: The smallest depth at which each e-class reachable from root occurs
+        '''
+
+        root = self.find(root)
+        depths = {root: 0}
+        frontier = [root]
+        while frontier:
+            next_frontier = []
+            for class_id in frontier:
+                for enode in self.classes[class_id]:
+                    if enode[0] is Variable:
+                        continue
+                    for child in enode[1:]:
+                        child = self.find(child)
+                        if child not in depths:
+                            depths[child] = depths[class_id] + 1
+                            next_frontier.append(child)
+            frontier = next_frontier
+        return depths
+
+    def _build(self, enode: tuple, children: tuple) -> Formula:
+        if enode[0] is Variable:
+            return Variable(enode[1])
+        return enode[0](*children)
+
+    def _expansions(self, class_id: int, depth: int, memo: dict) -> List[Formula]:
+        # The placeholder for the class, then each of its e-nodes over placeholders, then
+        # deeper terms, up to MAX_EXPANSIONS in total. Shallow terms come first so that every
+        # e-node gets a chance before the cap is reached.
+        key = (class_id, depth)
+        if key not in memo:
+            expansions = [self._placeholder(class_id)]
+            if depth < TERM_DEPTH:
+                enodes = list(self.classes[class_id])
+                expansions.extend(self._build(enode, tuple(self._placeholder(child) for child in enode[1:]))
+                                  if enode[0] is not Variable else self._build(enode, ())
+                                  for enode in enodes)
+                shallow = set(expansions)
+                for enode in enodes:
+                    if len(expansions) >= MAX_EXPANSIONS:
+                        break
+                    expansions.extend(term for term in islice(self._terms(enode, depth, memo), MAX_EXPANSIONS)
+                                      if term not in shallow)
+            memo[key] = expansions[:MAX_EXPANSIONS]
+        return memo[key]
+
+    def _placeholder(self, class_id: int) -> Variable:
+        return Variable(f'{PLACEHOLDER_PREFIX}{self.find(class_id)}')
+
+    def _terms(self, enode: tuple, depth: int, memo: dict) -> Iterator[Formula]:
+        if enode[0] is Variable or len(enode) == 1:
+            yield self._build(enode, ())
+            return
+        options = [self._expansions(self.find(child), depth + 1, memo) for child in enode[1:]]
+        for children in product(*options):
+            yield self._build(enode, children)
+
+    def _cost_of(self, formula: Formula, costs: Dict[int, int], memo: dict) -> float:
+        # Complexity of the smallest formula a term with placeholders stands for
+        cost = memo.get(formula)
+        if cost is None:
+            if isinstance(formula, Variable):
+                if formula.name.startswith(PLACEHOLDER_PREFIX):
+                    cost = costs.get(self.find(int(formula.name[len(PLACEHOLDER_PREFIX):])), float('inf'))
+                else:
+                    cost = 1
+            else:
+                cost = 1 + sum(self._cost_of(child, costs, memo) for child in formula.children())
+            memo[formula] = cost
+        return cost
+
+    def saturate(self, root: int, equivalences: Tuple[Callable[[Formula], Formula]], max_complexity: float, max_depth: int, max_iterations: int = 8, max_enodes: int = 20000, cancel=None) -> int:
+        '''
+        Apply equivalences to every e-class within max_depth of the root until nothing
+        changes, max_iterations is reached or the e-graph holds more than max_enodes e-nodes.
+        Rewrites whose smallest form is more complex than max_complexity are not added.
+        If the optional cancel token is cancelled, the matches found so far are added and
+        saturation stops.
+
+        @return: The number of iterations run
+        '''
+
+        index = index_equivalences(tuple(equivalences))
+        iteration = 0
+        # Terms already rewritten in earlier iterations; terms over unchanged e-classes are
+        # rebuilt identically, so they need not be rewritten again
+        rewritten = set()
+
+        while iteration < max_iterations and self.enode_count() <= max_enodes:
+            iteration += 1
+            costs = self.costs()
+            memo = {}
+            # Ordered set of (class id, rewritten term) pairs
+            matches = {}
+
+            for class_id, depth in self.depths(root).items():
+                if cancel is not None and cancel.cancelled:
+                    break
+                if depth > max_depth:
+                    continue
+                for enode in list(self.classes[class_id]):
+                    rules = index[enode[0].operation]
+                    if not rules:
+                        continue
+                    for term in islice(self._terms(enode, 0, memo), MAX_EXPANSIONS * MAX_EXPANSIONS):
+                        if term in rewritten:
+                            continue
+                        rewritten.add(term)
+                        for rule in rules:
+                            new_term = rule(term)
+                            if new_term is not term:
+                                matches[(class_id, new_term)] = None
+
+            changed = False
+            cost_memo = {}
+            for class_id, new_term in matches:
+                if self._cost_of(new_term, costs, cost_memo) > max_complexity:
+                    continue
+                if self.merge(class_id, self.add(new_term)):
+                    changed = True
+            self.rebuild()
+
+            if not changed or (cancel is not None and cancel.cancelled):
+                break
+
+        return iteration
+
+    def _exact(self, class_id: int, size: int, costs: Dict[int, int], memo: dict) -> List[Formula]:
+        # Every formula in the e-class with complexity exactly size
+        key = (class_id, size)
+        if key in memo:
+            return memo[key]
+
+        formulae = []
+        if size >= costs[class_id]:
+            for enode in self.classes[class_id]:
+                if enode[0] is Variable or len(enode) == 1:
+                    if size == 1:
+                        formulae.append(self._build(enode, ()))
+                elif len(enode) == 2:
+                    formulae.extend(enode[0](operand) for operand in self._exact(self.find(enode[1]), size - 1, costs, memo))
+                else:
+                    left_id, right_id = self.find(enode[1]), self.find(enode[2])
+                    for left_size in range(1, size - 1):
+                        lefts = self._exact(left_id, left_size, costs, memo)
+                        if not lefts:
+                            continue
+                        rights = self._exact(right_id, size - 1 - left_size, costs, memo)
+                        formulae.extend(enode[0](left, right) for left in lefts for right in rights)
+
+        memo[key] = formulae
+        return formulae
+
+    def extract_all(self, root: int, max_complexity: float, cancel=None) -> Iterator[Formula]:
+        '''
+        Yield every formula in the root e-class no more complex than max_complexity,
+        smallest first, until the optional cancel token is cancelled.
+        '''
+
+        root = self.find(root)
+        costs = self.costs()
+        memo = {}
+        size = 1
+        while size <= max_complexity:
+            for formula in self._exact(root, size, costs, memo):
+                if cancel is not None and cancel.cancelled:
+                    return
+                yield formula
+            size += 1
+
+    def extract_best(self, root: int, allowed_mask: Optional[int] = None) -> Optional[Formula]:
+        '''
+        Extract the smallest formula in the root e-class using only allowed operations.
+
+        @param allowed_mask: Bitmask of allowed operations, or None to allow all of them
+        @return: The smallest such formula, or None if there is none
+        '''
+
+        if allowed_mask is None:
+            allowed = lambda enode: True
+        else:
+            allowed = lambda enode: enode[0]._bit & ~allowed_mask == 0
+        costs = self._costs(allowed)
+
+        def build(class_id):
+            class_id = self.find(class_id)
+            for enode in self.classes[class_id]:
+                if not allowed(enode):
+                    continue
+                cost = 1 if enode[0] is Variable else 1 + sum(costs[self.find(child)] for child in enode[1:])
+                if cost == costs[class_id]:
+                    children = () if enode[0] is Variable else tuple(build(child) for child in enode[1:])
+                    return self._build(enode, children)
+
+        root = self.find(root)
+        if costs[root] == float('inf'):
+            return None
+        return build(root)
+
+
+def iter_egraph_equivalences(formula: Formula, max_complexity: float, max_depth: int, extraction: str = 'all', count: Optional[int] = None, allowed_mask: Optional[int] = None, equivalences: Tuple[Callable[[Formula], Formula]] = EQUIVALENCES, cancel=None) -> Iterator[Formula]:
+    '''
+    Generate formulae equivalent to a formula by equality saturation. The e-graph is
+    saturated straight away; formulae are then extracted as the iterator is consumed.
+
+    @param formula: The formula to start from
+    @param max_complexity: The maximum complexity of generated formulae
+    @param max_depth: The maximum depth at which equivalences are applied
+    @param extraction: 'all' for every formula within max_complexity, 'smallest' for the
+                       count smallest, or 'best' for the smallest using only allowed operations
+    @param count: The number of formulae to extract with 'smallest', the original included
+    @param allowed_mask: Bitmask of allowed operations for 'best'
+    @param equivalences: A tuple of equivalence functions to saturate with
+    @param cancel: Optional CancelToken that cuts saturation and extraction short
+    @return: An iterator over equivalent formulae, the original formula first for 'all' and 'smallest'
+    '''
+
+    if extraction not in EXTRACTIONS:
+        raise ValueError(f"Unknown extraction '{extraction}'. Use one of: {', '.join(EXTRACTIONS)}")
+
+    egraph = EGraph()
+    root = egraph.add(formula)
+    egraph.saturate(root, equivalences, max_complexity, max_depth, cancel=cancel)
+
+    if extraction == 'best':
+        best = egraph.extract_best(root, allowed_mask)
+        return iter([best] if best is not None else [])
+
+    # The original formula comes first, and counts towards the formulae extracted
+    formulae = chain([formula], (f for f in egraph.extract_all(root, max_complexity, cancel) if f is not formula))
+    if extraction == 'smallest':
+        formulae = islice(formulae, count if count is not None else 10)
+    return formulae
+
+
+def egraph_equivalences(formula: Formula, max_complexity: float, max_depth: int, extraction: str = 'all', count: Optional[int] = None, allowed_mask: Optional[int] = None, equivalences: Tuple[Callable[[Formula], Formula]] = EQUIVALENCES, cancel=None) -> List[Formula]:
+    '''
+    Generate formulae equivalent to a formula by equality saturation.
+    Takes the same arguments as iter_egraph_equivalences.
+
+    @return: A list of equivalent formulae, the original formula first for 'all' and 'smallest'
+    '''
+
+    return list(iter_egraph_equivalences(formula, max_complexity, max_depth, extraction, count, allowed_mask, equivalences, cancel))
@@ -1,44 +1,86 @@
 '''
 This module defines logical equivalences for formula transformations.
 It includes a set of equivalence functions and a tuple of all available equivalences.
+
+Each equivalence is registered with the root operations it can rewrite, so that it is
+only ever called on formulae whose root is one of those operations.
 '''
 
 
 
-from Formula.structure import Formula, Variable, Not, And, Or, Implication, Biconditional, Truth, Falsity, Next, Globally, Finally, Until, Release
-from typing import Tuple, Callable
+from Formula.structure import Operation, Formula, Variable, Not, And, Or, Implication, Biconditional, Truth, Falsity, Next, Globally, Finally, Until, Release
+from typing import Tuple, Callable, Dict
 
 
 # Define a type for equivalence functions
 EquivalenceFunction = Callable[[Formula], Formula]
 
 
+def equivalence(*operations: Operation) -> Callable[[EquivalenceFunction], EquivalenceFunction]:
+    '''
+    Register the root operations an equivalence function applies to.
+    For any formula whose root is not one of these operations the function must return the
+    formula unchanged. Functions that are not registered are assumed to apply everywhere.
+
+    @param operations: The operations the equivalence can rewrite at the root
+    @return: A decorator recording the operations on the function
+    '''
+
+    def register(function: EquivalenceFunction) -> EquivalenceFunction:
+        function.operations = frozenset(operations)
+        return function
+
+    return register
+
+
+def index_equivalences(equivalences: Tuple[EquivalenceFunction, ...]) -> Dict[Operation, Tuple[EquivalenceFunction, ...]]:
+    '''
+    Index equivalences by the root operations they apply to, keeping their order.
+
+    @param equivalences: A tuple of equivalence functions
+    @return: A dictionary from each operation to the equivalences applicable at that root
+    '''
+
+    all_operations = frozenset(Operation)
+    index = {}
+    for operation in Operation:
+        index[operation] = tuple(function for function in equivalences
+                                 if operation in getattr(function, 'operations', all_operations))
+    return index
+
+
 # Define the equivalences
+@equivalence(Operation.IMPLICATION)
 def implication_to_disjunction(formula: Formula) -> Formula:
     if isinstance(formula, Implication):
         return Or(Not(formula.left), formula.right)
     return formula
 
+@equivalence(Operation.BICONDITIONAL)
 def biconditional_to_implications(formula: Formula) -> Formula:
     if isinstance(formula, Biconditional):
         return And(Implication(formula.left, formula.right), Implication(formula.right, formula.left))
     return formula
 
+@equivalence(Operation.NOT)
 def double_negation(formula: Formula) -> Formula:
     if isinstance(formula, Not) and isinstance(formula.operand, Not):
         return formula.operand.operand
     return formula
 
+@equivalence(Operation.NOT)
 def de_morgan_not_and(formula: Formula) -> Formula:
     if isinstance(formula, Not) and isinstance(formula.operand, And):
         return Or(Not(formula.operand.left), Not(formula.operand.right))
     return formula
 
+@equivalence(Operation.NOT)
 def de_morgan_not_or(formula: Formula) -> Formula:
     if isinstance(formula, Not) and isinstance(formula.operand, Or):
         return And(Not(formula.operand.left), Not(formula.operand.right))
     return formula
 
+@equivalence(Operation.AND, Operation.OR)
 def distributive_law_and_or(formula: Formula) -> Formula:
     if isinstance(formula, And) and isinstance(formula.right, Or):
         return Or(And(formula.left, formula.right.left), And(formula.left, formula.right.right))
@@ -46,48 +88,57 @@ def distributive_law_and_or(formula: Formula) -> Formula:
         return And(Or(formula.left, formula.right.left), Or(formula.left, formula.right.right))
     return formula
 
+@equivalence(Operation.AND)
 def commutativity_and(formula: Formula) -> Formula:
     if isinstance(formula, And):
         return And(formula.right, formula.left)
     return formula
 
+@equivalence(Operation.OR)
 def commutativity_or(formula: Formula) -> Formula:
     if isinstance(formula, Or):
         return Or(formula.right, formula.left)
     return formula
 
+@equivalence(Operation.AND)
 def associativity_and(formula: Formula) -> Formula:
     if isinstance(formula, And) and isinstance(formula.right, And):
         return And(And(formula.left, formula.right.left), formula.right.right)
     return formula
 
+@equivalence(Operation.OR)
 def associativity_or(formula: Formula) -> Formula:
     if isinstance(formula, Or) and isinstance(formula.right, Or):
         return Or(Or(formula.left, formula.right.left), formula.right.right)
     return formula
 
+@equivalence(Operation.AND)
 def absorption_and(formula: Formula) -> Formula:
     if isinstance(formula, And) and isinstance(formula.right, Or):
         if formula.left == formula.right.left:
             return formula.left
     return formula
 
+@equivalence(Operation.OR)
 def absorption_or(formula: Formula) -> Formula:
     if isinstance(formula, Or) and isinstance(formula.right, And):
         if formula.left == formula.right.left:
             return formula.left
     return formula
 
+@equivalence(Operation.AND)
 def idempotence_and(formula: Formula) -> Formula:
     if isinstance(formula, And) and formula.left == formula.right:
         return formula.left
     return formula
 
+@equivalence(Operation.OR)
 def idempotence_or(formula: Formula) -> Formula:
     if isinstance(formula, Or) and formula.left == formula.right:
         return formula.left
     return formula
 
+@equivalence(Operation.AND)
 def and_truth(formula: Formula) -> Formula:
     if isinstance(formula, And):
         if isinstance(formula.left, Truth):
@@ -96,18 +147,21 @@ def and_truth(formula: Formula) -> Formula:
             return formula.left
     return formula
 
+@equivalence(Operation.OR)
 def or_truth(formula: Formula) -> Formula:
     if isinstance(formula, Or):
         if isinstance(formula.left, Truth) or isinstance(formula.right, Truth):
             return Truth()
     return formula
 
+@equivalence(Operation.AND)
 def and_falsity(formula: Formula) -> Formula:
     if isinstance(formula, And):
         if isinstance(formula.left, Falsity) or isinstance(formula.right, Falsity):
             return Falsity()
     return formula
 
+@equivalence(Operation.OR)
 def or_falsity(formula: Formula) -> Formula:
     if isinstance(formula, Or):
         if isinstance(formula.left, Falsity):
@@ -116,16 +170,19 @@ def or_falsity(formula: Formula) -> Formula:
             return formula.left
     return formula
 
+@equivalence(Operation.NOT)
 def not_truth(formula: Formula) -> Formula:
     if isinstance(formula, Not) and isinstance(formula.operand, Truth):
         return Falsity()
     return formula
 
+@equivalence(Operation.NOT)
 def not_falsity(formula: Formula) -> Formula:
     if isinstance(formula, Not) and isinstance(formula.operand, Falsity):
         return Truth()
     return formula
 
+@equivalence(Operation.OR)
 def law_of_excluded_middle(formula: Formula) -> Formula:
     if isinstance(formula, Or):
         left, right = formula.left, formula.right
@@ -138,6 +195,7 @@ def law_of_excluded_middle(formula: Formula) -> Formula:
                 return Truth()
     return formula
 
+@equivalence(Operation.AND)
 def non_contradiction_to_falsity(formula: Formula) -> Formula:
     if isinstance(formula, And):
         if isinstance(formula.left, Not) and formula.left.operand == formula.right:
@@ -146,325 +204,388 @@ def non_contradiction_to_falsity(formula: Formula) -> Formula:
             return Falsity()
     return formula
 
+@equivalence(Operation.NEXT)
 def distribute_next_over_and(formula: Formula) -> Formula:
     if isinstance(formula, Next) and isinstance(formula.operand, And):
         return And(Next(formula.operand.left), Next(formula.operand.right))
     return formula
 
+@equivalence(Operation.NEXT)
 def distribute_next_over_or(formula: Formula) -> Formula:
     if isinstance(formula, Next) and isinstance(formula.operand, Or):
         return Or(Next(formula.operand.left), Next(formula.operand.right))
     return formula
 
+@equivalence(Operation.NEXT)
 def distribute_next_over_until(formula: Formula) -> Formula:
     if isinstance(formula, Next) and isinstance(formula.operand, Until):
         return Until(Next(formula.operand.left), Next(formula.operand.right))
     return formula
 
+@equivalence(Operation.FINALLY)
 def distribute_finally_over_or(formula: Formula) -> Formula:
     if isinstance(formula, Finally) and isinstance(formula.operand, Or):
         return Or(Finally(formula.operand.left), Finally(formula.operand.right))
     return formula
 
+@equivalence(Operation.GLOBALLY)
 def distribute_globally_over_and(formula: Formula) -> Formula:
     if isinstance(formula, Globally) and isinstance(formula.operand, And):
         return And(Globally(formula.operand.left), Globally(formula.operand.right))
     return formula
 
+@equivalence(Operation.UNTIL)
 def distribute_until_over_or(formula: Formula) -> Formula:
     if isinstance(formula, Until) and isinstance(formula.left, Or):
         return Or(Until(formula.left.left, formula.right), Until(formula.left.right, formula.right))
     return formula
 
+@equivalence(Operation.AND)
 def distribute_and_over_until(formula: Formula) -> Formula:
     if isinstance(formula, And) and isinstance(formula.left, Until) and isinstance(formula.right, Until):
         if formula.left.left == formula.right.left:
             return Until(formula.left.left, And(formula.left.right, formula.right.right))
     return formula
 
+@equivalence(Operation.NOT)
 def negate_next(formula: Formula) -> Formula:
     if isinstance(formula, Not) and isinstance(formula.operand, Next):
         return Next(Not(formula.operand.operand))
     return formula
 
+@equivalence(Operation.NOT)
 def negate_finally(formula: Formula) -> Formula:
     if isinstance(formula, Not) and isinstance(formula.operand, Finally):
         return Globally(Not(formula.operand.operand))
     return formula
 
+@equivalence(Operation.NOT)
 def negate_until(formula: Formula) -> Formula:
     if isinstance(formula, Not) and isinstance(formula.operand, Until):
         return Release(Not(formula.operand.left), Not(formula.operand.right))
     return formula
 
+@equivalence(Operation.NOT)
 def negate_globally(formula: Formula) -> Formula:
     if isinstance(formula, Not) and isinstance(formula.operand, Globally):
         return Finally(Not(formula.operand.operand))
     return formula
 
+@equivalence(Operation.NOT)
 def negate_release(formula: Formula) -> Formula:
     if isinstance(formula, Not) and isinstance(formula.operand, Release):
         return Until(Not(formula.operand.left), Not(formula.operand.right))
     return formula
 
+@equivalence(Operation.FINALLY)
 def finally_idempotence(formula: Formula) -> Formula:
     if isinstance(formula, Finally) and isinstance(formula.operand, Finally):
         return Finally(formula.operand.operand)
     return formula
 
+@equivalence(Operation.GLOBALLY)
 def globally_idempotence(formula: Formula) -> Formula:
     if isinstance(formula, Globally) and isinstance(formula.operand, Globally):
         return Globally(formula.operand.operand)
     return formula
 
+@equivalence(Operation.UNTIL)
 def until_idempotence(formula: Formula) -> Formula:
     if isinstance(formula, Until) and isinstance(formula.right, Until) and formula.left == formula.right.left:
         return Until(formula.left, formula.right.right)
     return formula
 
+@equivalence(Operation.UNTIL)
 def until_expansion(formula: Formula) -> Formula:
     if isinstance(formula, Until):
         return Or(formula.right, And(formula.left, Next(formula)))
     return formula
 
+@equivalence(Operation.RELEASE)
 def release_expansion(formula: Formula) -> Formula:
     if isinstance(formula, Release):
         return And(formula.right, Or(formula.left, Next(formula)))
     return formula
 
+@equivalence(Operation.GLOBALLY)
 def globally_expansion(formula: Formula) -> Formula:
     if isinstance(formula, Globally):
         return And(formula.operand, Next(formula))
     return formula
 
+@equivalence(Operation.FINALLY)
 def finally_expansion(formula: Formula) -> Formula:
     if isinstance(formula, Finally):
         return Or(formula.operand, Next(formula))
     return formula
 
+@equivalence(Operation.FINALLY)
 def finally_to_until(formula: Formula) -> Formula:
     if isinstance(formula, Finally):
         return Until(Truth(), formula.operand)
     return formula
 
+@equivalence(Operation.GLOBALLY)
 def globally_to_release(formula: Formula) -> Formula:
     if isinstance(formula, Globally):
         return Release(Falsity(), formula.operand)
     return formula
 
+@equivalence(Operation.OR)
 def reverse_implication_to_disjunction(formula: Formula) -> Formula:
     if isinstance(formula, Or) and isinstance(formula.left, Not):
         return Implication(formula.left.operand, formula.right)
     return formula
 
+@equivalence(Operation.AND)
 def reverse_biconditional_to_implications(formula: Formula) -> Formula:
     if isinstance(formula, And) and isinstance(formula.left, Implication) and isinstance(formula.right, Implication):
         if formula.left.left == formula.right.right and formula.left.right == formula.right.left:
             return Biconditional(formula.left.left, formula.left.right)
     return formula
 
+@equivalence(Operation.VARIABLE, Operation.NOT, Operation.TRUE, Operation.FALSE)
 def reverse_double_negation(formula: Formula) -> Formula:
     if not isinstance(formula, (And, Or, Implication, Biconditional, Next, Finally, Globally, Until, Release)):
         return Not(Not(formula))
     return formula
 
+@equivalence(Operation.OR)
 def reverse_de_morgan_not_and(formula: Formula) -> Formula:
     if isinstance(formula, Or) and isinstance(formula.left, Not) and isinstance(formula.right, Not):
         return Not(And(formula.left.operand, formula.right.operand))
     return formula
 
+@equivalence(Operation.AND)
 def reverse_de_morgan_not_or(formula: Formula) -> Formula:
     if isinstance(formula, And) and isinstance(formula.left, Not) and isinstance(formula.right, Not):
         return Not(Or(formula.left.operand, formula.right.operand))
     return formula
 
+@equivalence(Operation.OR)
 def reverse_distributive_law_and_or(formula: Formula) -> Formula:
     if isinstance(formula, Or) and isinstance(formula.left, And) and isinstance(formula.right, And):
         if formula.left.left == formula.right.left:
             return And(formula.left.left, Or(formula.left.right, formula.right.right))
     return formula
 
+@equivalence(Operation.AND)
 def reverse_commutativity_and(formula: Formula) -> Formula:
     if isinstance(formula, And):
         return And(formula.right, formula.left)
     return formula
 
+@equivalence(Operation.OR)
 def reverse_commutativity_or(formula: Formula) -> Formula:
     if isinstance(formula, Or):
         return Or(formula.right, formula.left)
     return formula
 
+@equivalence(Operation.AND)
 def reverse_associativity_and(formula: Formula) -> Formula:
     if isinstance(formula, And) and isinstance(formula.left, And):
         return And(formula.left.left, And(formula.left.right, formula.right))
     return formula
 
+@equivalence(Operation.OR)
 def reverse_associativity_or(formula: Formula) -> Formula:
     if isinstance(formula, Or) and isinstance(formula.left, Or):
         return Or(formula.left.left, Or(formula.left.right, formula.right))
     return formula
 
+@equivalence(Operation.VARIABLE, Operation.NOT, Operation.TRUE, Operation.FALSE)
 def reverse_idempotence_and(formula: Formula) -> Formula:
     if not isinstance(formula, (And, Or, Implication, Biconditional, Next, Finally, Globally, Until, Release)):
         return And(formula, formula)
     return formula
 
+@equivalence(Operation.VARIABLE, Operation.NOT, Operation.TRUE, Operation.FALSE)
 def reverse_idempotence_or(formula: Formula) -> Formula:
     if not isinstance(formula, (And, Or, Implication, Biconditional, Next, Finally, Globally, Until, Release)):
         return Or(formula, formula)
     return formula
 
+@equivalence(Operation.VARIABLE, Operation.NOT, Operation.TRUE, Operation.FALSE)
 def reverse_and_truth(formula: Formula) -> Formula:
     if not isinstance(formula, (And, Or, Implication, Biconditional, Next, Finally, Globally, Until, Release)):
         return And(formula, Truth())
     return formula
 
+@equivalence(Operation.VARIABLE, Operation.NOT, Operation.TRUE, Operation.FALSE)
 def reverse_or_falsity(formula: Formula) -> Formula:
     if not isinstance(formula, (And, Or, Implication, Biconditional, Next, Finally, Globally, Until, Release)):
         return Or(formula, Falsity())
     return formula
 
+@equivalence(Operation.FALSE)
 def reverse_not_truth(formula: Formula) -> Formula:
     if isinstance(formula, Falsity):
         return Not(Truth())
     return formula
 
+@equivalence(Operation.TRUE)
 def reverse_not_falsity(formula: Formula) -> Formula:
     if isinstance(formula, Truth):
         return Not(Falsity())
     return formula
 
+@equivalence(Operation.AND)
 def reverse_distribute_next_over_and(formula: Formula) -> Formula:
     if isinstance(formula, And) and isinstance(formula.left, Next) and isinstance(formula.right, Next):
         return Next(And(formula.left.operand, formula.right.operand))
     return formula
 
+@equivalence(Operation.OR)
 def reverse_distribute_next_over_or(formula: Formula) -> Formula:
     if isinstance(formula, Or) and isinstance(formula.left, Next) and isinstance(formula.right, Next):
         return Next(Or(formula.left.operand, formula.right.operand))
     return formula
 
+@equivalence(Operation.UNTIL)
 def reverse_distribute_next_over_until(formula: Formula) -> Formula:
     if isinstance(formula, Until) and isinstance(formula.left, Next) and isinstance(formula.right, Next):
         return Next(Until(formula.left.operand, formula.right.operand))
     return formula
 
+@equivalence(Operation.OR)
 def reverse_distribute_finally_over_or(formula: Formula) -> Formula:
     if isinstance(formula, Or) and isinstance(formula.left, Finally) and isinstance(formula.right, Finally):
         return Finally(Or(formula.left.operand, formula.right.operand))
     return formula
 
+@equivalence(Operation.AND)
 def reverse_distribute_globally_over_and(formula: Formula) -> Formula:
     if isinstance(formula, And) and isinstance(formula.left, Globally) and isinstance(formula.right, Globally):
         return Globally(And(formula.left.operand, formula.right.operand))
     return formula
 
+@equivalence(Operation.OR)
 def reverse_distribute_until_over_or(formula: Formula) -> Formula:
     if isinstance(formula, Or) and isinstance(formula.left, Until) and isinstance(formula.right, Until):
         if formula.left.right == formula.right.right:
             return Until(Or(formula.left.left, formula.right.left), formula.left.right)
     return formula
 
+@equivalence(Operation.UNTIL)
 def reverse_distribute_and_over_until(formula: Formula) -> Formula:
     if isinstance(formula, Until) and isinstance(formula.right, And):
         return And(Until(formula.left, formula.right.left), Until(formula.left, formula.right.right))
     return formula
 
+@equivalence(Operation.NEXT)
 def reverse_negate_next(formula: Formula) -> Formula:
     if isinstance(formula, Next) and isinstance(formula.operand, Not):
         return Not(Next(formula.operand.operand))
     return formula
 
+@equivalence(Operation.GLOBALLY)
 def reverse_negate_finally(formula: Formula) -> Formula:
     if isinstance(formula, Globally) and isinstance(formula.operand, Not):
         return Not(Finally(formula.operand.operand))
     return formula
 
+@equivalence(Operation.RELEASE)
 def reverse_negate_until(formula: Formula) -> Formula:
     if isinstance(formula, Release) and isinstance(formula.left, Not) and isinstance(formula.right, Not):
         return Not(Until(formula.left.operand, formula.right.operand))
     return formula
 
+@equivalence(Operation.FINALLY)
 def reverse_negate_globally(formula: Formula) -> Formula:
     if isinstance(formula, Finally) and isinstance(formula.operand, Not):
         return Not(Globally(formula.operand.operand))
     return formula
 
+@equivalence(Operation.UNTIL)
 def reverse_negate_release(formula: Formula) -> Formula:
     if isinstance(formula, Until) and isinstance(formula.left, Not) and isinstance(formula.right, Not):
         return Not(Release(formula.left.operand, formula.right.operand))
     return formula
 
+@equivalence(Operation.FINALLY)
 def reverse_finally_idempotence(formula: Formula) -> Formula:
     if isinstance(formula, Finally):
         return Finally(Finally(formula.operand))
     return formula
 
+@equivalence(Operation.GLOBALLY)
 def reverse_globally_idempotence(formula: Formula) -> Formula:
     if isinstance(formula, Globally):
         return Globally(Globally(formula.operand))
     return formula
 
+@equivalence(Operation.UNTIL)
 def reverse_until_idempotence(formula: Formula) -> Formula:
     if isinstance(formula, Until):
         return Until(formula.left, Until(formula.left, formula.right))
     return formula
 
+@equivalence(Operation.OR)
 def reverse_until_expansion(formula: Formula) -> Formula:
     if isinstance(formula, Or) and isinstance(formula.right, And) and isinstance(formula.right.right, Next):
         if isinstance(formula.right.right.operand, Until) and formula.right.left == formula.right.right.operand.left:
             return formula.right.right.operand
     return formula
 
+@equivalence(Operation.AND)
 def reverse_release_expansion(formula: Formula) -> Formula:
     if isinstance(formula, And) and isinstance(formula.right, Or) and isinstance(formula.right.right, Next):
         if isinstance(formula.right.right.operand, Release) and formula.right.left == formula.right.right.operand.left:
             return formula.right.right.operand
     return formula
 
+@equivalence(Operation.AND)
 def reverse_globally_expansion(formula: Formula) -> Formula:
     if isinstance(formula, And) and isinstance(formula.right, Next):
         if isinstance(formula.right.operand, Globally) and formula.left == formula.right.operand.operand:
             return formula.right.operand
     return formula
 
+@equivalence(Operation.OR)
 def reverse_finally_expansion(formula: Formula) -> Formula:
     if isinstance(formula, Or) and isinstance(formula.right, Next):
         if isinstance(formula.right.operand, Finally) and formula.left == formula.right.operand.operand:
             return formula.right.operand
     return formula
 
+@equivalence(Operation.UNTIL)
 def reverse_finally_to_until(formula: Formula) -> Formula:
     if isinstance(formula, Until) and isinstance(formula.left, Truth):
         return Finally(formula.right)
     return formula
 
+@equivalence(Operation.RELEASE)
 def reverse_globally_to_release(formula: Formula) -> Formula:
     if isinstance(formula, Release) and isinstance(formula.left, Falsity):
         return Globally(formula.right)
     return formula
 
+@equivalence(Operation.IMPLICATION)
 def implication_to_true(formula: Formula) -> Formula:
     if isinstance(formula, Implication) and formula.left == formula.right:
         return Truth()
     return formula
 
+@equivalence(Operation.IMPLICATION)
 def false_implies_anything(formula: Formula) -> Formula:
     if isinstance(formula, Implication):
         if isinstance(formula.left, Falsity):
             return Truth()
     return formula
 
+@equivalence(Operation.IMPLICATION)
 def implication_to_negation(formula: Formula) -> Formula:
     if isinstance(formula, Implication):
         return Or(Not(formula.left), formula.right)
     return formula
 
+@equivalence(Operation.OR)
 def reverse_implication_to_negation(formula: Formula) -> Formula:
     if isinstance(formula, Or) and isinstance(formula.left, Not):
         return Implication(formula.left.operand, formula.right)
     return formula
 
+@equivalence(Operation.OR)
 def xor_equivalence(formula: Formula) -> Formula:
     if isinstance(formula, Or) and isinstance(formula.left, And) and isinstance(formula.right, And):
         a = formula.left.left
@@ -476,6 +597,7 @@ def xor_equivalence(formula: Formula) -> Formula:
             return Not(Biconditional(a, b))
     return formula
 
+@equivalence(Operation.NOT)
 def reverse_xor_equivalence(formula: Formula) -> Formula:
     if isinstance(formula, Not) and isinstance(formula.operand, Biconditional):
         a, b = formula.operand.left, formula.operand.right
@@ -572,4 +694,21 @@ EQUIVALENCES: Tuple[EquivalenceFunction] = (
     xor_equivalence,
     reverse_xor_equivalence
     # Add more equivalences here if needed
-)
\ No newline at end of file
+)
+
+
+# EQUIVALENCES indexed by root operation
+EQUIVALENCES_BY_OPERATION = index_equivalences(EQUIVALENCES)
+
+# Commutativity and associativity of & and |. Searches in AC-normal form leave these out, as
+# every formula they produce has the same normal form as the one they are applied to.
+AC_EQUIVALENCES: Tuple[EquivalenceFunction] = (
+    commutativity_and,
+    commutativity_or,
+    associativity_and,
+    associativity_or,
+    reverse_commutativity_and,
+    reverse_commutativity_or,
+    reverse_associativity_and,
+    reverse_associativity_or,
+)
@@ -1,12 +1,82 @@
 '''
 This module provides functionality to filter equivalences based on allowed operators.
 It ensures that only formulae containing specified operators are included in the result.
+
+Each formula carries a bitmask of the operations it uses (Formula.operator_mask), and a set
+of allowed operator symbols is compiled to a mask of the same kind, so a formula is allowed
+exactly when formula.operator_mask & ~allowed_mask == 0.
 '''
 
 
 
-from typing import List, Set
-from Formula.structure import Formula, Variable, Not, And, Or, Implication, Biconditional, Truth, Falsity, Next, Finally, Globally, Until, Release
+import logging
+from typing import Iterable, Iterator, List, Set, Union
+from Formula.structure import Operation, Formula
+
+
+logger = logging.getLogger(__name__)
+
+
+# The operation each operator symbol stands for
+OPERATOR_SYMBOLS = {
+    '!': Operation.NOT,
+    '&': Operation.AND,
+    '|': Operation.OR,
+    '->': Operation.IMPLICATION,
+    '<->': Operation.BICONDITIONAL,
+    'X': Operation.NEXT,
+    'F': Operation.FINALLY,
+    'G': Operation.GLOBALLY,
+    'U': Operation.UNTIL,
+    'R': Operation.RELEASE,
+    '1': Operation.TRUE,
+    '0': Operation.FALSE,
+}
+
+
+def operator_mask(allowed_operators: Set[str]) -> int:
+    '''
+    Compile a set of allowed operator symbols to a bitmask of operations.
+    Variables are always allowed.
+
+    @param allowed_operators: A set of allowed operator symbols
+    @return: The bitwise OR of Operation.bit for the allowed operations
+    '''
+
+    mask = Operation.VARIABLE.bit
+    for symbol in allowed_operators:
+        if symbol in OPERATOR_SYMBOLS:
+            mask |= OPERATOR_SYMBOLS[symbol].bit
+    return mask
+
+
+def is_allowed(formula: Formula, allowed_operators: Union[Set[str], int]) -> bool:
+    '''
+    Check whether a formula uses only allowed operators.
+    Every formula carries the mask of the operations it uses, so this is O(1).
+
+    @param formula: The formula to check
+    @param allowed_operators: A set of allowed operator symbols, or a mask built by operator_mask
+    @return: True if every operator in the formula is allowed
+    '''
+
+    allowed_mask = allowed_operators if isinstance(allowed_operators, int) else operator_mask(allowed_operators)
+    return formula.operator_mask & ~allowed_mask == 0
+
+
+def iter_filtered(equivalences: Iterable[Formula], allowed_operators: Union[Set[str], int]) -> Iterator[Formula]:
+    '''
+    Filter a stream of equivalences based on allowed operators, lazily.
+
+    @param equivalences: An iterable of formulae to filter
+    @param allowed_operators: A set of allowed operator symbols, or a mask built by operator_mask
+    @return: An iterator over the formulae containing only allowed operators
+    '''
+
+    excluded = ~(allowed_operators if isinstance(allowed_operators, int) else operator_mask(allowed_operators))
+    for formula in equivalences:
+        if formula.operator_mask & excluded == 0:
+            yield formula
 
 
 def filter_equivalences(equivalences: List[Formula], allowed_operators: Set[str]) -> List[Formula]:
@@ -17,43 +87,12 @@ def filter_equivalences(equivalences: List[Formula], allowed_operators: Set[str]
     @param allowed_operators: A set of allowed operator symbols
     @return: A list of formulae containing only allowed operators
     '''
-    
-
-    def is_allowed(formula: Formula) -> bool:
-        if isinstance(formula, Variable):
-            return True
-        elif isinstance(formula, Truth) and '1' in allowed_operators:
-            return True
-        elif isinstance(formula, Falsity) and '0' in allowed_operators:
-            return True
-        elif isinstance(formula, Not) and '!' in allowed_operators:
-            return is_allowed(formula.operand)
-        elif isinstance(formula, And) and '&' in allowed_operators:
-            return is_allowed(formula.left) and is_allowed(formula.right)
-        elif isinstance(formula, Or) and '|' in allowed_operators:
-            return is_allowed(formula.left) and is_allowed(formula.right)
-        elif isinstance(formula, Implication) and '->' in allowed_operators:
-            return is_allowed(formula.left) and is_allowed(formula.right)
-        elif isinstance(formula, Biconditional) and '<->' in allowed_operators:
-            return is_allowed(formula.left) and is_allowed(formula.right)
-        elif isinstance(formula, Next) and 'X' in allowed_operators:
-            return is_allowed(formula.operand)
-        elif isinstance(formula, Finally) and 'F' in allowed_operators:
-            return is_allowed(formula.operand)
-        elif isinstance(formula, Globally) and 'G' in allowed_operators:
-            return is_allowed(formula.operand)
-        elif isinstance(formula, Until) and 'U' in allowed_operators:
-            return is_allowed(formula.left) and is_allowed(formula.right)
-        elif isinstance(formula, Release) and 'R' in allowed_operators:
-            return is_allowed(formula.left) and is_allowed(formula.right)
-        else:
-            return False
-
-    print(f"Filtering {len(equivalences)} equivalences with allowed operators: {allowed_operators}")
-
-
-    filtered_equivalences = [eq for eq in equivalences if is_allowed(eq)]
-
-    print(f"Filtered to {len(filtered_equivalences)} equivalences")
-
-    return filtered_equivalences
\ No newline at end of file
+
+    logger.debug("Filtering %d equivalences with allowed operators: %s", len(equivalences), allowed_operators)
+
+    excluded = ~operator_mask(allowed_operators)
+    filtered_equivalences = [eq for eq in equivalences if eq.operator_mask & excluded == 0]
+
+    logger.debug("Filtered to %d equivalences", len(filtered_equivalences))
+
+    return filtered_equivalences
@@ -0,0 +1,127 @@
+'''
+This module runs the equivalence search in a separate process, so that a search that
+has to be abandoned can be killed outright and all of its memory given back, rather
+than relying on the search noticing that it has been cancelled.
+
+Formulae are sent back to the parent in batches as they are found, using the compact
+encoding of Formula.serialization, so the formulae found before the process is killed
+are kept.
+'''
+
+
+
+import multiprocessing
+import time
+from typing import Iterator, Optional
+from Formula.structure import Formula
+from Formula.parser import parse_formula
+from Formula.serialization import encode_formulae, decode_formulae
+from .applier import iter_equivalences, CancelToken, SearchStats
+
+
+# Largest number of formulae sent to the parent in one message
+BATCH_SIZE = 256
+
+# Longest time, in seconds, the child holds on to formulae before sending them
+FLUSH_INTERVAL = 0.1
+
+# Longest time the parent waits for a message before checking its cancel token again
+POLL_INTERVAL = 0.05
+
+
+def _search_worker(connection, args: tuple, options: dict, stats_interval: Optional[float] = None):
+    # Runs in the child process. Messages are ('formulae', encoded batch), ('stats',
+    # SearchStats snapshot), ('error', exception) and ('done', None).
+    try:
+        batch = []
+        flushed = time.monotonic()
+
+        def flush():
+            nonlocal batch, flushed
+            if batch:
+                connection.send(('formulae', encode_formulae(batch)))
+                batch = []
+            flushed = time.monotonic()
+
+        def report(stats):
+            # The formulae counted in the stats are sent first
+            flush()
+            connection.send(('stats', stats.to_dict()))
+
+        if stats_interval is not None:
+            options = dict(options, stats=SearchStats(report, stats_interval))
+        for formula in iter_equivalences(*args, **options):
+            batch.append(formula)
+            if len(batch) >= BATCH_SIZE or time.monotonic() - flushed >= FLUSH_INTERVAL:
+                flush()
+        flush()
+        connection.send(('done', None))
+    except Exception as e:
+        connection.send(('error', e))
+    finally:
+        connection.close()
+
+
+def iter_equivalences_in_subprocess(formula_str: str, complexity_threshold: float, max_depth: int, cancel: Optional[CancelToken] = None, **options) -> Iterator[Formula]:
+    '''
+    Generate equivalent formulae like iter_equivalences, running the search in a child
+    process. When the cancel token is cancelled, or the iterator is closed, the child is
+    terminated and the iterator ends after the formulae received so far.
+
+    @param formula_str: The input formula as a string
+    @param complexity_threshold: The maximum allowed complexity as a factor of the original formula's complexity
+    @param max_depth: The maximum depth to apply equivalences
+    @param cancel: Optional CancelToken that kills the search
+    @param options: Further keyword arguments for iter_equivalences, except counter. The
+                    child is a daemon process and cannot start workers of its own. A
+                    SearchStats passed as stats is updated from the child's own as it reports.
+    @return: An iterator over equivalent formulae, starting with the parsed formula
+    @raise FormulaSyntaxError: If the formula is not well-formed
+    @raise ValueError: If more than one worker is asked for
+    '''
+
+    # Report bad arguments straight away, as iter_equivalences does
+    parse_formula(formula_str)
+    if (options.get('workers') or 1) > 1:
+        raise ValueError("Parallel workers cannot be used when the search runs in a subprocess")
+
+    return _receive(formula_str, complexity_threshold, max_depth, cancel, options)
+
+
+def _receive(formula_str: str, complexity_threshold: float, max_depth: int, cancel: Optional[CancelToken], options: dict) -> Iterator[Formula]:
+    # Start the child and yield the formulae it sends; any exception raised by the search
+    # in the child is raised again here
+    # The stats stay in this process, and the child reports its own at the same interval
+    options = dict(options)
+    stats = options.pop('stats', None)
+    stats_interval = stats.interval if stats is not None and stats.callback is not None else None
+    receiver, sender = multiprocessing.Pipe(duplex=False)
+    process = multiprocessing.Process(target=_search_worker, args=(sender, (formula_str, complexity_threshold, max_depth), options, stats_interval),
+                                      daemon=True)
+    process.start()
+    sender.close()
+
+    try:
+        while not (cancel is not None and cancel.cancelled):
+            remaining = cancel.remaining() if cancel is not None else None
+            if not receiver.poll(POLL_INTERVAL if remaining is None else min(POLL_INTERVAL, remaining)):
+                continue
+            try:
+                kind, payload = receiver.recv()
+            except EOFError:
+                raise RuntimeError("The search process exited unexpectedly")
+            if kind == 'done':
+                break
+            if kind == 'error':
+                raise payload
+            if kind == 'stats':
+                stats.update(payload)
+                continue
+            yield from decode_formulae(payload)
+    finally:
+        if process.is_alive():
+            process.terminate()
+        process.join()
+        receiver.close()
+        if stats is not None:
+            stats.finish()
@@ -0,0 +1,112 @@
+'''
+This module puts formulae into normal forms that identify formulae differing only in
+ways that do not matter to the equivalence search.
+
+In AC-normal form every chain of conjunctions or disjunctions is flattened, its operands
+sorted and the chain rebuilt nested to the right. Formulae that differ only by
+commutativity and associativity of & and | have the same AC-normal form, e.g.
+"(C & A) & B" and "B & (A & C)" are both "A & (B & C)".
+
+In alpha-normal form the variables are renamed v0, v1, ... in order of first occurrence,
+so "A <-> B" and "req <-> grant" are both "v0 <-> v1".
+'''
+
+
+
+from typing import Dict, Optional, Tuple
+from .structure import Formula, Variable, And, Or, UnaryFormula, BinaryFormula
+
+
+def _sort_key(formula: Formula) -> str:
+    return str(formula)
+
+
+def ac_canonical(formula: Formula, memo: Optional[Dict[Formula, Formula]] = None) -> Formula:
+    '''
+    Return the AC-normal form of a formula.
+
+    @param formula: The formula to normalise
+    @param memo: Optional dictionary caching the normal forms of subformulae between calls
+    @return: The AC-normal form of the formula
+    '''
+
+    if memo is None:
+        memo = {}
+    cached = memo.get(formula)
+    if cached is not None:
+        return cached
+
+    if isinstance(formula, (And, Or)):
+        cls = type(formula)
+        operands = []
+        stack = [formula]
+        while stack:
+            node = stack.pop()
+            if type(node) is cls:
+                stack.append(node.right)
+                stack.append(node.left)
+            else:
+                operands.append(ac_canonical(node, memo))
+        operands.sort(key=_sort_key)
+        result = operands[-1]
+        for operand in reversed(operands[:-1]):
+            result = cls(operand, result)
+    elif isinstance(formula, UnaryFormula):
+        result = type(formula)(ac_canonical(formula.operand, memo))
+    elif isinstance(formula, BinaryFormula):
+        result = type(formula)(ac_canonical(formula.left, memo), ac_canonical(formula.right, memo))
+    else:
+        result = formula
+
+    memo[formula] = result
+    return result
+
+
+def rename_variables(formula: Formula, names: Dict[str, str], memo: Optional[Dict[Formula, Formula]] = None) -> Formula:
+    '''
+    Rename the variables of a formula.
+
+    @param formula: The formula to rename
+    @param names: A dictionary from old to new variable names; other variables are kept
+    @param memo: Optional dictionary caching renamed subformulae between calls with the same names
+    @return: The formula with its variables renamed
+    '''
+
+    if memo is None:
+        memo = {}
+    cached = memo.get(formula)
+    if cached is not None:
+        return cached
+
+    if isinstance(formula, Variable):
+        result = Variable(names.get(formula.name, formula.name))
+    elif isinstance(formula, UnaryFormula):
+        result = type(formula)(rename_variables(formula.operand, names, memo))
+    elif isinstance(formula, BinaryFormula):
+        result = type(formula)(rename_variables(formula.left, names, memo), rename_variables(formula.right, names, memo))
+    else:
+        result = formula
+
+    memo[formula] = result
+    return result
+
+
+def alpha_normal(formula: Formula) -> Tuple[Formula, Dict[str, str]]:
+    '''
+    Return the alpha-normal form of a formula.
+
+    @param formula: The formula to normalise
+    @return: A tuple (normal, names) of the alpha-normal form and a dictionary from each
+             original variable name to its name in the normal form
+    '''
+
+    names = {}
+    stack = [formula]
+    while stack:
+        node = stack.pop()
+        if isinstance(node, Variable):
+            if node.name not in names:
+                names[node.name] = f"v{len(names)}"
+        else:
+            stack.extend(reversed(node.children()))
+    return rename_variables(formula, names), names
@@ -1,106 +1,151 @@
 '''
 This module provides functionality to parse logical formulae from string expressions.
 It supports various logical operators and temporal logic operators.
+
+The parser makes a single pass over the input: a tokenizer splits the string into
+operators, parentheses and atoms, and an operator-precedence (shunting-yard) loop builds
+the Formula tree without recursion, so parsing time is linear in the length of the input.
 '''
 
 
 
+import re
 from .structure import Variable, Not, And, Or, Implication, Biconditional, Truth, Falsity, Next, Finally, Globally, Until, Release
 
 
+# Binary operators from loosest to tightest binding. All of them are right-associative,
+# e.g. "A & B & C" is parsed as A & (B & C).
+BINARY_OPERATORS = {
+    'U': (1, Until),
+    'R': (2, Release),
+    '<->': (3, Biconditional),
+    '->': (4, Implication),
+    '&': (5, And),
+    '|': (6, Or),
+}
+
+# Temporal prefix operators extend as far right as the surrounding context allows,
+# e.g. "X A & B" is parsed as X (A & B), whereas "A -> X B & C" is parsed as A -> X (B & C).
+TEMPORAL_OPERATORS = {
+    'X': Next,
+    'F': Finally,
+    'G': Globally,
+}
+
+# Negation binds tighter than any binary operator, e.g. "!A & B" is parsed as (!A) & B
+NEGATION_PRECEDENCE = len(BINARY_OPERATORS) + 1
+
+_TOKEN = re.compile(r'\s*(?:(<->|->|[()!&|])|([A-Za-z0-9_.]+))')
+
+
+class FormulaSyntaxError(ValueError):
+    '''
+    Raised when an expression is not a well-formed formula.
+    The position attribute is the index of the offending character in the expression.
+    '''
+
+    def __init__(self, message, position):
+        super().__init__(f"{message} at position {position}")
+        self.position = position
+
+
+def tokenize(expression):
+    '''
+    Split a string expression into tokens.
+
+    @param expression: A string representing a logical formula
+    @return: A list of (token, position) pairs
+    '''
+
+    tokens = []
+    position = 0
+    length = len(expression)
+
+    while position < length:
+        match = _TOKEN.match(expression, position)
+        if match is None:
+            start = len(expression) - len(expression[position:].lstrip())
+            if start == length:
+                break
+            raise FormulaSyntaxError(f"Unexpected character '{expression[start]}'", start)
+
+        token = match.group(1) or match.group(2)
+        tokens.append((token, match.start(1) if match.group(1) else match.start(2)))
+        position = match.end()
+
+    return tokens
+
+
 def parse_formula(expression):
     '''
     Parse a string expression into a Formula object.
 
     @param expression: A string representing a logical formula
     @return: A Formula object representing the parsed expression
+    @raise FormulaSyntaxError: If the expression is not a well-formed formula
     '''
 
+    operands = []
+    # Pending operators as (precedence, class, position); class is None for '('
+    operators = []
+    # Precedence a temporal operator takes on at the current position
+    context = 0
+    expect_operand = True
 
-    def parse_expression(expression):
-        '''
-        Recursively parse a string expression into a Formula object.
-
-        @param expression: A string representing a logical formula or subformula
-        @return: A Formula object representing the parsed expression
-        '''
-
-        expression = expression.strip()
-        if expression.startswith('(') and expression.endswith(')'):
-            expression = expression[1:-1].strip()
-        
-        # Handle LTL operators
-        for op, cls in [('X', Next), ('F', Finally), ('G', Globally)]:
-            if expression.startswith(op):
-                return cls(parse_expression(expression[1:].strip()))
-        
-        # Handle 'Until' and 'Release' operators
-        for op, cls in [('U', Until), ('R', Release)]:
-            parts = split_expression(expression, op)
-            if len(parts) == 2:
-                left, right = parts
-                return cls(parse_expression(left), parse_expression(right))
-        
-        # Handle biconditional first
-        for op, cls in [('<->', Biconditional)]:
-            parts = split_expression(expression, op)
-            if len(parts) == 2:
-                left, right = parts
-                return cls(parse_expression(left), parse_expression(right))
-        
-        # Handle implication
-        for op, cls in [('->', Implication)]:
-            parts = split_expression(expression, op)
-            if len(parts) == 2:
-                left, right = parts
-                return cls(parse_expression(left), parse_expression(right))
-        
-        # Handle conjunction and disjunction
-        for op, cls in [('&', And), ('|', Or)]:
-            parts = split_expression(expression, op)
-            if len(parts) == 2:
-                left, right = parts
-                return cls(parse_expression(left), parse_expression(right))
-        
-        # Handle 'Not' operator
-        if expression.startswith('!'):
-            return Not(parse_expression(expression[1:].strip()))
-        
-        # Handle variables and constants
-        if expression in {'1', '0'}:
-            return Truth() if expression == '1' else Falsity()
-        
-        return Variable(expression)
-    
-    
-    def split_expression(expression, op):
-        '''
-        Split an expression by a given operator, respecting parentheses.
-
-        @param expression: The expression to split
-        @param op: The operator to split on
-        @return: A list of subexpressions
-        '''
-        
-        level = 0
-        split_index = -1
-        op_length = len(op)
-
-        for i in range(len(expression)):
-            if expression[i] == '(':
-                level += 1
-            elif expression[i] == ')':
-                level -= 1
-            elif level == 0 and expression[i:i+op_length] == op:
-                split_index = i
-                break
 
-        if split_index == -1:
-            return [expression]
-        
-        left = expression[:split_index].strip()
-        right = expression[split_index + op_length:].strip()
-        return [left, right]
-    
-    
-    return parse_expression(expression)
\ No newline at end of file
+    def reduce():
+        precedence, cls, position = operators.pop()
+        if cls in (Not, Next, Finally, Globally):
+            operands.append(cls(operands.pop()))
+        else:
+            right = operands.pop()
+            left = operands.pop()
+            operands.append(cls(left, right))
+
+
+    for token, position in tokenize(expression):
+        if expect_operand:
+            if token == '(':
+                operators.append((0, None, position))
+                context = 0
+            elif token == '!':
+                operators.append((NEGATION_PRECEDENCE, Not, position))
+                context = NEGATION_PRECEDENCE
+            elif token in TEMPORAL_OPERATORS:
+                operators.append((context, TEMPORAL_OPERATORS[token], position))
+            elif token in BINARY_OPERATORS or token == ')':
+                raise FormulaSyntaxError(f"Expected a formula before '{token}'", position)
+            else:
+                if token == '1':
+                    operands.append(Truth())
+                elif token == '0':
+                    operands.append(Falsity())
+                else:
+                    operands.append(Variable(token))
+                expect_operand = False
+        else:
+            if token in BINARY_OPERATORS:
+                level, cls = BINARY_OPERATORS[token]
+                while operators and operators[-1][1] is not None and operators[-1][0] > level:
+                    reduce()
+                operators.append((level, cls, position))
+                context = level
+                expect_operand = True
+            elif token == ')':
+                while operators and operators[-1][1] is not None:
+                    reduce()
+                if not operators:
+                    raise FormulaSyntaxError("Unmatched ')'", position)
+                operators.pop()
+            else:
+                raise FormulaSyntaxError(f"Expected an operator before '{token}'", position)
+
+    if expect_operand:
+        raise FormulaSyntaxError("Unexpected end of formula", len(expression))
+
+    while operators:
+        if operators[-1][1] is None:
+            raise FormulaSyntaxError("Unmatched '('", operators[-1][2])
+        reduce()
+
+    return operands[0]
@@ -0,0 +1,112 @@
+'''
+This module provides a compact text encoding of Formula objects, used to pass formulae
+between processes. A formula is written in prefix (Polish) notation with one token per
+node: operators as single characters and variables prefixed with a quote, e.g.
+"(A -> B) & !C" is encoded as "& > 'A 'B ! 'C". Prefix notation needs no brackets,
+and decoding goes back through the constructors, so decoded formulae are interned.
+'''
+
+
+
+from .structure import Formula, Variable, Not, And, Or, Implication, Biconditional, Truth, Falsity, Next, Finally, Globally, Until, Release
+
+
+# Token for each formula class; variables are written as VARIABLE_PREFIX followed by their name
+CODES = {
+    Not: '!',
+    And: '&',
+    Or: '|',
+    Implication: '>',
+    Biconditional: '=',
+    Truth: '1',
+    Falsity: '0',
+    Next: 'X',
+    Finally: 'F',
+    Globally: 'G',
+    Until: 'U',
+    Release: 'R',
+}
+
+CLASSES = {code: cls for cls, code in CODES.items()}
+
+VARIABLE_PREFIX = "'"
+
+# Separator between the encodings of formulae in a batch
+FORMULA_SEPARATOR = '\n'
+
+
+def encode_formula(formula: Formula) -> str:
+    '''
+    Encode a formula as a prefix-notation string.
+
+    @param formula: The formula to encode
+    @return: The encoded formula
+    '''
+
+    tokens = []
+    stack = [formula]
+    while stack:
+        node = stack.pop()
+        if isinstance(node, Variable):
+            tokens.append(VARIABLE_PREFIX + node.name)
+        else:
+            tokens.append(CODES[type(node)])
+            stack.extend(reversed(node.children()))
+    return ' '.join(tokens)
+
+
+def decode_formula(text: str) -> Formula:
+    '''
+    Decode a formula encoded by encode_formula.
+
+    @param text: The encoded formula
+    @return: The decoded Formula object
+    @raise ValueError: If text is not a valid encoding
+    '''
+
+    # Reading the tokens right to left, every operator's operands are already on the stack
+    operands = []
+    try:
+        for token in reversed(text.split(' ')):
+            if token.startswith(VARIABLE_PREFIX):
+                operands.append(Variable(token[len(VARIABLE_PREFIX):]))
+                continue
+            cls = CLASSES[token]
+            if cls in (Truth, Falsity):
+                operands.append(cls())
+            elif cls in (Not, Next, Finally, Globally):
+                operands.append(cls(operands.pop()))
+            else:
+                left = operands.pop()
+                right = operands.pop()
+                operands.append(cls(left, right))
+    except (KeyError, IndexError):
+        raise ValueError(f"Invalid formula encoding: {text!r}")
+
+    if len(operands) != 1:
+        raise ValueError(f"Invalid formula encoding: {text!r}")
+    return operands[0]
+
+
+def encode_formulae(formulae) -> str:
+    '''
+    Encode a sequence of formulae as a single string.
+
+    @param formulae: An iterable of formulae
+    @return: The encoded formulae, one per line
+    '''
+
+    return FORMULA_SEPARATOR.join(encode_formula(formula) for formula in formulae)
+
+
+def decode_formulae(text: str) -> list:
+    '''
+    Decode a string produced by encode_formulae.
+
+    @param text: The encoded formulae
+    @return: A list of the decoded formulae
+    '''
+
+    if not text:
+        return []
+    return [decode_formula(line) for line in text.split(FORMULA_SEPARATOR)]
@@ -1,18 +1,26 @@
 '''
-This module defines classes for representing and manipulating logical formulas. 
-It includes an enumeration for different logical operations and various classes 
-for each type of logical formula (e.g., AND, OR, NOT). Each class can generate 
+This module defines classes for representing and manipulating logical formulas.
+It includes an enumeration for different logical operations and various classes
+for each type of logical formula (e.g., AND, OR, NOT). Each class can generate
 string and representation forms of the formula, as well as identify its operation type.
+
+Formula objects are immutable and hash-consed: constructing a node that is structurally
+equal to a live node returns the existing instance, so equal subtrees are shared and
+equality and hashing are O(1). Each node also carries its complexity, depth and the set
+of operators it uses, computed from its children when it is built, and caches its string
+form the first time it is rendered.
 '''
 
 
 
 from enum import Enum, auto
+from threading import RLock
+from weakref import ref
 
 
 class Operation(Enum):
     '''
-    Enumeration for logical operations. Each operation corresponds to a specific 
+    Enumeration for logical operations. Each operation corresponds to a specific
     logical operator used in formulas.
     '''
 
@@ -30,22 +38,157 @@ class Operation(Enum):
     UNTIL = auto()
     RELEASE = auto()
 
+    @property
+    def bit(self):
+        '''
+        The bit representing this operation in a Formula's operator_mask.
+        '''
+
+        return 1 << (self.value - 1)
+
+
+# Table of every live formula node, keyed by (class, *fields) and holding weak references,
+# so entries disappear once nothing else references the node.
+_INTERNED = {}
+
+
+class _Entry(ref):
+    __slots__ = ('key',)
+
+
+# Held while an entry is removed or a dead entry replaced, so that neither can undo the
+# other when threads race to drop and rebuild the same node. Reentrant, as a weak reference
+# callback may run in a thread that already holds it.
+_INTERNED_LOCK = RLock()
+
+
+def _discard(entry):
+    # Only remove the entry if it has not already been replaced by a newer node
+    with _INTERNED_LOCK:
+        if _INTERNED.get(entry.key) is entry:
+            del _INTERNED[entry.key]
+
+
+def _lookup(key):
+    entry = _INTERNED.get(key)
+    return entry() if entry is not None else None
+
+
+def interned_count() -> int:
+    '''
+    @return: The number of distinct formula nodes alive in this process, each stored once
+    '''
+
+    return len(_INTERNED)
+
 
 class Formula:
     '''
-    Base class for all logical formulas. Provides methods to generate string 
-    and representation forms of formulas. Subclasses should override the _str 
+    Base class for all logical formulas. Provides methods to generate string
+    and representation forms of formulas. Subclasses should override the _render
     and _repr methods to provide specific behavior.
+
+    Instances are created through _intern, which returns the shared instance for a class
+    and its fields. Every node has:
+    - complexity: the number of nodes in the formula
+    - depth: the number of nodes on the longest path from the root to a leaf
+    - operator_mask: the bitwise OR of Operation.bit for every node in the formula
     '''
 
-    def __str__(self):
-        pass
+    __slots__ = ('complexity', 'depth', 'operator_mask', '_text', '__weakref__')
+    _fields = ()
+    operation = None
+
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        cls._bit = cls.operation.bit if cls.operation is not None else 0
+
+    @classmethod
+    def _intern(cls, key, complexity, depth, operator_mask):
+        '''
+        Build the node for key with the given measures, unless another thread has just
+        built it. Callers look the key up first, so this is only reached on a miss.
+
+        @param key: The class followed by the values of its _fields
+        '''
+
+        node = object.__new__(cls)
+        for field, value in zip(cls._fields, key[1:]):
+            object.__setattr__(node, field, value)
+        object.__setattr__(node, 'complexity', complexity)
+        object.__setattr__(node, 'depth', depth)
+        object.__setattr__(node, 'operator_mask', operator_mask)
+        object.__setattr__(node, '_text', None)
+
+        # dict.setdefault is atomic, so two threads building the same node agree on one
+        entry = _Entry(node, _discard)
+        entry.key = key
+        existing = _INTERNED.setdefault(key, entry)
+        if existing is not entry:
+            other = existing()
+            if other is not None:
+                return other
+            # The node found is dead, but another thread may have replaced it since
+            with _INTERNED_LOCK:
+                current = _INTERNED.get(key)
+                other = current() if current is not None else None
+                if other is not None:
+                    return other
+                _INTERNED[key] = entry
+        return node
+
+    def _args(self):
+        return tuple(getattr(self, field) for field in self._fields)
+
+    def children(self):
+        '''
+        @return: A tuple of the immediate subformulae of this formula
+        '''
+
+        return ()
+
+    def code(self):
+        return self.operation
+
+    def __setattr__(self, name, value):
+        raise AttributeError(f"{type(self).__name__} is immutable")
+
+    def __delattr__(self, name):
+        raise AttributeError(f"{type(self).__name__} is immutable")
+
+    # Interning guarantees a single live instance per structure, so the default identity
+    # based __eq__ and __hash__ are structural equality and hashing, at C speed.
+
+    # Pickling and copying go back through the constructor so the result is interned
+    def __reduce__(self):
+        return (type(self), self._args())
 
     def __str__(self):
-        return self._str()
+        text = self._text
+        if text is None:
+            text = self._fill_text()
+        return text
+
+    def _fill_text(self):
+        # Render every not yet rendered subformula bottom-up with an explicit stack, so
+        # very deep formulae do not hit the recursion limit
+        stack = [self]
+        while stack:
+            node = stack[-1]
+            pending = [child for child in node.children() if child._text is None]
+            if pending:
+                stack.extend(pending)
+                continue
+            stack.pop()
+            if node._text is None:
+                object.__setattr__(node, '_text', node._render())
+        return self._text
 
     def _str(self, parent_code=0):
-        pass
+        return str(self)
+
+    def _render(self):
+        return ''
 
     # Repr is (throughout this code) for testing purposes - to print an intermediary representation of a formula as it is within the code
     def __repr__(self):
@@ -55,20 +198,62 @@ class Formula:
         return "<Formula>"
 
 
+class UnaryFormula(Formula):
+    '''
+    Base class for formulas applying an operator to a single operand.
+    '''
+
+    __slots__ = ('operand',)
+    _fields = ('operand',)
+
+    def __new__(cls, operand):
+        key = (cls, operand)
+        node = _lookup(key)
+        if node is not None:
+            return node
+        return cls._intern(key, operand.complexity + 1, operand.depth + 1, cls._bit | operand.operator_mask)
+
+    def children(self):
+        return (self.operand,)
+
+
+class BinaryFormula(Formula):
+    '''
+    Base class for formulas applying an operator to a left and right operand.
+    '''
+
+    __slots__ = ('left', 'right')
+    _fields = ('left', 'right')
+
+    def __new__(cls, left, right):
+        key = (cls, left, right)
+        node = _lookup(key)
+        if node is not None:
+            return node
+        depth = left.depth if left.depth > right.depth else right.depth
+        return cls._intern(key, left.complexity + right.complexity + 1, depth + 1,
+                           cls._bit | left.operator_mask | right.operator_mask)
+
+    def children(self):
+        return (self.left, self.right)
+
+
 class Variable(Formula):
     '''
     Class representing a logical variable in a formula.
     '''
 
-    def __init__(self, name):
-        self.name = name
+    __slots__ = ('name',)
+    _fields = ('name',)
+    operation = Operation.VARIABLE
 
-    def _str(self, parent_code=0):
+    def __new__(cls, name):
+        key = (cls, name)
+        return _lookup(key) or cls._intern(key, 1, 1, cls._bit)
+
+    def _render(self):
         return self.name
 
-    def code(self):
-        return Operation.VARIABLE
-    
     def __repr__(self):
         return f"Variable('{self.name}')"
 
@@ -78,12 +263,16 @@ class Truth(Formula):
     Class representing a truth value (True) in a formula.
     '''
 
-    def _str(self, parent_code=0):
+    __slots__ = ()
+    operation = Operation.TRUE
+
+    def __new__(cls):
+        key = (cls,)
+        return _lookup(key) or cls._intern(key, 1, 1, cls._bit)
+
+    def _render(self):
         return '1'
 
-    def code(self):
-        return Operation.TRUE
-    
     def _repr(self):
         return "Truth()"
 
@@ -93,219 +282,193 @@ class Falsity(Formula):
     Class representing a falsity value (False) in a formula.
     '''
 
-    def _str(self, parent_code=0):
+    __slots__ = ()
+    operation = Operation.FALSE
+
+    def __new__(cls):
+        key = (cls,)
+        return _lookup(key) or cls._intern(key, 1, 1, cls._bit)
+
+    def _render(self):
         return '0'
 
-    def code(self):
-        return Operation.FALSE
-    
     def _repr(self):
         return "Falsity()"
 
 
-class Not(Formula):
+class Not(UnaryFormula):
     '''
     Class representing a negation operation in a formula.
     '''
 
-    def __init__(self, operand):
-        self.operand = operand
+    __slots__ = ()
+    operation = Operation.NOT
 
-    def _str(self, parent_code=0):
+    def _render(self):
         return f'!{self.operand}'
 
-    def code(self):
-        return Operation.NOT
-    
     def _repr(self):
         return f"Not({repr(self.operand)})"
 
 
-class And(Formula):
+class And(BinaryFormula):
     '''
     Class representing a logical AND operation in a formula.
+    The cached string is parenthesised; the parentheses are dropped inside other operators.
     '''
 
-    def __init__(self, left, right):
-        self.left = left
-        self.right = right
+    __slots__ = ()
+    operation = Operation.AND
 
-    def _str(self, parent_code=0):
+    def _render(self):
         left_str = self.left._str(self.code())
         right_str = self.right._str(self.code())
-        
+        return f'({left_str} & {right_str})'
+
+    def _str(self, parent_code=0):
         if (parent_code == Operation.OR or parent_code == Operation.NOT or parent_code == 0):
-            return f'({left_str} & {right_str})'
+            return str(self)
         else:
-            return f'{left_str} & {right_str}'
+            return str(self)[1:-1]
 
-    def code(self):
-        return Operation.AND
-    
     def _repr(self):
         return f"And({repr(self.left)}, {repr(self.right)})"
 
 
-class Or(Formula):
+class Or(BinaryFormula):
     '''
     Class representing a logical OR operation in a formula.
+    The cached string is parenthesised; the parentheses are dropped inside other operators.
     '''
 
-    def __init__(self, left, right):
-        self.left = left
-        self.right = right
+    __slots__ = ()
+    operation = Operation.OR
 
-    def _str(self, parent_code=0):
+    def _render(self):
         left_str = self.left._str(self.code())
         right_str = self.right._str(self.code())
+        return f'({left_str} | {right_str})'
 
+    def _str(self, parent_code=0):
         if (parent_code == Operation.AND or parent_code == Operation.NOT or parent_code == 0):
-            return f'({left_str} | {right_str})'
+            return str(self)
         else:
-            return f'{left_str} | {right_str}'
+            return str(self)[1:-1]
 
-    def code(self):
-        return Operation.OR
-    
     def _repr(self):
         return f"Or({repr(self.left)}, {repr(self.right)})"
 
 
-class Implication(Formula):
+class Implication(BinaryFormula):
     '''
     Class representing a logical implication (->) in a formula.
     '''
 
-    def __init__(self, left, right):
-        self.left = left
-        self.right = right
+    __slots__ = ()
+    operation = Operation.IMPLICATION
 
-    def _str(self, parent_code=0):
+    def _render(self):
         left_str = self.left._str(self.code())
         right_str = self.right._str(self.code())
 
         return f'({left_str} -> {right_str})'
 
-    def code(self):
-        return Operation.IMPLICATION
-    
     def _repr(self):
         return f"Implication({repr(self.left)}, {repr(self.right)})"
 
 
-class Biconditional(Formula):
+class Biconditional(BinaryFormula):
     '''
     Class representing a logical biconditional (<->) in a formula.
     '''
 
-    def __init__(self, left, right):
-        self.left = left
-        self.right = right
+    __slots__ = ()
+    operation = Operation.BICONDITIONAL
 
-    def _str(self, parent_code=0):
+    def _render(self):
         left_str = self.left._str(self.code())
         right_str = self.right._str(self.code())
 
         return f'({left_str} <-> {right_str})'
 
-    def code(self):
-        return Operation.BICONDITIONAL
-    
     def _repr(self):
         return f"Biconditional({repr(self.left)}, {repr(self.right)})"
 
 
-class Next(Formula):
+class Next(UnaryFormula):
     '''
     Class representing the temporal 'Next' (X) operator in a formula.
     '''
 
-    def __init__(self, operand):
-        self.operand = operand
+    __slots__ = ()
+    operation = Operation.NEXT
 
-    def _str(self, parent_code=0):
+    def _render(self):
         return f'X {self.operand}'
 
-    def code(self):
-        return Operation.NEXT
-    
     def _repr(self):
         return f"Next({repr(self.operand)})"
 
 
-class Finally(Formula):
+class Finally(UnaryFormula):
     '''
     Class representing the temporal 'Finally' (F) operator in a formula.
     '''
 
-    def __init__(self, operand):
-        self.operand = operand
+    __slots__ = ()
+    operation = Operation.FINALLY
 
-    def _str(self, parent_code=0):
+    def _render(self):
         return f'F {self.operand}'
 
-    def code(self):
-        return Operation.FINALLY
-
     def _repr(self):
         return f"Finally({repr(self.operand)})"
 
 
-class Globally(Formula):
+class Globally(UnaryFormula):
     '''
     Class representing the temporal 'Globally' (G) operator in a formula.
     '''
-     
-    def __init__(self, operand):
-        self.operand = operand
 
-    def _str(self, parent_code=0):
-        return f'G {self.operand}'
+    __slots__ = ()
+    operation = Operation.GLOBALLY
 
-    def code(self):
-        return Operation.GLOBALLY
+    def _render(self):
+        return f'G {self.operand}'
 
     def _repr(self):
         return f"Globally({repr(self.operand)})"
 
 
-class Until(Formula):
+class Until(BinaryFormula):
     '''
     Class representing the temporal 'Until' (U) operator in a formula.
     '''
 
-    def __init__(self, left, right):
-        self.left = left
-        self.right = right
+    __slots__ = ()
+    operation = Operation.UNTIL
 
-    def _str(self, parent_code=0):
+    def _render(self):
         left_str = self.left._str(self.code())
         right_str = self.right._str(self.code())
         return f'({left_str} U {right_str})'
 
-    def code(self):
-        return Operation.UNTIL
-    
     def _repr(self):
         return f"Until({repr(self.left)}, {repr(self.right)})"
 
 
-class Release(Formula):
+class Release(BinaryFormula):
     '''
     Class representing the temporal 'Release' (R) operator in a formula.
     '''
-    
-    def __init__(self, left, right):
-        self.left = left
-        self.right = right
 
-    def _str(self, parent_code=0):
+    __slots__ = ()
+    operation = Operation.RELEASE
+
+    def _render(self):
         left_str = self.left._str(self.code())
         right_str = self.right._str(self.code())
         return f'({left_str} R {right_str})'
 
-    def code(self):
-        return Operation.RELEASE
-    
     def _repr(self):
-        return f"Release({repr(self.left)}, {repr(self.right)})"
\ No newline at end of file
+        return f"Release({repr(self.left)}, {repr(self.right)})"
@@ -0,0 +1,302 @@
+'''
+Benchmark suite timing parsing, equivalence generation, filtering and printing on random
+formulae of increasing size, so that each benchmark gives a scaling curve rather than a
+single number. The formulae come from Testing.formula_generator with a fixed seed, so
+every run times the same work.
+
+Results are printed as a table and can be written as JSON with --output. With --baseline
+they are compared against an earlier run, and the command exits with status 1 if any
+point is slower than the baseline by more than the tolerance. Baselines are only
+comparable on the same machine, so none is shipped: record one with --output before
+making a change, and compare against it on the same machine afterwards.
+
+Run from the translator_AryD05 directory, e.g.
+
+    python -m Testing.benchmark --output before.json
+    python -m Testing.benchmark --baseline before.json
+    python -m Testing.benchmark --quick --only parse,print --mix gr1
+'''
+
+
+
+import argparse
+import gc
+import json
+import platform
+import sys
+import time
+from typing import Callable, List, Optional
+from Equivalence_Applier.applier import apply_equivalences, CancelToken
+from Equivalence_Applier.filter import filter_equivalences
+from Formula.parser import parse_formula
+from Testing.formula_generator import OPERATOR_MIXES, random_formulae
+
+
+# Version of the JSON results, changed when results stop being comparable with older ones
+FORMAT_VERSION = 1
+
+# Sizes of the formulae, in nodes, each benchmark is timed at, and the smaller sets used
+# with --quick. The filter takes as long whatever the size of a formula, so it is timed
+# over growing numbers of candidates of FILTER_SIZE nodes instead.
+SIZES = {
+    'parse': (10, 100, 1000, 10000),
+    'print': (10, 100, 1000, 10000),
+    'filter': (1000, 10000, 100000, 1000000),
+    'generate': (3, 4, 5, 6),
+}
+QUICK_SIZES = {
+    'parse': (10, 100, 1000),
+    'print': (10, 100, 1000),
+    'filter': (1000, 10000, 100000),
+    'generate': (3, 4, 5),
+}
+
+# Nodes parsed, printed or filtered at every size, so that small sizes are timed over many formulae
+NODES_PER_POINT = 100000
+
+# Formulae searched at every size of the generate benchmark, the most times each size is
+# timed, as searches are slow, and the options of the search
+GENERATE_COUNT = 5
+GENERATE_REPEATS = 3
+GENERATE_COMPLEXITY = 1.5
+GENERATE_DEPTH = 2
+GENERATE_REWRITING = 'single_site'
+GENERATE_TIMEOUT = 30.0
+
+# Size of the candidates of the filter benchmark, the number of distinct candidates, which
+# are repeated up to the number timed, and the allowed operators
+FILTER_SIZE = 20
+FILTER_DISTINCT = 10000
+FILTER_OPERATORS = {'!', '&', '|', 'X', 'F', 'G'}
+
+# Fraction by which a point may be slower than the baseline before it is flagged. Timings
+# on a busy machine easily vary by a third between runs, so only larger slowdowns are flagged.
+DEFAULT_TOLERANCE = 0.5
+
+# Points faster than this, in seconds, are not compared, as their timings are mostly noise
+MIN_COMPARED_SECONDS = 0.001
+
+
+def _time(prepare: Callable[[], object], run: Callable[[object], object], repeats: int) -> float:
+    # The fastest seconds of run over repeats, each on a fresh result of prepare; the fastest
+    # is the timing other processes disturbed least. The inputs of the previous repeat are
+    # dropped first, so that hash-consed formulae and their cached strings are built again
+    # rather than found alive. As with timeit, the garbage collector is off while timing.
+    timings = []
+    for _ in range(repeats):
+        data = prepare()
+        gc.collect()
+        gc.disable()
+        try:
+            start = time.perf_counter()
+            run(data)
+            timings.append(time.perf_counter() - start)
+        finally:
+            gc.enable()
+        del data
+    return min(timings)
+
+
+def bench_parse(formulae: Callable[[int], List], size: int, repeats: int) -> dict:
+    texts = [str(formula) for formula in formulae(size)]
+    characters = sum(len(text) for text in texts)
+    seconds = _time(lambda: None, lambda _: [parse_formula(text) for text in texts], repeats)
+    return {'count': len(texts), 'seconds': seconds, 'characters_per_second': characters / seconds}
+
+
+def bench_print(formulae: Callable[[int], List], size: int, repeats: int) -> dict:
+    count = []
+
+    def prepare():
+        built = formulae(size)
+        count[:] = [len(built)]
+        return built
+
+    seconds = _time(prepare, lambda built: [formula._str() for formula in built], repeats)
+    return {'count': count[0], 'seconds': seconds, 'nodes_per_second': count[0] * size / seconds}
+
+
+def bench_filter(formulae: Callable[[int], List], count: int, repeats: int) -> dict:
+    distinct = formulae(FILTER_SIZE)
+    candidates = (distinct * (count // len(distinct) + 1))[:count]
+    seconds = _time(lambda: None, lambda _: filter_equivalences(candidates, FILTER_OPERATORS), repeats)
+    kept = len(filter_equivalences(candidates, FILTER_OPERATORS))
+    return {'size': FILTER_SIZE, 'count': count, 'kept': kept, 'seconds': seconds, 'formulae_per_second': count / seconds}
+
+
+def bench_generate(formulae: Callable[[int], List], size: int, repeats: int) -> dict:
+    texts = [str(formula) for formula in formulae(size)]
+    generated = []
+    timed_out = []
+
+    def run(_):
+        generated.clear()
+        timed_out.clear()
+        for text in texts:
+            cancel = CancelToken(GENERATE_TIMEOUT)
+            generated.append(len(apply_equivalences(text, GENERATE_COMPLEXITY, GENERATE_DEPTH, rewriting=GENERATE_REWRITING, cancel=cancel)))
+            timed_out.append(cancel.cancelled)
+
+    seconds = _time(lambda: None, run, min(repeats, GENERATE_REPEATS))
+    return {'count': len(texts), 'seconds': seconds, 'equivalents': sum(generated), 'timed_out': sum(timed_out),
+            'equivalents_per_second': sum(generated) / seconds}
+
+
+BENCHMARKS = {
+    'parse': bench_parse,
+    'print': bench_print,
+    'filter': bench_filter,
+    'generate': bench_generate,
+}
+
+
+def run_benchmarks(names: List[str], seed: int = 0, variables: int = 3, mix: str = 'ltl', repeats: int = 5,
+                   quick: bool = False, log: Callable[[str], None] = lambda line: None) -> dict:
+    '''
+    Run benchmarks over their scaling curves.
+
+    @param names: The benchmarks to run, keys of BENCHMARKS
+    @param seed: The seed of the random formulae
+    @param variables: The number of variables in the random formulae
+    @param mix: The operator mix of the random formulae, a key of OPERATOR_MIXES
+    @param repeats: The number of times each point is timed; the fastest is kept
+    @param quick: Whether to time the smaller set of sizes only
+    @param log: Function called with a line describing each point as it is timed
+    @return: The results, ready to be written as JSON: the parameters of the run, and for
+             each benchmark a list of points with the size of the formulae, their number,
+             the fastest seconds and a throughput
+    '''
+
+    operators = OPERATOR_MIXES[mix]
+
+    def formulae_for(count):
+        def formulae(size):
+            return random_formulae(seed + size, count(size), size, variables, operators=operators)
+        return formulae
+
+    counts = {
+        'generate': lambda size: GENERATE_COUNT,
+        'filter': lambda size: FILTER_DISTINCT,
+    }
+
+    results = {}
+    for name in names:
+        count = counts.get(name, lambda size: max(1, NODES_PER_POINT // size))
+        points = []
+        for scale in (QUICK_SIZES if quick else SIZES)[name]:
+            point = dict({'size': scale}, **BENCHMARKS[name](formulae_for(count), scale, repeats))
+            points.append(point)
+            log(f"{name:<10} size {point['size']:>6} x {point['count']:>7}: {point['seconds']:.4f} seconds")
+        results[name] = points
+
+    return {
+        'version': FORMAT_VERSION,
+        'seed': seed,
+        'variables': variables,
+        'mix': mix,
+        'repeats': repeats,
+        'python': platform.python_version(),
+        'machine': platform.platform(),
+        'created': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'results': results,
+    }
+
+
+def compare(results: dict, baseline: dict, tolerance: float = DEFAULT_TOLERANCE) -> List[dict]:
+    '''
+    Compare results with a baseline, point by point. Points missing from either, or faster
+    than MIN_COMPARED_SECONDS in both, are not compared.
+
+    @param results: Results returned by run_benchmarks
+    @param baseline: Earlier results, with the same seed, variables and mix
+    @param tolerance: The fraction by which a point may be slower than the baseline
+    @return: A dictionary for each point compared, with the benchmark, size, count, baseline
+             and current seconds, their ratio, and whether it is a regression
+    @raise ValueError: If the results were made with other formulae than the baseline
+    '''
+
+    for key in ('version', 'seed', 'variables', 'mix'):
+        if results.get(key) != baseline.get(key):
+            raise ValueError(f"The baseline was made with {key} {baseline.get(key)!r}, not {results.get(key)!r}")
+
+    comparisons = []
+    for name, points in results['results'].items():
+        before = {(point['size'], point['count']): point for point in baseline['results'].get(name, [])}
+        for point in points:
+            old = before.get((point['size'], point['count']))
+            if old is None or max(old['seconds'], point['seconds']) < MIN_COMPARED_SECONDS:
+                continue
+            ratio = point['seconds'] / old['seconds']
+            comparisons.append({'benchmark': name, 'size': point['size'], 'count': point['count'],
+                                'baseline': old['seconds'], 'current': point['seconds'],
+                                'ratio': ratio, 'regression': ratio > 1 + tolerance})
+    return comparisons
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Benchmark parsing, equivalence generation, filtering and printing on random formulae.")
+    parser.add_argument('--only', default=','.join(BENCHMARKS),
+                        help=f"Comma-separated benchmarks to run (default: {','.join(BENCHMARKS)})")
+    parser.add_argument('--quick', action='store_true', help="Time fewer, smaller sizes")
+    parser.add_argument('--seed', type=int, default=0, help="Seed of the random formulae (default: 0)")
+    parser.add_argument('--variables', type=int, default=3, help="Number of variables in the formulae (default: 3)")
+    parser.add_argument('--mix', choices=tuple(OPERATOR_MIXES), default='ltl', help="Operators the formulae are built from (default: ltl)")
+    parser.add_argument('--repeats', type=int, default=5, help="Times each point is timed, keeping the fastest (default: 5)")
+    parser.add_argument('--output', default=None, help="Write the results as JSON to this file")
+    parser.add_argument('--baseline', default=None, help="Compare the results with those in this JSON file")
+    parser.add_argument('--tolerance', type=float, default=DEFAULT_TOLERANCE,
+                        help=f"Fraction by which a point may be slower than the baseline (default: {DEFAULT_TOLERANCE})")
+    arguments = parser.parse_args(argv)
+
+    names = [name.strip() for name in arguments.only.split(',') if name.strip()]
+    unknown = [name for name in names if name not in BENCHMARKS]
+    if unknown:
+        parser.error(f"Unknown benchmarks: {', '.join(unknown)}. Use any of: {', '.join(BENCHMARKS)}")
+
+    baseline = None
+    if arguments.baseline is not None:
+        with open(arguments.baseline) as file:
+            baseline = json.load(file)
+
+    results = run_benchmarks(names, arguments.seed, arguments.variables, arguments.mix, arguments.repeats, arguments.quick,
+                             log=lambda line: print(line, file=sys.stderr))
+
+    if arguments.output is not None:
+        with open(arguments.output, 'w') as file:
+            json.dump(results, file, indent=2)
+            file.write('\n')
+
+    print("\nBenchmark Results:")
+    print("=" * 50)
+    for name, points in results['results'].items():
+        for point in points:
+            rates = [f"{value:,.0f} {key.replace('_', ' ')}" for key, value in point.items() if key.endswith('_per_second')]
+            print(f"{name:<10} size {point['size']:>6} x {point['count']:>7}: {point['seconds'] * 1000:>10.2f} ms, {', '.join(rates)}")
+
+    if baseline is None:
+        return 0
+
+    try:
+        comparisons = compare(results, baseline, arguments.tolerance)
+    except ValueError as e:
+        print(f"Cannot compare with the baseline: {e}")
+        return 2
+
+    for key in ('python', 'machine'):
+        if results.get(key) != baseline.get(key):
+            print(f"Warning: the baseline was recorded with {key} {baseline.get(key)!r}, not {results.get(key)!r}, "
+                  f"so its timings may not be comparable", file=sys.stderr)
+
+    print(f"\nComparison with {arguments.baseline} (tolerance {arguments.tolerance:.0%}):")
+    print("=" * 50)
+    for comparison in comparisons:
+        flag = "REGRESSION" if comparison['regression'] else "ok"
+        print(f"{comparison['benchmark']:<10} size {comparison['size']:>6} x {comparison['count']:>7}: {comparison['baseline'] * 1000:>10.2f} ms -> "
+              f"{comparison['current'] * 1000:>10.2f} ms ({comparison['ratio']:.2f}x) {flag}")
+    regressions = sum(comparison['regression'] for comparison in comparisons)
+    print(f"\n{len(comparisons)} points compared, {regressions} regressions")
+    return 1 if regressions else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
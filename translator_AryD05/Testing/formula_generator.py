@@ -0,0 +1,96 @@
+'''
+This module generates random LTL formulae for tests and benchmarks. Formulae are built
+from a seeded random.Random, so the same seed and parameters always give the same
+formulae, and have exactly the number of nodes asked for, no deeper than a given depth,
+over a given number of variables and with operators drawn from a weighted mix.
+'''
+
+
+
+import random
+from typing import Dict, List, Optional
+from Formula.structure import Formula, Variable, Truth, Falsity, Not, And, Or, Implication, Biconditional, Next, Finally, Globally, Until, Release
+
+
+UNARY = {'!': Not, 'X': Next, 'F': Finally, 'G': Globally}
+BINARY = {'&': And, '|': Or, '->': Implication, '<->': Biconditional, 'U': Until, 'R': Release}
+
+# Relative weights of the operators in formulae of different styles
+OPERATOR_MIXES = {
+    'propositional': {'!': 2, '&': 3, '|': 3, '->': 2, '<->': 1},
+    'temporal': {'X': 1, 'F': 1, 'G': 1, 'U': 1, 'R': 1},
+    'ltl': {'!': 2, '&': 3, '|': 3, '->': 2, '<->': 1, 'X': 1, 'F': 1, 'G': 1, 'U': 1, 'R': 1},
+    # The shape of GR(1) guarantees in Spectra specifications: mostly G, F, & and ->
+    'gr1': {'!': 2, '&': 3, '|': 1, '->': 3, 'X': 1, 'F': 2, 'G': 2},
+}
+
+
+def _capacity(depth: int, binary: bool) -> int:
+    # The largest number of nodes in a formula no deeper than depth
+    return 2 ** depth - 1 if binary else depth
+
+
+def random_formula(rng: random.Random, size: int, variables: int = 3, max_depth: Optional[int] = None,
+                   operators: Dict[str, int] = OPERATOR_MIXES['ltl'], constants: float = 0.0) -> Formula:
+    '''
+    Build a random formula.
+
+    @param rng: The random.Random to draw from
+    @param size: The number of nodes of the formula, which is its complexity
+    @param variables: The number of variables, named p0, p1, ...
+    @param max_depth: The largest depth of the formula, or None for no limit
+    @param operators: The weight of each operator, e.g. OPERATOR_MIXES['ltl']. Where a
+                      formula needs a unary operator and the mix has none, ! is used.
+    @param constants: The probability that a leaf is 1 or 0 rather than a variable
+    @return: The formula
+    @raise ValueError: If no formula of that size fits within max_depth
+    '''
+
+    unary = [(symbol, weight) for symbol, weight in operators.items() if symbol in UNARY and weight > 0]
+    binary = [(symbol, weight) for symbol, weight in operators.items() if symbol in BINARY and weight > 0]
+    if not unary:
+        unary = [('!', 1)]
+    if size < 1 or (max_depth is not None and size > _capacity(max_depth, bool(binary))):
+        raise ValueError(f"No formula of {size} nodes fits within depth {max_depth} with these operators")
+    names = [f"p{index}" for index in range(variables)]
+
+    def leaf():
+        if constants and rng.random() < constants:
+            return Truth() if rng.random() < 0.5 else Falsity()
+        return Variable(rng.choice(names))
+
+    def choose(choices):
+        return rng.choices([symbol for symbol, _ in choices], [weight for _, weight in choices])[0]
+
+    def build(size, depth):
+        if size == 1:
+            return leaf()
+        # Children may be at most this many nodes, given the depth left
+        room = size if depth is None else _capacity(depth - 1, bool(binary))
+        options = []
+        if size - 1 <= room:
+            options.extend(unary)
+        if binary and size >= 3 and size - 1 <= 2 * room:
+            options.extend(binary)
+        symbol = choose(options)
+        below = None if depth is None else depth - 1
+        if symbol in UNARY:
+            return UNARY[symbol](build(size - 1, below))
+        left = rng.randint(max(1, size - 1 - room), min(size - 2, room))
+        return BINARY[symbol](build(left, below), build(size - 1 - left, below))
+
+    return build(size, max_depth)
+
+
+def random_formulae(seed: int, count: int, size: int, variables: int = 3, max_depth: Optional[int] = None,
+                    operators: Dict[str, int] = OPERATOR_MIXES['ltl'], constants: float = 0.0) -> List[Formula]:
+    '''
+    Build a list of random formulae from a seed, taking the other arguments of random_formula.
+
+    @param seed: The seed of the random.Random the formulae are drawn from
+    @param count: The number of formulae
+    @return: The formulae, the same for the same arguments
+    '''
+
+    rng = random.Random(seed)
+    return [random_formula(rng, size, variables, max_depth, operators, constants) for _ in range(count)]
@@ -0,0 +1,157 @@
+'''
+Load test for the index route of the web interface, reporting the requests per second
+served and the latency percentiles.
+
+By default the requests are made in this process through Flask's test client, which
+measures the application alone. With --url they are sent over HTTP to a running server,
+such as one started with translator_launch --production, which measures the server too.
+
+Run from the directory holding translator_AryD05, e.g.
+
+    python -m translator_AryD05.Testing.load_test --requests 500 --concurrency 8
+    python -m translator_AryD05.Testing.load_test --url http://127.0.0.1:8080/ --distinct 20
+'''
+
+
+
+import argparse
+import json
+import math
+import re
+import threading
+import time
+import urllib.parse
+import urllib.request
+from typing import Callable, List
+
+
+# Variable names in a formula, which are words other than the temporal operators
+VARIABLE = re.compile(r'\b(?![XFGUR]\b)[A-Za-z_]\w*')
+
+
+def percentile(latencies: List[float], percent: float) -> float:
+    '''
+    @param latencies: The latencies, sorted in increasing order
+    @param percent: The percentile to take, between 0 and 100
+    @return: The nearest-rank percentile of the latencies, or 0 if there are none
+    '''
+
+    if not latencies:
+        return 0.0
+    return latencies[max(0, math.ceil(percent / 100 * len(latencies)) - 1)]
+
+
+def run_load_test(send: Callable[[int], bool], requests: int, concurrency: int) -> dict:
+    '''
+    Make a number of requests from several threads at once, timing each one.
+
+    @param send: Function making the request with the given number, returning whether it succeeded
+    @param requests: The number of requests to make
+    @param concurrency: The number of requests made at once
+    @return: A dictionary with the number of requests and errors, the elapsed seconds, the
+             requests per second and the mean, median, 90th and 99th percentile and maximum
+             latencies in milliseconds
+    '''
+
+    latencies = []
+    errors = [0]
+    numbers = iter(range(requests))
+    lock = threading.Lock()
+
+    def client():
+        while True:
+            with lock:
+                number = next(numbers, None)
+            if number is None:
+                return
+            start = time.perf_counter()
+            try:
+                succeeded = send(number)
+            except Exception:
+                succeeded = False
+            elapsed = time.perf_counter() - start
+            with lock:
+                latencies.append(elapsed)
+                if not succeeded:
+                    errors[0] += 1
+
+    start = time.perf_counter()
+    threads = [threading.Thread(target=client) for _ in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    seconds = time.perf_counter() - start
+
+    latencies.sort()
+    milliseconds = [latency * 1000 for latency in latencies]
+    return {
+        'requests': len(latencies),
+        'errors': errors[0],
+        'concurrency': concurrency,
+        'seconds': round(seconds, 3),
+        'requests_per_second': round(len(latencies) / seconds, 1) if seconds else 0.0,
+        'mean_ms': round(sum(milliseconds) / len(milliseconds), 2) if milliseconds else 0.0,
+        'p50_ms': round(percentile(milliseconds, 50), 2),
+        'p90_ms': round(percentile(milliseconds, 90), 2),
+        'p99_ms': round(percentile(milliseconds, 99), 2),
+        'max_ms': round(milliseconds[-1], 2) if milliseconds else 0.0,
+    }
+
+
+def form_data(arguments, number: int) -> dict:
+    '''
+    @param arguments: The parsed command line arguments
+    @param number: The number of the request
+    @return: The fields of the form for the request. With --distinct N, the variables of
+             the formula are renamed in one of N ways, so that requests repeat every N.
+    '''
+
+    formula = arguments.formula
+    if arguments.distinct > 1:
+        suffix = str(number % arguments.distinct)
+        formula = VARIABLE.sub(lambda match: match.group(0) + suffix, formula)
+    return {'formula': formula, 'operators': arguments.operators, 'complexity': str(arguments.complexity),
+            'depth': str(arguments.depth), 'show_unfiltered': 'n', 'timeout': str(arguments.timeout), 'limit': ''}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Load test the index route of the web interface.")
+    parser.add_argument('--url', default=None, help="URL of a running server; by default the app is tested in this process")
+    parser.add_argument('--requests', type=int, default=200, help="Number of requests (default: 200)")
+    parser.add_argument('--concurrency', type=int, default=4, help="Number of requests made at once (default: 4)")
+    parser.add_argument('--distinct', type=int, default=1,
+                        help="Number of different formulae requested in turn, by renaming variables (default: 1)")
+    parser.add_argument('--formula', default="A <-> B", help="Formula requested (default: A <-> B)")
+    parser.add_argument('--operators', default="&,->", help="Allowed operators (default: &,->)")
+    parser.add_argument('--complexity', type=float, default=2.0, help="Complexity threshold (default: 2.0)")
+    parser.add_argument('--depth', type=int, default=2, help="Maximum depth (default: 2)")
+    parser.add_argument('--timeout', type=float, default=10.0, help="Timeout of each search in seconds (default: 10.0)")
+    parser.add_argument('--json', action='store_true', help="Print the results as JSON")
+    arguments = parser.parse_args(argv)
+
+    if arguments.url is None:
+        from translator_AryD05.Web_Interface.web_interface import create_app
+        client = create_app().test_client()
+
+        def send(number):
+            return client.post('/', data=form_data(arguments, number)).status_code == 200
+    else:
+        def send(number):
+            body = urllib.parse.urlencode(form_data(arguments, number)).encode()
+            with urllib.request.urlopen(arguments.url, data=body, timeout=arguments.timeout + 30) as response:
+                response.read()
+                return response.status == 200
+
+    results = run_load_test(send, arguments.requests, arguments.concurrency)
+    if arguments.json:
+        print(json.dumps(results))
+    else:
+        print(f"{results['requests']} requests, {results['errors']} errors, {results['concurrency']} at once, in {results['seconds']:.2f} seconds")
+        print(f"{results['requests_per_second']:.1f} requests/second")
+        print(f"Latency: mean {results['mean_ms']:.1f} ms, p50 {results['p50_ms']:.1f} ms, p90 {results['p90_ms']:.1f} ms, "
+              f"p99 {results['p99_ms']:.1f} ms, max {results['max_ms']:.1f} ms")
+
+
+if __name__ == '__main__':
+    main()
@@ -1,7 +1,12 @@
+import os
 import time
 import signal
 from functools import wraps
-from Equivalence_Applier.applier import apply_equivalences
+from Equivalence_Applier.applier import apply_equivalences, apply_equivalences_to_subformulae, DispatchCounter, RewriteMemo
+from Equivalence_Applier.equivalences import EQUIVALENCES
+from Equivalence_Applier.filter import filter_equivalences, iter_filtered, operator_mask
+from Formula.parser import parse_formula
+from Formula.structure import Variable, Truth, Falsity, Not, And, Or, Implication, Biconditional, Next, Finally, Globally, Until, Release
 
 
 def timeout(seconds):
@@ -72,4 +77,206 @@ def run_performance_tests():
         print(f"Execution time: {result['execution_time']:.4f} seconds")
         print(f"Number of equivalents: {result['num_equivalents']}")
         print(f"Status: {result['status']}")
-        print("-" * 50)
\ No newline at end of file
+        print("-" * 50)
+
+
+def spectra_guarantees(count):
+    # A conjunction of GR(1)-style guarantees, similar to what Spectra specifications produce
+    return " & ".join(f"G (req_{i} & !stop -> F (grant_{i} | X ack_{i}))" for i in range(count))
+
+
+def run_parser_benchmark(repeats=5):
+    print("\nParser Benchmark Results:")
+    print("=" * 50)
+    for count in (25, 250, 1000, 4000):
+        formula = spectra_guarantees(count)
+        start_time = time.perf_counter()
+        for _ in range(repeats):
+            parse_formula(formula)
+        execution_time = (time.perf_counter() - start_time) / repeats
+        print(f"Length: {len(formula)} characters")
+        print(f"Parse time: {execution_time:.4f} seconds")
+        print(f"Throughput: {len(formula) / execution_time / 1e6:.2f} M characters/second")
+        print("-" * 50)
+
+
+
+def reference_complexity(formula):
+    if isinstance(formula, (Variable, Truth, Falsity)):
+        return 1
+    elif isinstance(formula, (Not, Next, Finally, Globally)):
+        return 1 + reference_complexity(formula.operand)
+    return 1 + reference_complexity(formula.left) + reference_complexity(formula.right)
+
+
+def reference_apply_equivalences(formula_str, complexity_threshold, max_depth):
+    # The original search loop: list used as a FIFO queue, strings as keys and the
+    # complexity of every candidate recomputed from scratch
+    formula = parse_formula(formula_str)
+    original_complexity = reference_complexity(formula)
+
+    results = [formula]
+    queue = [formula]
+    seen = {str(formula)}
+
+    while queue:
+        current_formula = queue.pop(0)
+        for new_formula in apply_equivalences_to_subformulae(current_formula, EQUIVALENCES, max_depth):
+            new_complexity = reference_complexity(new_formula)
+            if str(new_formula) not in seen and new_complexity <= original_complexity * complexity_threshold:
+                results.append(new_formula)
+                queue.append(new_formula)
+                seen.add(str(new_formula))
+
+    return results
+
+
+def run_search_benchmark():
+    test_cases = [
+        ("A <-> B", 2.5, 3),
+        ("G(A & B)", 2.0, 2),
+        ("A U B", 2.0, 2),
+        ("A & B & C & D", 1.5, 2),
+    ]
+
+    print("\nSearch Benchmark Results (before/after):")
+    print("=" * 50)
+    for formula, complexity_threshold, max_depth in test_cases:
+        start_time = time.perf_counter()
+        before = reference_apply_equivalences(formula, complexity_threshold, max_depth)
+        before_time = time.perf_counter() - start_time
+
+        counter = DispatchCounter()
+        start_time = time.perf_counter()
+        after = apply_equivalences(formula, complexity_threshold, max_depth, counter=counter)
+        after_time = time.perf_counter() - start_time
+
+        print(f"Formula: {formula} (complexity {complexity_threshold}, depth {max_depth})")
+        print(f"Before: {before_time:.4f} seconds, {len(before)} equivalents")
+        print(f"After: {after_time:.4f} seconds, {len(after)} equivalents")
+        print(f"Speedup: {before_time / after_time:.2f}x")
+        print(f"Equivalence calls: {counter.invoked} made, {counter.skipped} skipped by dispatch")
+
+        start_time = time.perf_counter()
+        single_site = apply_equivalences(formula, complexity_threshold, max_depth, rewriting='single_site')
+        single_site_time = time.perf_counter() - start_time
+        print(f"Single-site rewriting: {single_site_time:.4f} seconds, {len(single_site)} equivalents")
+
+        start_time = time.perf_counter()
+        ac = apply_equivalences(formula, complexity_threshold, max_depth, rewriting='ac')
+        ac_time = time.perf_counter() - start_time
+        print(f"AC-normal rewriting: {ac_time:.4f} seconds, {len(ac)} equivalents up to order and bracketing of & and |")
+        print("-" * 50)
+
+
+def run_parallel_benchmark(worker_counts=(1, 2, 4, 8)):
+    test_cases = [
+        ("A <-> B", 2.5, 3),
+        ("G(A & B)", 2.0, 2),
+    ]
+
+    print(f"\nParallel Expansion Benchmark Results ({os.cpu_count()} CPUs):")
+    print("=" * 50)
+    for formula, complexity_threshold, max_depth in test_cases:
+        print(f"Formula: {formula} (complexity {complexity_threshold}, depth {max_depth})")
+        baseline = None
+        for workers in worker_counts:
+            start_time = time.perf_counter()
+            results = apply_equivalences(formula, complexity_threshold, max_depth, workers=workers)
+            elapsed = time.perf_counter() - start_time
+            if baseline is None:
+                baseline = elapsed
+            print(f"{workers} workers: {elapsed:.4f} seconds, {len(results)} equivalents, speedup {baseline / elapsed:.2f}x")
+        print("-" * 50)
+
+
+def reference_is_allowed(formula, allowed_operators):
+    # The original filter: a recursive walk with an isinstance chain and a set lookup per node
+    if isinstance(formula, Variable):
+        return True
+    elif isinstance(formula, Truth) and '1' in allowed_operators:
+        return True
+    elif isinstance(formula, Falsity) and '0' in allowed_operators:
+        return True
+    elif isinstance(formula, Not) and '!' in allowed_operators:
+        return reference_is_allowed(formula.operand, allowed_operators)
+    elif isinstance(formula, And) and '&' in allowed_operators:
+        return reference_is_allowed(formula.left, allowed_operators) and reference_is_allowed(formula.right, allowed_operators)
+    elif isinstance(formula, Or) and '|' in allowed_operators:
+        return reference_is_allowed(formula.left, allowed_operators) and reference_is_allowed(formula.right, allowed_operators)
+    elif isinstance(formula, Implication) and '->' in allowed_operators:
+        return reference_is_allowed(formula.left, allowed_operators) and reference_is_allowed(formula.right, allowed_operators)
+    elif isinstance(formula, Biconditional) and '<->' in allowed_operators:
+        return reference_is_allowed(formula.left, allowed_operators) and reference_is_allowed(formula.right, allowed_operators)
+    elif isinstance(formula, Next) and 'X' in allowed_operators:
+        return reference_is_allowed(formula.operand, allowed_operators)
+    elif isinstance(formula, Finally) and 'F' in allowed_operators:
+        return reference_is_allowed(formula.operand, allowed_operators)
+    elif isinstance(formula, Globally) and 'G' in allowed_operators:
+        return reference_is_allowed(formula.operand, allowed_operators)
+    elif isinstance(formula, Until) and 'U' in allowed_operators:
+        return reference_is_allowed(formula.left, allowed_operators) and reference_is_allowed(formula.right, allowed_operators)
+    elif isinstance(formula, Release) and 'R' in allowed_operators:
+        return reference_is_allowed(formula.left, allowed_operators) and reference_is_allowed(formula.right, allowed_operators)
+    else:
+        return False
+
+
+def run_filter_benchmark(candidates=1000000):
+    # Candidates are the closure of a formula, repeated up to the requested number
+    closure = apply_equivalences("G(A & B)", 2.0, 2, rewriting='single_site')
+    formulae = (closure * (candidates // len(closure) + 1))[:candidates]
+    allowed_operators = {'!', '&', 'G', 'F'}
+
+    print(f"\nFilter Benchmark Results ({candidates} candidates):")
+    print("=" * 50)
+
+    start_time = time.perf_counter()
+    before = [formula for formula in formulae if reference_is_allowed(formula, allowed_operators)]
+    before_time = time.perf_counter() - start_time
+
+    start_time = time.perf_counter()
+    after = filter_equivalences(formulae, allowed_operators)
+    after_time = time.perf_counter() - start_time
+
+    start_time = time.perf_counter()
+    streamed = sum(1 for _ in iter_filtered(iter(formulae), operator_mask(allowed_operators)))
+    streamed_time = time.perf_counter() - start_time
+
+    print(f"Before (recursive walk): {before_time:.4f} seconds, {len(before)} kept")
+    print(f"After (bitmask, batch): {after_time:.4f} seconds, {len(after)} kept")
+    print(f"After (bitmask, stream): {streamed_time:.4f} seconds, {streamed} kept")
+    print(f"Speedup: {before_time / after_time:.2f}x")
+    print(f"Throughput: {candidates / after_time / 1e6:.2f} M candidates/second")
+    print("-" * 50)
+
+
+def run_rewrite_memo_benchmark():
+    test_cases = [
+        ("A <-> B", 2.5, 3, 'single_site'),
+        ("G(A & B)", 2.0, 2, 'single_site'),
+        ("(A -> B) & (C | !D)", 1.5, 3, 'single_site'),
+        ("G(A & B)", 2.0, 2, 'product'),
+    ]
+
+    print("\nRewrite Memo Benchmark Results:")
+    print("=" * 50)
+
+    for formula, complexity_threshold, max_depth, rewriting in test_cases:
+        print(f"Formula: {formula} ({rewriting})")
+
+        # A memo with no room memoises nothing
+        start_time = time.perf_counter()
+        before = apply_equivalences(formula, complexity_threshold, max_depth, rewriting=rewriting, rewrite_memo=RewriteMemo(0))
+        before_time = time.perf_counter() - start_time
+
+        memo = RewriteMemo()
+        start_time = time.perf_counter()
+        after = apply_equivalences(formula, complexity_threshold, max_depth, rewriting=rewriting, rewrite_memo=memo)
+        after_time = time.perf_counter() - start_time
+
+        print(f"Without memo: {before_time:.4f} seconds, {len(before)} equivalents")
+        print(f"With memo: {after_time:.4f} seconds, {len(after)} equivalents")
+        print(f"Memo: {memo.hits} hits, {memo.misses} misses, {memo.hit_rate:.2%} hit rate, {memo.size} formulae held")
+        print(f"Speedup: {before_time / after_time:.2f}x")
+        print("-" * 50)
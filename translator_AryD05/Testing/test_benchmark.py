@@ -0,0 +1,97 @@
+import copy
+import random
+from Testing.formula_generator import OPERATOR_MIXES, UNARY, BINARY, random_formula, random_formulae
+from Testing.benchmark import run_benchmarks, compare
+from Equivalence_Applier.filter import operator_mask
+
+
+def test_formula_generator():
+    passed = 0
+    failed = 0
+
+    def check(name, condition):
+        nonlocal passed, failed
+        if condition:
+            print(f"PASS: {name}")
+            passed += 1
+        else:
+            print(f"FAIL: {name}")
+            failed += 1
+
+    check("the same seed gives the same formulae", random_formulae(7, 20, 15) == random_formulae(7, 20, 15))
+    check("different seeds give different formulae", random_formulae(7, 20, 15) != random_formulae(8, 20, 15))
+
+    sized = {size: random_formulae(size, 50, size, variables=2, max_depth=6) for size in (1, 2, 3, 10, 50)}
+    formulae = [formula for batch in sized.values() for formula in batch]
+    check("formulae have exactly the size asked for", all(formula.complexity == size for size, batch in sized.items() for formula in batch))
+    check("formulae are no deeper than the depth asked for", all(formula.depth <= 6 for formula in formulae))
+
+    names = set()
+    stack = list(formulae)
+    while stack:
+        formula = stack.pop()
+        if not formula.children():
+            names.add(str(formula))
+        stack.extend(formula.children())
+    check("formulae only use the variables asked for", names <= {'p0', 'p1'})
+
+    mix = OPERATOR_MIXES['propositional']
+    allowed = operator_mask(set(mix))
+    check("formulae only use the operators of their mix",
+          all(formula.operator_mask & ~allowed == 0 for formula in random_formulae(0, 200, 12, operators=mix)))
+    check("a mix without unary operators falls back on negation",
+          all(formula.complexity == 2 for formula in random_formulae(0, 10, 2, operators={'&': 1})))
+    check("constants appear as leaves when asked for",
+          any(formula.operator_mask & operator_mask({'1', '0'}) for formula in random_formulae(0, 50, 9, constants=0.5)))
+
+    try:
+        random_formula(random.Random(0), 8, max_depth=3)
+        check("a size that cannot fit within the depth is refused", False)
+    except ValueError:
+        check("a size that cannot fit within the depth is refused", True)
+
+    check("every mix names known operators", all(set(mix) <= set(UNARY) | set(BINARY) for mix in OPERATOR_MIXES.values()))
+
+    return passed, failed
+
+
+def test_benchmark_comparison():
+    passed = 0
+    failed = 0
+
+    def check(name, condition):
+        nonlocal passed, failed
+        if condition:
+            print(f"PASS: {name}")
+            passed += 1
+        else:
+            print(f"FAIL: {name}")
+            failed += 1
+
+    results = run_benchmarks(['filter'], repeats=1, quick=True)
+    points = results['results']['filter']
+    check("a benchmark gives a point for each size of its curve", [point['count'] for point in points] == [1000, 10000, 100000])
+    check("each point has a time and a throughput", all(point['seconds'] > 0 and point['formulae_per_second'] > 0 for point in points))
+
+    compared = compare(results, results)
+    check("results match themselves", compared and not any(comparison['regression'] for comparison in compared))
+
+    faster = copy.deepcopy(results)
+    for point in faster['results']['filter']:
+        point['seconds'] /= 3
+    check("points much slower than the baseline are regressions",
+          any(comparison['regression'] for comparison in compare(results, faster)) and not any(comparison['regression'] for comparison in compare(faster, results)))
+
+    tiny = copy.deepcopy(results)
+    for point in tiny['results']['filter']:
+        point['seconds'] = 1e-5
+    check("points too fast to time reliably are not compared", compare(tiny, tiny) == [])
+
+    other = dict(results, seed=1)
+    try:
+        compare(results, other)
+        check("results of other formulae are not compared", False)
+    except ValueError:
+        check("results of other formulae are not compared", True)
+
+    return passed, failed
@@ -0,0 +1,145 @@
+import io
+import json
+from contextlib import redirect_stdout
+
+
+def test_batch():
+    # The command line modules use relative imports, so they are imported through the
+    # translator_AryD05 package, which is on the path once test.py has been loaded
+    from translator_AryD05.batch import run_batch, read_records, parse_record
+
+    passed = 0
+    failed = 0
+
+    def check(name, condition):
+        nonlocal passed, failed
+        if condition:
+            print(f"PASS: {name}")
+            passed += 1
+        else:
+            print(f"FAIL: {name}")
+            failed += 1
+
+    lines = [
+        "# comment",
+        "A <-> B",
+        "",
+        '{"formula": "x <-> y", "operators": ["&", "->"], "complexity": 2.5, "depth": 3, "limit": 1}',
+        '{"formula": "A U B", "colour": "red"}',
+        "A &",
+        "A U B",
+    ]
+    defaults = {'operators': '!,&,|,U', 'complexity': 2.0, 'depth': 2, 'timeout': 10.0, 'limit': None, 'show_unfiltered': False}
+
+    records = list(read_records(lines, defaults))
+    check("blank lines and comments are skipped", [record['line'] for record in records] == [2, 4, 5, 6, 7])
+    check("JSON lines override the defaults", records[1]['operators'] == '&,->' and records[1]['depth'] == 3 and records[1]['limit'] == 1)
+    check("unknown JSON fields are reported", 'colour' in records[2].get('error', ''))
+
+    def invalid(fields):
+        try:
+            parse_record(dict(fields, formula="a & b"), defaults)
+        except ValueError as e:
+            return str(e).startswith("invalid value for ")
+        return False
+
+    check("only JSON booleans show unfiltered formulae", all(invalid({'show_unfiltered': value}) for value in ("false", "n", 0, 1))
+          and parse_record({'formula': "a & b", 'show_unfiltered': False}, defaults)['show_unfiltered'] is False)
+    check("whole numbers are accepted for integer fields", parse_record({'formula': "a & b", 'depth': 3.0, 'limit': "5"}, defaults)
+          == dict(defaults, formula="a & b", depth=3, limit=5))
+    check("fractions, booleans and text are refused for numbers",
+          all(invalid({name: value}) for name in ('depth', 'limit') for value in (2.7, True, "2.7", [2]))
+          and invalid({'complexity': "high"}) and invalid({'timeout': False}))
+
+    for jobs in (1, 2):
+        output = io.StringIO()
+        summary = run_batch(lines, output, defaults, {}, jobs, use_cache=False)
+        results = {result['line']: result for result in map(json.loads, output.getvalue().splitlines())}
+        check(f"{jobs} jobs write one result per formula", sorted(results) == [2, 4, 5, 6, 7] and summary['formulae'] == 5)
+        check(f"{jobs} jobs report errors per formula", summary['errors'] == 2 and results[6]['error'] is not None and results[2]['error'] is None)
+        check(f"{jobs} jobs apply per-formula options", len(results[4]['filtered']) == 1 and results[4]['operators'] == ['&', '->'])
+        check(f"{jobs} jobs time each formula", all(result['seconds'] >= 0 for result in results.values()))
+        check(f"{jobs} jobs match the filtered equivalences", results[7]['filtered'] and results[7]['generated'] == 28)
+
+    # (A & B) & C and A & (B & C) print alike, so only one of them is written
+    output = io.StringIO()
+    run_batch(['{"formula": "A & B & C", "operators": "&,|", "complexity": 1.5, "show_unfiltered": true}'], output, defaults, {}, use_cache=False)
+    result = json.loads(output.getvalue())
+    check("results print no formula twice", len(set(result['unfiltered'])) == len(result['unfiltered']) == result['generated']
+          and len(set(result['filtered'])) == len(result['filtered']))
+
+    return passed, failed
+
+
+def test_jsonl_output():
+    from translator_AryD05.command_line import EquivalenceApplier
+
+    passed = 0
+    failed = 0
+
+    def check(name, condition):
+        nonlocal passed, failed
+        if condition:
+            print(f"PASS: {name}")
+            passed += 1
+        else:
+            print(f"FAIL: {name}")
+            failed += 1
+
+    def transform(command, **options):
+        output = io.StringIO()
+        with redirect_stdout(output):
+            EquivalenceApplier(format='jsonl', **options).onecmd(command)
+        return [json.loads(line) for line in output.getvalue().splitlines()]
+
+    records = transform('transform "A <-> B" &,-> 2.5 3 n 30')
+    formulae, summary = records[:-1], records[-1]
+    check("every line is a JSON object ending with a summary", summary['type'] == 'summary' and all(record['type'] == 'formula' for record in formulae))
+    check("filtered formulae are streamed", [record['formula'] for record in formulae] == ['((A -> B) & (B -> A))', '((B -> A) & (A -> B))'])
+    check("summary counts the formulae", summary['generated'] == 542 and summary['filtered'] == 2 and not summary['timed_out'] and not summary['truncated'])
+
+    records = transform('transform "A <-> B" &,-> 2.5 3 y 30', limit=1)
+    check("unfiltered formulae are streamed when asked for", len(records) == records[-1]['generated'] + 1 and not records[0]['allowed'])
+    check("summary flags a search stopped at the limit", records[-1]['truncated'] and records[-1]['filtered'] == 1)
+
+    records = transform('transform "A <->" & 2.5 3 n 30')
+    check("errors are reported in the summary", len(records) == 1 and records[0]['error'] is not None)
+
+    return passed, failed
+
+
+def test_text_output():
+    from translator_AryD05.command_line import EquivalenceApplier
+
+    passed = 0
+    failed = 0
+
+    def check(name, condition):
+        nonlocal passed, failed
+        if condition:
+            print(f"PASS: {name}")
+            passed += 1
+        else:
+            print(f"FAIL: {name}")
+            failed += 1
+
+    output = io.StringIO()
+    with redirect_stdout(output):
+        EquivalenceApplier().onecmd('transform "A & B & C" &,| 1.5 2 y 30')
+    lines = output.getvalue().splitlines()
+    before = lines.index(next(line for line in lines if line.startswith("Before filtering: ")))
+    after = lines.index(next(line for line in lines if line.startswith("After filtering: ")))
+    unfiltered, filtered = lines[before + 1:after], lines[after + 1:]
+    check("every generated formula is printed", len(unfiltered) == int(lines[before].split(': ')[1]) and len(unfiltered) > 1)
+    check("every filtered formula is printed", len(filtered) == int(lines[after].split(': ')[1]) and len(filtered) > 1)
+    # The search keeps (A & B) & C and A & (B & C) apart, but they print alike
+    check("no formula is printed twice", len(set(unfiltered)) == len(unfiltered) and len(set(filtered)) == len(filtered))
+
+    output = io.StringIO()
+    with redirect_stdout(output):
+        EquivalenceApplier(format='jsonl').onecmd('transform "A & B & C" &,| 1.5 2 y 30')
+    records = [json.loads(line) for line in output.getvalue().splitlines()]
+    texts = [record['formula'] for record in records[:-1]]
+    check("no formula is streamed twice", len(set(texts)) == len(texts) == records[-1]['generated'])
+
+    return passed, failed
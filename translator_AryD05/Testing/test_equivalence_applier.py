@@ -1,4 +1,14 @@
-from Equivalence_Applier.applier import apply_equivalences
+from itertools import islice
+from Equivalence_Applier.applier import apply_equivalences, iter_equivalences, rewrite_single_sites, disallowed_count, equivalence_index, DispatchCounter, CancelToken, RewriteMemo, RuleProfile, SearchStats, EQUIVALENCE_TUPLES
+from Equivalence_Applier.filter import operator_mask
+from Equivalence_Applier.isolation import iter_equivalences_in_subprocess
+from Equivalence_Applier.cache import ClosureCache, RenamingMemo
+import tempfile
+import time
+from Equivalence_Applier.equivalences import EQUIVALENCES, EQUIVALENCES_BY_OPERATION
+from Formula.parser import parse_formula
+from Formula.structure import Operation
+from Formula.canonical import ac_canonical
 
 
 def test_equivalence_applier(formula_str: str):
@@ -10,4 +20,476 @@ def test_equivalence_applier(formula_str: str):
     
     print("\nEquivalent Formulae:")
     for eq in equivalents:
-        print(eq._str())
\ No newline at end of file
+        print(eq._str())
+
+
+def test_rewriting_modes():
+    passed = 0
+    failed = 0
+
+    # Single-site neighbours differ from the original at exactly one position and share
+    # the untouched subtree
+    formula = parse_formula("(A -> B) & G C")
+    neighbours = rewrite_single_sites(formula, EQUIVALENCES, 3)
+    shared = [n for n in neighbours if n.operation == formula.operation and (n.left is formula.left or n.right is formula.right)]
+    if formula not in neighbours and len(shared) > 0:
+        print(f"PASS: {len(neighbours)} single-site neighbours, {len(shared)} sharing a subtree")
+        passed += 1
+    else:
+        print("FAIL: single-site neighbours")
+        failed += 1
+
+    for formula_str, complexity, depth in [("A <-> B", 2.5, 3), ("G(A & B)", 2.0, 2), ("A U B", 2.0, 2)]:
+        product = set(apply_equivalences(formula_str, complexity, depth, rewriting='product'))
+        single_site = set(apply_equivalences(formula_str, complexity, depth, rewriting='single_site'))
+        if product == single_site:
+            print(f"PASS: {formula_str} gives the same {len(product)} equivalents in both modes")
+            passed += 1
+        else:
+            print(f"FAIL: {formula_str} gives {len(product)} equivalents in product mode and {len(single_site)} in single-site mode")
+            failed += 1
+
+    return passed, failed
+
+
+def test_egraph_engine():
+    passed = 0
+    failed = 0
+
+    # The e-graph represents at least every formula the breadth-first search finds
+    for formula_str, complexity, depth in [("A U B", 2.0, 2), ("A <-> B", 2.5, 3)]:
+        bfs = set(apply_equivalences(formula_str, complexity, depth))
+        egraph = set(apply_equivalences(formula_str, complexity, depth, engine='egraph'))
+        if bfs <= egraph:
+            print(f"PASS: {formula_str} e-graph covers all {len(bfs)} breadth-first equivalents ({len(egraph)} in total)")
+            passed += 1
+        else:
+            print(f"FAIL: {formula_str} e-graph misses {len(bfs - egraph)} breadth-first equivalents")
+            failed += 1
+
+    smallest = apply_equivalences("A <-> B", 2.5, 3, engine='egraph', extraction='smallest', count=5)
+    sizes = [formula.complexity for formula in smallest]
+    if str(smallest[0]) == "(A <-> B)" and len(sizes) == 5 and sizes == sorted(sizes):
+        print(f"PASS: smallest extraction gives complexities {sizes}")
+        passed += 1
+    else:
+        print(f"FAIL: smallest extraction gave {[str(formula) for formula in smallest]}")
+        failed += 1
+
+    # The original formula counts towards the smallest, even when it is not among them
+    counts = [len(apply_equivalences(formula_str, 1.5, 2, engine='egraph', extraction='smallest', count=count))
+              for formula_str, count in [("a & 1", 1), ("!!!!a", 2)]]
+    if counts == [1, 2]:
+        print("PASS: smallest extraction counts the original formula")
+        passed += 1
+    else:
+        print(f"FAIL: smallest extraction gave {counts} formulae for counts [1, 2]")
+        failed += 1
+
+    best = apply_equivalences("A <-> B", 2.5, 3, engine='egraph', extraction='best', allowed_operators={'!', '&', '|'})
+    allowed = {Operation.VARIABLE, Operation.NOT, Operation.AND, Operation.OR}
+    if len(best) == 1 and all(operation.bit & best[0].operator_mask == 0 for operation in Operation if operation not in allowed):
+        print(f"PASS: best extraction with !, &, | gives {best[0]}")
+        passed += 1
+    else:
+        print(f"FAIL: best extraction with !, &, | gave {[str(formula) for formula in best]}")
+        failed += 1
+
+    if apply_equivalences("A U B", 2.0, 2, engine='egraph', extraction='best', allowed_operators={'&'}) == []:
+        print("PASS: best extraction with too few operators gives no formula")
+        passed += 1
+    else:
+        print("FAIL: best extraction with too few operators gave a formula")
+        failed += 1
+
+    try:
+        apply_equivalences("A", 2.0, 2, engine='dfs')
+        print("FAIL: unknown engine accepted")
+        failed += 1
+    except ValueError:
+        print("PASS: unknown engine rejected")
+        passed += 1
+
+    return passed, failed
+
+
+def test_parallel_expansion():
+    passed = 0
+    failed = 0
+
+    # Parallel expansion finds the same formulae in the same order as the sequential search
+    for formula_str, complexity, depth, rewriting in [("A <-> B", 2.5, 3, 'product'), ("G(A & B)", 2.0, 2, 'single_site')]:
+        sequential = apply_equivalences(formula_str, complexity, depth, rewriting=rewriting)
+        parallel = apply_equivalences(formula_str, complexity, depth, rewriting=rewriting, workers=2)
+        if parallel == sequential:
+            print(f"PASS: {formula_str} gives the same {len(sequential)} equivalents with 2 workers")
+            passed += 1
+        else:
+            print(f"FAIL: {formula_str} gives {len(sequential)} equivalents sequentially and {len(parallel)} with 2 workers")
+            failed += 1
+
+    return passed, failed
+
+
+def test_iter_equivalences():
+    passed = 0
+    failed = 0
+
+    for formula_str, complexity, depth, options in [("A <-> B", 2.5, 3, {}), ("G(A & B)", 2.0, 2, {'rewriting': 'single_site'}),
+                                                    ("A U B", 2.0, 2, {'engine': 'egraph'})]:
+        if list(iter_equivalences(formula_str, complexity, depth, **options)) == apply_equivalences(formula_str, complexity, depth, **options):
+            print(f"PASS: {formula_str} {options} yields the same formulae as apply_equivalences")
+            passed += 1
+        else:
+            print(f"FAIL: {formula_str} {options} yields different formulae from apply_equivalences")
+            failed += 1
+
+    # Taking the first few formulae only runs as much of the search as is needed
+    full, partial = DispatchCounter(), DispatchCounter()
+    apply_equivalences("A <-> B", 2.5, 3, counter=full)
+    first = list(islice(iter_equivalences("A <-> B", 2.5, 3, counter=partial), 5))
+    if len(first) == 5 and partial.invoked < full.invoked:
+        print(f"PASS: first 5 formulae after {partial.invoked} of {full.invoked} equivalence calls")
+        passed += 1
+    else:
+        print(f"FAIL: first 5 formulae after {partial.invoked} of {full.invoked} equivalence calls")
+        failed += 1
+
+    # Bad arguments are reported when the iterator is created, not when it is first used
+    try:
+        iter_equivalences("A &", 2.0, 2)
+        print("FAIL: invalid formula accepted")
+        failed += 1
+    except ValueError:
+        print("PASS: invalid formula rejected straight away")
+        passed += 1
+
+    return passed, failed
+
+
+def test_cancellation():
+    passed = 0
+    failed = 0
+
+    # A search far too large to finish stops at its deadline with the formulae found so far
+    for name, options in [("breadth-first", {}), ("2 workers", {'workers': 2}), ("e-graph", {'engine': 'egraph'})]:
+        start = time.perf_counter()
+        partial = apply_equivalences("G(A & B) -> F(C | !D)", 3.0, 4, cancel=CancelToken(0.5), **options)
+        elapsed = time.perf_counter() - start
+        if elapsed < 2.5 and len(partial) >= 1:
+            print(f"PASS: {name} search cancelled after {elapsed:.2f} seconds with {len(partial)} formulae")
+            passed += 1
+        else:
+            print(f"FAIL: {name} search cancelled after {elapsed:.2f} seconds with {len(partial)} formulae")
+            failed += 1
+
+    cancel = CancelToken()
+    search = iter_equivalences("A <-> B", 2.5, 3, cancel=cancel)
+    first = [next(search), next(search)]
+    cancel.cancel()
+    if len(first) + len(list(search)) < len(apply_equivalences("A <-> B", 2.5, 3)):
+        print("PASS: explicit cancel ends the iterator early")
+        passed += 1
+    else:
+        print("FAIL: explicit cancel did not end the iterator early")
+        failed += 1
+
+    if list(iter_equivalences_in_subprocess("A U B", 2.0, 2)) == apply_equivalences("A U B", 2.0, 2):
+        print("PASS: subprocess search gives the same formulae")
+        passed += 1
+    else:
+        print("FAIL: subprocess search gives different formulae")
+        failed += 1
+
+    start = time.perf_counter()
+    partial = list(iter_equivalences_in_subprocess("G(A & B) -> F(C | !D)", 3.0, 4, cancel=CancelToken(0.5)))
+    elapsed = time.perf_counter() - start
+    if elapsed < 1.5 and len(partial) >= 1:
+        print(f"PASS: subprocess search killed after {elapsed:.2f} seconds with {len(partial)} formulae")
+        passed += 1
+    else:
+        print(f"FAIL: subprocess search killed after {elapsed:.2f} seconds with {len(partial)} formulae")
+        failed += 1
+
+    return passed, failed
+
+
+def test_goal_directed_search():
+    passed = 0
+    failed = 0
+
+    # Without a count the goal engine visits the same formulae as breadth-first search
+    bfs = apply_equivalences("A R B", 2.5, 2)
+    goal = apply_equivalences("A R B", 2.5, 2, engine='goal', allowed_operators={'U', '!'})
+    if set(goal) == set(bfs):
+        print(f"PASS: goal engine visits the same {len(bfs)} formulae")
+        passed += 1
+    else:
+        print(f"FAIL: goal engine visits {len(goal)} formulae, breadth-first search {len(bfs)}")
+        failed += 1
+
+    # The formula passing the filter is reached sooner, and the search stops once it is found
+    allowed = operator_mask({'U', '!'})
+    position = lambda formulae: next(i for i, formula in enumerate(formulae) if formula.operator_mask & ~allowed == 0)
+    stopped = apply_equivalences("A R B", 2.5, 2, engine='goal', allowed_operators={'U', '!'}, count=1)
+    if position(goal) < position(bfs) and len(stopped) == position(goal) + 1:
+        print(f"PASS: first formula using U and ! is number {position(goal)} rather than {position(bfs)}")
+        passed += 1
+    else:
+        print(f"FAIL: first formula using U and ! is number {position(goal)} rather than {position(bfs)}, {len(stopped)} generated with count 1")
+        failed += 1
+
+    tests = [
+        ("no disallowed nodes", disallowed_count(parse_formula("!(!A U !B)"), allowed), 0),
+        ("disallowed nodes", disallowed_count(parse_formula("(A R B) & G (C R D)"), allowed), 4),
+    ]
+    for name, result, expected in tests:
+        if result == expected:
+            print(f"PASS: {name}")
+            passed += 1
+        else:
+            print(f"FAIL: {name}: expected {expected}, got {result}")
+            failed += 1
+
+    try:
+        iter_equivalences("A R B", 2.5, 2, engine='goal')
+        print("FAIL: goal engine accepted without allowed operators")
+        failed += 1
+    except ValueError:
+        print("PASS: goal engine needs allowed operators")
+        passed += 1
+
+    return passed, failed
+
+
+def test_ac_rewriting():
+    passed = 0
+    failed = 0
+
+    # Searching over AC-normal forms finds one formula for each class of AC-equivalent
+    # formulae in the full closure
+    for formula_str, complexity, depth in [("A <-> B", 2.5, 3), ("A & B & C & D", 1.5, 2), ("(A | B) & (A | C)", 1.5, 2)]:
+        full = apply_equivalences(formula_str, complexity, depth, rewriting='single_site')
+        memo = {}
+        classes = {ac_canonical(formula, memo) for formula in full}
+        ac = apply_equivalences(formula_str, complexity, depth, rewriting='ac')
+        if set(ac) == classes and len(ac) == len(classes):
+            print(f"PASS: {formula_str} gives {len(ac)} AC-normal forms for {len(full)} formulae")
+            passed += 1
+        else:
+            print(f"FAIL: {formula_str} gives {len(ac)} AC-normal forms, expected {len(classes)}")
+            failed += 1
+
+    return passed, failed
+
+
+def test_equivalence_index():
+    passed = 0
+    failed = 0
+
+    def check(name, condition):
+        nonlocal passed, failed
+        if condition:
+            print(f"PASS: {name}")
+            passed += 1
+        else:
+            print(f"FAIL: {name}")
+            failed += 1
+
+    check("the default equivalences use the prebuilt index", equivalence_index(EQUIVALENCES) is EQUIVALENCES_BY_OPERATION)
+
+    subset = EQUIVALENCES[:10]
+    index = equivalence_index(subset)
+    check("other tuples are indexed by the operations of their equivalences",
+          all(set(rules) <= set(subset) for rules in index.values()) and sum(len(rules) for rules in index.values()) >= len(subset))
+    check("equal tuples share an index", equivalence_index(tuple(list(subset))) is index and equivalence_index(list(subset)) is index)
+
+    # Only the most recently used tuples keep their index, so passing many does not leak
+    for count in range(11, 11 + 2 * EQUIVALENCE_TUPLES):
+        equivalence_index(EQUIVALENCES[:count])
+    check("indexes of tuples not used lately are dropped", equivalence_index(subset) is not index and equivalence_index(subset) == index)
+
+    return passed, failed
+
+
+def test_closure_cache():
+    passed = 0
+    failed = 0
+
+    def check(name, condition):
+        nonlocal passed, failed
+        if condition:
+            print(f"PASS: {name}")
+            passed += 1
+        else:
+            print(f"FAIL: {name}")
+            failed += 1
+
+    with tempfile.TemporaryDirectory() as directory:
+        cache = ClosureCache(directory)
+        equivalents = apply_equivalences("A <-> B", 2.5, 3)
+        check("unknown search misses", cache.get("A <-> B", 2.5, 3) is None)
+        cache.put("A <-> B", 2.5, 3, equivalents)
+        check("stored search hits with the same formulae in order", cache.get("A <-> B", 2.5, 3) == equivalents)
+        check("key ignores spacing and redundant brackets", cache.get("(A)<->(B)", 2.5, 3, workers=2) == equivalents)
+        check("other parameters miss", cache.get("A <-> B", 2.5, 2) is None and cache.get("A <-> B", 2.5, 3, rewriting='ac') is None)
+        check("filter operators do not split bfs entries", cache.get("A <-> B", 2.5, 3, allowed_operators={'&'}) == equivalents)
+        check("a new rule-set version misses", ClosureCache(directory, version='edited').get("A <-> B", 2.5, 3) is None)
+        stats = ClosureCache(directory).stats()
+        check("statistics persist across instances", (stats['hits'], stats['misses'], stats['entries']) == (3, 4, 1))
+
+        # With room for little more than one entry, storing another evicts the least recently used
+        small = ClosureCache(directory, max_bytes=stats['bytes'] + 100)
+        small.put("A U B", 2.0, 2, apply_equivalences("A U B", 2.0, 2))
+        check("least recently used entry is evicted", small.get("A <-> B", 2.5, 3) is None and small.get("A U B", 2.0, 2) is not None)
+        small.clear()
+        check("clear empties the cache", small.stats()['entries'] == 0 and small.stats()['hits'] == 0)
+
+        # Both bracketings print as (A & B & C), but they are different searches
+        cache.put("(A & B) & C", 1.5, 1, apply_equivalences("(A & B) & C", 1.5, 1))
+        check("differently bracketed formulae miss each other's entries",
+              cache.get("A & (B & C)", 1.5, 1) is None and cache.get("(A & B) & C", 1.5, 1) is not None)
+
+    return passed, failed
+
+
+def test_renaming_memo():
+    passed = 0
+    failed = 0
+
+    def check(name, condition):
+        nonlocal passed, failed
+        if condition:
+            print(f"PASS: {name}")
+            passed += 1
+        else:
+            print(f"FAIL: {name}")
+            failed += 1
+
+    memo = RenamingMemo(max_entries=2)
+    memo.put("A U B", 2.0, 2, apply_equivalences("A U B", 2.0, 2))
+    check("renamed formula hits with its own variables", memo.get("req U grant", 2.0, 2) == apply_equivalences("req U grant", 2.0, 2))
+    check("swapped variables hit", memo.get("B U A", 2.0, 2) == apply_equivalences("B U A", 2.0, 2))
+    check("a different shape misses", memo.get("A U A", 2.0, 2) is None)
+
+    memo.put("A & B & C", 1.5, 2, apply_equivalences("A & B & C", 1.5, 2, rewriting='ac'), rewriting='ac')
+    renamed = memo.get("z & y & x", 1.5, 2, rewriting='ac')
+    check("AC results are AC-normal in the caller's variables", renamed is not None and set(renamed) == set(apply_equivalences("z & y & x", 1.5, 2, rewriting='ac')))
+
+    memo.put("X A", 2.0, 2, apply_equivalences("X A", 2.0, 2))
+    check("least recently used search is evicted", len(memo) == 2 and memo.get("p U q", 2.0, 2) is None)
+    check("hits and misses are counted", (memo.stats()['hits'], memo.stats()['misses']) == (3, 2))
+
+    return passed, failed
+
+
+def test_rewrite_memo():
+    passed = 0
+    failed = 0
+
+    def check(name, condition):
+        nonlocal passed, failed
+        if condition:
+            print(f"PASS: {name}")
+            passed += 1
+        else:
+            print(f"FAIL: {name}")
+            failed += 1
+
+    for rewriting in ('product', 'single_site', 'ac'):
+        memo = RewriteMemo()
+        with_memo = apply_equivalences("G(A & B)", 2.0, 2, rewriting=rewriting, rewrite_memo=memo)
+        without_memo = apply_equivalences("G(A & B)", 2.0, 2, rewriting=rewriting, rewrite_memo=RewriteMemo(0))
+        check(f"{rewriting} gives the same formulae with a {memo.hit_rate:.0%} hit rate", with_memo == without_memo and memo.hits > 0)
+
+    # Shared across searches, a second search finds the subformulae of the first
+    memo = RewriteMemo()
+    apply_equivalences("A <-> B", 2.5, 3, rewriting='single_site', rewrite_memo=memo)
+    misses = memo.misses
+    apply_equivalences("(A <-> B) | C", 1.5, 3, rewriting='single_site', rewrite_memo=memo)
+    check("a shared memo is reused by the next search", memo.hits > 0 and memo.misses - misses < misses)
+
+    bounded = RewriteMemo(500)
+    bounded_result = apply_equivalences("G(A & B)", 2.0, 2, rewriting='single_site', rewrite_memo=bounded)
+    check("a bounded memo stays within its size and gives the same formulae",
+          bounded.size <= 500 and bounded.evictions > 0 and bounded_result == apply_equivalences("G(A & B)", 2.0, 2, rewriting='single_site'))
+
+    return passed, failed
+
+
+def test_rule_profile():
+    passed = 0
+    failed = 0
+
+    def check(name, condition):
+        nonlocal passed, failed
+        if condition:
+            print(f"PASS: {name}")
+            passed += 1
+        else:
+            print(f"FAIL: {name}")
+            failed += 1
+
+    counter = DispatchCounter()
+    profile = RuleProfile()
+    counted = apply_equivalences("A <-> B", 2.5, 3, counter, rewriting='single_site')
+    profiled = apply_equivalences("A <-> B", 2.5, 3, profile, rewriting='single_site')
+    check("profiling does not change the formulae or the dispatch counts",
+          profiled == counted and (profile.invoked, profile.skipped) == (counter.invoked, counter.skipped))
+
+    report = profile.report()
+    check("every call is attributed to a rule", sum(row['calls'] for row in report) == profile.invoked)
+    check("the report is sorted slowest first", [row['seconds'] for row in report] == sorted((row['seconds'] for row in report), reverse=True))
+    check("each rule changes no more formulae than it is called on, and finds no more new ones than it changes",
+          all(row['new'] <= row['changed'] <= row['calls'] for row in report))
+    biconditional = profile.rules['biconditional_to_implications']
+    check("rules that always apply change every formula they are called on", biconditional.calls == biconditional.changed > 0)
+    check("formulae produced before are not counted as new", sum(row['new'] for row in report) < sum(row['changed'] for row in report))
+
+    try:
+        apply_equivalences("A <-> B", 2.5, 3, RuleProfile(), engine='egraph')
+        check("the egraph engine cannot be profiled", False)
+    except ValueError:
+        check("the egraph engine cannot be profiled", True)
+
+    return passed, failed
+
+
+def test_search_stats():
+    passed = 0
+    failed = 0
+
+    def check(name, condition):
+        nonlocal passed, failed
+        if condition:
+            print(f"PASS: {name}")
+            passed += 1
+        else:
+            print(f"FAIL: {name}")
+            failed += 1
+
+    reports = []
+    stats = SearchStats(lambda stats: reports.append(stats.to_dict()), interval=0.0)
+    result = apply_equivalences("A <-> B", 2.5, 3, rewriting='single_site', stats=stats)
+    check("the stats do not change the formulae", result == apply_equivalences("A <-> B", 2.5, 3, rewriting='single_site'))
+    check("the search is reported as it runs and once more at the end",
+          len(reports) > 2 and not reports[0]['done'] and reports[-1]['done'] and [report['done'] for report in reports].count(True) == 1)
+    final = reports[-1]
+    check("the final report counts every formula generated and expanded",
+          final['generated'] == len(result) and final['expanded'] == len(result) and final['frontier'] == 0)
+    check("formulae over the complexity limit are counted as seen and rejected",
+          final['rejected'] > 0 and final['seen'] == final['generated'] + final['rejected'])
+    check("the levels of the breadth-first search only grow", [report['level'] for report in reports] == sorted(report['level'] for report in reports) and final['level'] > 1)
+    check("memory and rate are estimated", final['peak_memory'] > 0 and final['rate'] > 0)
+
+    stats = SearchStats()
+    apply_equivalences("A <-> B", 2.5, 3, rewriting='single_site', engine='goal', allowed_operators=['&', '->'], count=1, stats=stats)
+    check("a search stopped early is finished without a callback", stats.done and stats.generated > 0)
+
+    reports = []
+    stats = SearchStats(lambda stats: reports.append(stats.to_dict()), interval=0.0)
+    subprocess_result = list(iter_equivalences_in_subprocess("A <-> B", 2.5, 3, rewriting='single_site', stats=stats))
+    check("the stats of a search in a subprocess are reported from the child",
+          reports and reports[-1]['done'] and reports[-1]['generated'] == len(subprocess_result) and reports[-1]['rejected'] == final['rejected'])
+
+    return passed, failed
@@ -1,5 +1,6 @@
 from Formula.structure import Formula, Variable, And, Or, Not, Implication, Biconditional, Truth, Falsity, Next, Finally, Globally, Until, Release
 from Equivalence_Applier.equivalences import *  # Import all equivalences
+from itertools import product
 
 
 def test_equivalences():
@@ -114,4 +115,40 @@ def test_equivalences():
     print(f"Passed: {passed}")
     print(f"Failed: {failed}")
 
-    return passed, failed
\ No newline at end of file
+    return passed, failed
+
+
+def test_equivalence_operations():
+    # Every equivalence must leave formulae whose root is not one of its registered
+    # operations unchanged, otherwise root-operation dispatch would lose rewrites
+    a = Variable('a')
+    b = Variable('b')
+    unary = (Not, Next, Finally, Globally)
+    binary = (And, Or, Implication, Biconditional, Until, Release)
+
+    formulae = [a, b, Truth(), Falsity()]
+    for _ in range(2):
+        formulae = formulae + [cls(f) for cls in unary for f in formulae[:8]] + \
+            [cls(l, r) for cls in binary for l, r in product(formulae[:8], repeat=2)]
+
+    passed = 0
+    failed = 0
+
+    for equivalence in EQUIVALENCES:
+        wrong = [f for f in formulae if f.operation not in equivalence.operations and equivalence(f) != f]
+        if wrong:
+            print(f"FAIL: {equivalence.__name__} rewrites {wrong[0]} outside {sorted(op.name for op in equivalence.operations)}")
+            failed += 1
+        else:
+            passed += 1
+
+    index = EQUIVALENCES_BY_OPERATION
+    if sum(len(rules) for rules in index.values()) >= len(EQUIVALENCES):
+        print(f"PASS: {len(EQUIVALENCES)} equivalences indexed over {len(index)} operations")
+        passed += 1
+    else:
+        print("FAIL: some equivalences are missing from the index")
+        failed += 1
+
+    print(f"Registered operations checked on {len(formulae)} formulae")
+    return passed, failed
@@ -1,5 +1,9 @@
+import io
+import logging
+from contextlib import redirect_stdout
 from Equivalence_Applier.applier import apply_equivalences
-from Equivalence_Applier.filter import filter_equivalences
+from Equivalence_Applier.filter import filter_equivalences, iter_filtered, is_allowed, operator_mask
+from Testing.performance_test import reference_is_allowed
 
 
 def test_filter(formula_str: str):
@@ -31,4 +35,59 @@ def get_allowed_operators() -> set[str]:
     input_str = input("Allowed operators: ")
     allowed_operators = set(op.strip() for op in input_str.split(','))
 
-    return allowed_operators
\ No newline at end of file
+    return allowed_operators
+
+
+def test_filter_masks():
+    passed = 0
+    failed = 0
+
+    # The bitmask filter keeps exactly the formulae the original recursive filter kept
+    equivalents = apply_equivalences("G(A & B)", 2.0, 2) + apply_equivalences("A <-> B", 2.5, 2) + apply_equivalences("A R 1", 2.5, 2)
+    for allowed_operators in [{'!', '&', 'G', 'F'}, {'->', '&'}, {'U', '!', '1'}, set()]:
+        expected = [eq for eq in equivalents if reference_is_allowed(eq, allowed_operators)]
+        batch = filter_equivalences(equivalents, allowed_operators)
+        stream = list(iter_filtered(iter(equivalents), operator_mask(allowed_operators)))
+        single = [eq for eq in equivalents if is_allowed(eq, allowed_operators)]
+        if batch == expected and stream == expected and single == expected:
+            print(f"PASS: {sorted(allowed_operators)} keeps {len(expected)} of {len(equivalents)}")
+            passed += 1
+        else:
+            print(f"FAIL: {sorted(allowed_operators)} keeps {len(batch)}, expected {len(expected)}")
+            failed += 1
+
+    return passed, failed
+
+
+def test_filter_logging():
+    passed = 0
+    failed = 0
+
+    equivalents = apply_equivalences("A <-> B", 2.0, 2)
+    logger = logging.getLogger('Equivalence_Applier.filter')
+    records = []
+    handler = logging.Handler(logging.DEBUG)
+    handler.emit = records.append
+    logger.addHandler(handler)
+    level = logger.level
+
+    try:
+        output = io.StringIO()
+        with redirect_stdout(output):
+            logger.setLevel(logging.WARNING)
+            filter_equivalences(equivalents, {'&', '->'})
+            quiet = len(records)
+            logger.setLevel(logging.DEBUG)
+            filter_equivalences(equivalents, {'&', '->'})
+    finally:
+        logger.removeHandler(handler)
+        logger.setLevel(level)
+
+    if output.getvalue() == "" and quiet == 0 and len(records) == 2:
+        print("PASS: filter_equivalences logs its progress at debug level instead of printing")
+        passed += 1
+    else:
+        print(f"FAIL: filter_equivalences printed {output.getvalue()!r} and logged {quiet} then {len(records)} messages")
+        failed += 1
+
+    return passed, failed
@@ -1,4 +1,4 @@
-from Formula.parser import parse_formula
+from Formula.parser import parse_formula, FormulaSyntaxError
 
 
 def test_parser(formula_str: str):
@@ -10,4 +10,58 @@ def test_parser(formula_str: str):
         print(repr(formula))
 
     except Exception as e:
-        print(f"An error occurred: {e}")
\ No newline at end of file
+        print(f"An error occurred: {e}")
+
+
+def test_parser_cases():
+    tests = [
+        ("A <-> B", "Biconditional(Variable('A'), Variable('B'))"),
+        ("A & B & C", "And(Variable('A'), And(Variable('B'), Variable('C')))"),
+        ("A & B | C", "And(Variable('A'), Or(Variable('B'), Variable('C')))"),
+        ("!A & B", "And(Not(Variable('A')), Variable('B'))"),
+        ("X A & B", "Next(And(Variable('A'), Variable('B')))"),
+        ("A & X B -> C", "Implication(And(Variable('A'), Next(Variable('B'))), Variable('C'))"),
+        ("A R B U C", "Until(Release(Variable('A'), Variable('B')), Variable('C'))"),
+        ("G (A -> F B)", "Globally(Implication(Variable('A'), Finally(Variable('B'))))"),
+        ("(A | B) & (C | D)", "And(Or(Variable('A'), Variable('B')), Or(Variable('C'), Variable('D')))"),
+        ("1 -> 0", "Implication(Truth(), Falsity())"),
+        ("FOO U GRANT", "Until(Variable('FOO'), Variable('GRANT'))"),
+        ("Xready & REQ", "And(Variable('Xready'), Variable('REQ'))"),
+    ]
+
+    errors = [
+        ("A &", 3),
+        ("(A & B", 0),
+        ("A & B)", 5),
+        ("A B", 2),
+        ("A # B", 2),
+    ]
+
+    passed = 0
+    failed = 0
+
+    for expression, expected in tests:
+        result = repr(parse_formula(expression))
+        if result == expected:
+            print(f"PASS: {expression}")
+            passed += 1
+        else:
+            print(f"FAIL: {expression}")
+            print(f"  Expected: {expected}")
+            print(f"  Got: {result}")
+            failed += 1
+
+    for expression, position in errors:
+        try:
+            parse_formula(expression)
+            print(f"FAIL: {expression} (no error raised)")
+            failed += 1
+        except FormulaSyntaxError as e:
+            if e.position == position:
+                print(f"PASS: {expression} -> {e}")
+                passed += 1
+            else:
+                print(f"FAIL: {expression} -> {e} (expected position {position})")
+                failed += 1
+
+    return passed, failed
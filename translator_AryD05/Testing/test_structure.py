@@ -1,4 +1,12 @@
-from Formula.structure import Variable, Not, And, Or, Implication, Truth, Falsity
+import copy
+import pickle
+import sys
+import threading
+from Formula import structure
+from Formula.structure import Operation, Variable, Not, And, Or, Implication, Biconditional, Truth, Falsity, Next, Finally, Globally, Until, Release
+from Formula.serialization import encode_formula, decode_formula, encode_formulae, decode_formulae
+from Formula.canonical import ac_canonical, alpha_normal, rename_variables
+from Formula.parser import parse_formula
 
 
 def test_structure():
@@ -12,4 +20,220 @@ def test_structure():
         print(formula)
         
     except Exception as e:
-        print(f"An error occurred: {e}")
\ No newline at end of file
+        print(f"An error occurred: {e}")
+
+
+def test_hash_consing():
+    p = Variable('P')
+    q = Variable('Q')
+    formula = And(p, Not(q))
+
+    tests = [
+        ("same structure, same instance", And(Variable('P'), Not(Variable('Q'))) is formula),
+        ("different structure, different instance", And(q, Not(p)) is not formula),
+        ("constants are shared", Truth() is Truth() and Falsity() is Falsity()),
+        ("hash is structural", hash(formula) == hash(And(Variable('P'), Not(Variable('Q'))))),
+        ("equal subtrees are shared", Or(formula, formula).left is Or(formula, formula).right),
+        ("pickle round trip is interned", pickle.loads(pickle.dumps(formula)) is formula),
+        ("deepcopy is interned", copy.deepcopy(formula) is formula),
+    ]
+
+    passed = 0
+    failed = 0
+
+    for name, ok in tests:
+        if ok:
+            print(f"PASS: {name}")
+            passed += 1
+        else:
+            print(f"FAIL: {name}")
+            failed += 1
+
+    try:
+        formula.left = q
+        print("FAIL: nodes are immutable")
+        failed += 1
+    except AttributeError:
+        print("PASS: nodes are immutable")
+        passed += 1
+
+    return passed, failed
+
+
+
+def test_concurrent_interning():
+    # Threads building and dropping the same formulae race to discard and rebuild their
+    # nodes; switching threads as often as possible makes the races likely
+    texts = [f"(race{i % 7} & step{i % 5}) | !(lap{i % 3} -> goal)" for i in range(50)]
+    mismatches = []
+    errors = []
+
+    def build():
+        for _ in range(60):
+            for text in texts:
+                if parse_formula(text) is not parse_formula(text):
+                    mismatches.append(text)
+
+    hook = sys.unraisablehook
+    interval = sys.getswitchinterval()
+    sys.unraisablehook = errors.append
+    sys.setswitchinterval(1e-6)
+    try:
+        threads = [threading.Thread(target=build) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+    finally:
+        sys.setswitchinterval(interval)
+        sys.unraisablehook = hook
+
+    stale = [key for key in list(structure._INTERNED) if key[0] is Variable and key[1] in ('goal', 'race0', 'step0', 'lap0')]
+    tests = [
+        ("concurrent builds agree on one instance", not mismatches),
+        ("discarding nodes raises no errors", not errors),
+        ("dropped nodes leave no entries behind", not stale),
+    ]
+
+    passed = 0
+    failed = 0
+
+    for name, ok in tests:
+        if ok:
+            print(f"PASS: {name}")
+            passed += 1
+        else:
+            print(f"FAIL: {name}")
+            failed += 1
+
+    return passed, failed
+
+
+def test_cached_measures():
+    p = Variable('P')
+    q = Variable('Q')
+    formula = Implication(And(p, Truth()), Or(Not(Falsity()), Next(q)))
+
+    deep = p
+    for _ in range(5000):
+        deep = And(q, deep)
+
+    tests = [
+        ("complexity", formula.complexity, 9),
+        ("depth", formula.depth, 4),
+        ("operator mask", formula.operator_mask, Operation.IMPLICATION.bit | Operation.AND.bit | Operation.OR.bit | Operation.NOT.bit | Operation.NEXT.bit | Operation.VARIABLE.bit | Operation.TRUE.bit | Operation.FALSE.bit),
+        ("string", str(formula), "(P & 1 -> !0 | X Q)"),
+        ("string is cached", str(formula) is str(formula), True),
+        ("nested string", str(And(And(p, q), Or(p, q))), "(P & Q & (P | Q))"),
+        ("deep formula depth", deep.depth, 5001),
+        ("deep formula string", len(str(deep)), 5000 * 4 + 3),
+    ]
+
+    passed = 0
+    failed = 0
+
+    for name, result, expected in tests:
+        if result == expected:
+            print(f"PASS: {name}")
+            passed += 1
+        else:
+            print(f"FAIL: {name}")
+            print(f"  Expected: {expected}")
+            print(f"  Got: {result}")
+            failed += 1
+
+    return passed, failed
+
+
+def test_serialization():
+    p = Variable('P')
+    q = Variable('Q')
+    formulae = [
+        p,
+        Implication(And(p, Truth()), Or(Not(Falsity()), Next(q))),
+        Release(Globally(Finally(p)), Until(Biconditional(p, q), q)),
+    ]
+
+    passed = 0
+    failed = 0
+
+    for formula in formulae:
+        encoded = encode_formula(formula)
+        if decode_formula(encoded) is formula:
+            print(f"PASS: {formula} round-trips as {encoded!r}")
+            passed += 1
+        else:
+            print(f"FAIL: {formula} does not round-trip as {encoded!r}")
+            failed += 1
+
+    if decode_formulae(encode_formulae(formulae)) == formulae and decode_formulae(encode_formulae([])) == []:
+        print("PASS: batches round-trip")
+        passed += 1
+    else:
+        print("FAIL: batches do not round-trip")
+        failed += 1
+
+    for text in ("& 'P", "'P 'Q", "? 'P"):
+        try:
+            decode_formula(text)
+            print(f"FAIL: invalid encoding {text!r} accepted")
+            failed += 1
+        except ValueError:
+            print(f"PASS: invalid encoding {text!r} rejected")
+            passed += 1
+
+    return passed, failed
+
+
+def test_ac_canonical():
+    a, b, c = Variable('A'), Variable('B'), Variable('C')
+    tests = [
+        ("reordered conjunction", ac_canonical(And(And(c, a), b)), And(a, And(b, c))),
+        ("rebracketed disjunction", ac_canonical(Or(b, Or(a, c))), ac_canonical(Or(Or(c, b), a))),
+        ("mixed chains stay separate", str(ac_canonical(And(Or(b, a), c))), "((A | B) & C)"),
+        ("nested operands", ac_canonical(Next(And(b, a))), Next(And(a, b))),
+        ("other operators keep their order", ac_canonical(Implication(b, a)), Implication(b, a)),
+        ("normal form is stable", ac_canonical(ac_canonical(And(And(c, a), b))), And(a, And(b, c))),
+    ]
+
+    passed = 0
+    failed = 0
+
+    for name, result, expected in tests:
+        if result == expected:
+            print(f"PASS: {name}")
+            passed += 1
+        else:
+            print(f"FAIL: {name}")
+            print(f"  Expected: {expected}")
+            print(f"  Got: {result}")
+            failed += 1
+
+    return passed, failed
+
+
+def test_alpha_normal():
+    tests = [
+        ("variables named in order of first occurrence", "req <-> grant", "(v0 <-> v1)", {'req': 'v0', 'grant': 'v1'}),
+        ("renamed formulae share a normal form", "B <-> A", "(v0 <-> v1)", {'B': 'v0', 'A': 'v1'}),
+        ("repeated variables keep one name", "G(x -> F y) & (y U x)", "G ((v0 -> F v1) & (v1 U v0))", {'x': 'v0', 'y': 'v1'}),
+        ("constants are kept", "1 | !A", "(1 | !v0)", {'A': 'v0'}),
+    ]
+
+    passed = 0
+    failed = 0
+
+    for name, formula_str, expected, expected_names in tests:
+        formula = parse_formula(formula_str)
+        normal, names = alpha_normal(formula)
+        restored = rename_variables(normal, {new: old for old, new in names.items()})
+        if str(normal) == expected and names == expected_names and restored is formula:
+            print(f"PASS: {name}")
+            passed += 1
+        else:
+            print(f"FAIL: {name}")
+            print(f"  Expected: {expected} {expected_names}")
+            print(f"  Got: {normal} {names}, renamed back to {restored}")
+            failed += 1
+
+    return passed, failed
@@ -0,0 +1,310 @@
+import json
+import os
+import threading
+import time
+
+
+def _wait_for(condition, timeout=5.0):
+    # Poll until condition() holds, as the jobs run on other threads
+    deadline = time.monotonic() + timeout
+    while not condition():
+        if time.monotonic() >= deadline:
+            return False
+        time.sleep(0.01)
+    return True
+
+
+def test_job_manager():
+    # The web interface modules use relative imports, so they are imported through the
+    # translator_AryD05 package, which is on the path once test.py has been loaded
+    from translator_AryD05.Web_Interface.jobs import JobManager, QueueFull
+
+    passed = 0
+    failed = 0
+
+    def check(name, condition):
+        nonlocal passed, failed
+        if condition:
+            print(f"PASS: {name}")
+            passed += 1
+        else:
+            print(f"FAIL: {name}")
+            failed += 1
+
+    def run(request, cancel, progress):
+        # Counts until cancelled or out of time, unless asked to fail
+        if request.get('fail'):
+            raise ValueError("bad request")
+        steps = 0
+        while not cancel.cancelled:
+            steps += 1
+            progress({'steps': steps})
+            time.sleep(0.005)
+        return {'steps': steps}
+
+    jobs = JobManager(run, workers=1, max_queued=1, max_kept=2)
+    try:
+        running = jobs.submit({}, timeout=None)
+        check("a submitted job starts on a free worker", _wait_for(lambda: jobs.get(running['id'])['state'] == 'running'))
+        check("a running job publishes its progress", _wait_for(lambda: (jobs.get(running['id'])['progress'] or {}).get('steps', 0) > 1))
+
+        queued = jobs.submit({}, timeout=None)
+        check("a job waits while every worker is busy", jobs.get(queued['id'])['state'] == 'queued')
+        try:
+            jobs.submit({}, timeout=None)
+            check("a job is refused once the queue is full", False)
+        except QueueFull:
+            check("a job is refused once the queue is full", jobs.stats()['jobs']['queued'] == 1)
+
+        check("a queued job can be cancelled", jobs.delete(queued['id'])['state'] == 'cancelled')
+        replacement = jobs.submit({}, timeout=0.05)
+        check("cancelling a queued job frees its place in the queue", replacement['state'] == 'queued')
+
+        jobs.delete(running['id'])
+        check("a running job can be cancelled and keeps its results",
+              _wait_for(lambda: jobs.get(running['id'])['result'] is not None) and jobs.get(running['id'])['state'] == 'cancelled')
+
+        check("a job ends when its timeout passes",
+              _wait_for(lambda: jobs.get(replacement['id'])['state'] == 'done') and jobs.get(replacement['id'])['result']['steps'] > 0)
+
+        failing = jobs.submit({'fail': True})
+        check("an exception fails the job with its message",
+              _wait_for(lambda: jobs.get(failing['id'])['state'] == 'failed') and jobs.get(failing['id'])['error'] == "bad request")
+
+        check("only the newest ended jobs are kept", jobs.get(queued['id']) is None and jobs.get(running['id']) is None and len(jobs) == 2)
+        check("deleting an ended job forgets it", jobs.delete(failing['id']) is not None and jobs.get(failing['id']) is None)
+        check("unknown jobs are not found", jobs.get('missing') is None and jobs.delete('missing') is None)
+    finally:
+        jobs.shutdown()
+
+    return passed, failed
+
+
+def _read_events(stream):
+    # Split Server-Sent Events into (event, data) pairs
+    events = []
+    for text in stream:
+        lines = dict(line.split(': ', 1) for line in text.strip().split('\n'))
+        events.append((lines['event'], json.loads(lines['data'])))
+    return events
+
+
+def test_event_stream():
+    from translator_AryD05.Web_Interface.streaming import stream_equivalences
+    from translator_AryD05.Web_Interface.result_cache import ResultCache
+    from translator_AryD05.Equivalence_Applier.cache import RenamingMemo
+
+    passed = 0
+    failed = 0
+
+    def check(name, condition):
+        nonlocal passed, failed
+        if condition:
+            print(f"PASS: {name}")
+            passed += 1
+        else:
+            print(f"FAIL: {name}")
+            failed += 1
+
+    events = _read_events(stream_equivalences("A <-> B", {'&', '->'}, 2.5, 3, False, 30))
+    names = [event for event, _ in events]
+    summary = events[-1][1]
+    filtered = [formula for event, data in events if event == 'formulae' for formula in data['filtered']]
+    check("the stream starts with the request and ends with a summary", names[0] == 'start' and names[-1] == 'done' and names.count('done') == 1)
+    check("the start event reports unreachable operators", events[0][1]['unreachable'] == ['!', '0', 'F', 'G', 'R', 'U', 'X', '|'])
+    check("filtered formulae are streamed", filtered == ["((A -> B) & (B -> A))", "((B -> A) & (A -> B))"])
+    check("the summary counts the formulae", summary['generated'] == 542 and summary['kept'] == 2 and summary['finished'] and not summary['truncated'])
+    check("the summary gives the final statistics of the search",
+          summary['search']['done'] and summary['search']['generated'] == 598 and summary['search']['rejected'] > 0)
+
+    events = _read_events(stream_equivalences("A <-> B", {'&', '->'}, 2.5, 3, True, 30))
+    unfiltered = [formula for event, data in events if event == 'formulae' for formula in data['unfiltered']]
+    check("unfiltered formulae are streamed in batches when asked for",
+          len(unfiltered) == events[-1][1]['generated'] and all(len(data['unfiltered']) <= 200 for event, data in events if event == 'formulae'))
+    counts = [data['generated'] for event, data in events if event in ('formulae', 'progress', 'done')]
+    check("the counts only grow", counts == sorted(counts))
+
+    events = _read_events(stream_equivalences("A <-> B", {'&', '->'}, 2.5, 3, False, 30, limit=1))
+    check("the summary flags a search stopped at the limit", events[-1][1]['truncated'] and events[-1][1]['kept'] == 1)
+
+    # Closing the stream, as when the client goes away, cancels the search
+    threads = threading.active_count()
+    stream = stream_equivalences("(A -> B) & (C | !D)", {'!', '&', '|'}, 2.0, 4, True, 60)
+    next(stream)
+    next(stream)
+    stream.close()
+    check("closing the stream stops the search", _wait_for(lambda: threading.active_count() == threads))
+
+    # Identical streams share one search through the result cache; every search consults the
+    # memo once, so its hits and misses count the searches run
+    results = ResultCache()
+    memo = RenamingMemo()
+    request = ("A & B & C", {'&', '|'}, 1.5, 2, True, 30)
+    first = stream_equivalences(*request, memo=memo, results=results)
+    next(first)
+    next(first)
+    streams = {}
+    second = threading.Thread(target=lambda: streams.update(second=_read_events(stream_equivalences(*request, memo=memo, results=results))))
+    second.start()
+    streams['first'] = _read_events(first)
+    second.join(30)
+    third = _read_events(stream_equivalences(*request, memo=memo, results=results))
+    memo_stats = memo.stats()
+    check("identical streams run the search only once", memo_stats['hits'] + memo_stats['misses'] == 1 and results.stats()['misses'] == 1)
+    check("a stream made while the search runs waits for it", results.stats()['coalesced'] == 1)
+    check("a stream made afterwards replays the cached result", results.stats()['hits'] == 1)
+    unfiltered = [[formula for event, data in events if event == 'formulae' for formula in data['unfiltered']]
+                  for events in (streams['second'], third)]
+    summaries = [events[-1][1] for events in (streams['first'], streams['second'], third)]
+    check("a replayed stream sends the same formulae and counts", unfiltered[0] == unfiltered[1] and len(unfiltered[0]) == summaries[0]['generated']
+          and all((summary['generated'], summary['kept'], summary['finished']) == (summaries[0]['generated'], summaries[0]['kept'], True) for summary in summaries))
+
+    return passed, failed
+
+
+def test_result_cache():
+    from translator_AryD05.Web_Interface.result_cache import ResultCache
+
+    passed = 0
+    failed = 0
+
+    def check(name, condition):
+        nonlocal passed, failed
+        if condition:
+            print(f"PASS: {name}")
+            passed += 1
+        else:
+            print(f"FAIL: {name}")
+            failed += 1
+
+    now = [0.0]
+    results = ResultCache(max_entries=2, ttl=10.0, clock=lambda: now[0])
+    calls = []
+
+    def compute(value):
+        def run():
+            calls.append(value)
+            return value
+        return run
+
+    check("a result is computed on a miss", results.get_or_compute('a', compute(1)) == 1 and calls == [1])
+    check("a cached result is returned without computing", results.get_or_compute('a', compute(2)) == 1 and calls == [1])
+
+    now[0] = 10.0
+    check("a result is computed again once it has expired", results.get_or_compute('a', compute(3)) == 3 and results.expirations == 1)
+
+    results.get_or_compute('b', compute(4))
+    results.get_or_compute('a', compute(5))
+    results.get_or_compute('c', compute(6))
+    check("the least recently used result is evicted", len(results) == 2 and results.get_or_compute('b', compute(7)) == 7 and results.evictions == 2)
+
+    results.get_or_compute('d', compute(8), cacheable=lambda value: False)
+    check("a result that is not cacheable is not kept", results.get_or_compute('d', compute(9)) == 9)
+
+    def fail():
+        raise ValueError("search failed")
+    try:
+        results.get_or_compute('e', fail)
+        check("an exception is raised to the caller and not kept", False)
+    except ValueError:
+        check("an exception is raised to the caller and not kept", results.get_or_compute('e', compute(10)) == 10)
+
+    # Identical requests made while the first is running wait for it instead of computing
+    results = ResultCache()
+    started = threading.Event()
+    release = threading.Event()
+    slow_calls = []
+
+    def slow():
+        slow_calls.append(None)
+        started.set()
+        release.wait(5.0)
+        return 'result'
+
+    answers = []
+    leader = threading.Thread(target=lambda: answers.append(results.get_or_compute('key', slow)))
+    leader.start()
+    started.wait(5.0)
+    followers = [threading.Thread(target=lambda: answers.append(results.get_or_compute('key', slow))) for _ in range(4)]
+    for follower in followers:
+        follower.start()
+    check("requests for a result being computed are coalesced", _wait_for(lambda: results.stats()['coalesced'] == 4))
+    check("the requests waiting for a computation are counted", results.waiting('key') == 4 and results.waiting('other') == 0)
+    release.set()
+    for thread in [leader] + followers:
+        thread.join(5.0)
+    stats = results.stats()
+    check("coalesced requests share one computation", len(slow_calls) == 1 and answers == ['result'] * 5)
+    check("nothing waits once the computation has ended", results.waiting('key') == 0)
+    check("statistics count the requests", stats['misses'] == 1 and stats['hits'] == 0 and stats['hit_rate'] == 0.8 and stats['in_flight'] == 0)
+
+    return passed, failed
+
+
+def test_worker_count():
+    # The server only needs werkzeug once it serves, so choosing the workers runs without it
+    from translator_AryD05.Web_Interface.server import worker_count
+
+    passed = 0
+    failed = 0
+
+    def check(name, condition):
+        nonlocal passed, failed
+        if condition:
+            print(f"PASS: {name}")
+            passed += 1
+        else:
+            print(f"FAIL: {name}")
+            failed += 1
+
+    def refused(workers, stateful):
+        try:
+            worker_count(workers, stateful)
+        except ValueError:
+            return True
+        return False
+
+    check("several workers are refused while the job API keeps jobs in each", refused(2, True) and refused((os.cpu_count() or 1) + 1, True))
+    check("the job API is served by a single worker by default", worker_count(None, True) == 1 and worker_count(1, True) == 1)
+    check("without the job API several workers are allowed", worker_count(4, False) == 4)
+    check("without the job API there is a worker for every CPU by default", worker_count(None, False) == (os.cpu_count() or 1))
+    check("fewer than one worker is refused", refused(0, False))
+
+    return passed, failed
+
+
+def test_job_api():
+    try:
+        from translator_AryD05.Web_Interface.web_interface import create_app
+    except ImportError as e:
+        # The routes need Flask, which the rest of the tests do not
+        print(f"SKIP: the job API routes cannot be tested without {e.name}")
+        return 0, 0
+
+    passed = 0
+    failed = 0
+
+    def check(name, condition):
+        nonlocal passed, failed
+        if condition:
+            print(f"PASS: {name}")
+            passed += 1
+        else:
+            print(f"FAIL: {name}")
+            failed += 1
+
+    app = create_app(job_workers=1)
+    client = app.test_client()
+    try:
+        response = client.post('/jobs', json={'formula': "a ->"})
+        check("a formula that does not parse is refused", response.status_code == 400
+              and "Unexpected end of formula" in response.get_json()['error'])
+        response = client.post('/jobs', json={'formula': "a & b", 'show_unfiltered': "false"})
+        check("a field of the wrong type is refused", response.status_code == 400 and "show_unfiltered" in response.get_json()['error'])
+        check("refused requests queue no job", sum(client.get('/jobs').get_json()['jobs'].values()) == 0)
+        response = client.post('/jobs', json={'formula': "a & b", 'show_unfiltered': False})
+        check("a valid request is queued", response.status_code == 202 and client.get(response.headers['Location']).status_code == 200)
+    finally:
+        app.jobs.shutdown()
+
+    return passed, failed
@@ -0,0 +1,244 @@
+'''
+This module runs the transformations submitted to the job API of the web interface in
+the background, so that a long search does not hold a request open until it finishes.
+
+Jobs wait in a bounded queue for one of a fixed number of worker threads. Once the queue
+is full further jobs are refused, rather than queueing work that would not start for a
+long time, and the client is expected to try again later. Jobs that have ended are kept,
+up to a limit, so their results can be fetched after they finish.
+'''
+
+
+
+import os
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Optional
+from ..Equivalence_Applier.applier import CancelToken
+
+
+# States of a job. A job starts queued and ends done, failed or cancelled.
+QUEUED = 'queued'
+RUNNING = 'running'
+DONE = 'done'
+FAILED = 'failed'
+CANCELLED = 'cancelled'
+
+# Largest number of jobs waiting for a worker before further jobs are refused
+DEFAULT_MAX_QUEUED = 32
+
+# Largest number of ended jobs kept for their results to be fetched
+DEFAULT_MAX_KEPT = 256
+
+
+class QueueFull(Exception):
+    '''
+    Raised when a job is submitted while the queue is full.
+    '''
+
+
+class Job:
+    '''
+    A transformation submitted to a JobManager. Its fields are only changed by the manager,
+    while holding its lock.
+    '''
+
+    def __init__(self, request: dict, timeout: Optional[float]):
+        '''
+        @param request: The arguments of the job, passed to the manager's run function
+        @param timeout: Seconds the job may run for once started, or None for no limit
+        '''
+
+        self.id = uuid.uuid4().hex
+        self.request = request
+        self.timeout = timeout
+        self.state = QUEUED
+        self.result = None
+        self.error = None
+        self.submitted = time.time()
+        self.started = None
+        self.ended = None
+        self.cancel = None
+        self.progress = None
+
+    def to_dict(self) -> dict:
+        '''
+        @return: The job as a dictionary, ready to be returned as JSON
+        '''
+
+        return {
+            'id': self.id,
+            'state': self.state,
+            'request': self.request,
+            'submitted': self.submitted,
+            'started': self.started,
+            'ended': self.ended,
+            'progress': self.progress,
+            'result': self.result,
+            'error': self.error,
+        }
+
+    def __repr__(self):
+        return f"Job(id={self.id!r}, state={self.state!r})"
+
+
+class JobManager:
+    '''
+    Runs jobs on a pool of worker threads, with a bounded queue in front of it. The run
+    function is called as run(request, cancel, progress) with a CancelToken whose deadline
+    is the job's timeout, and should stop early once the token is cancelled, returning what
+    it has found so far. Its return value becomes the job's result; an exception fails the
+    job. It may call progress with a dictionary, from any thread, to publish it as the
+    progress of the job while it runs.
+
+    Every method is safe to call from any thread, and returns snapshots of jobs as
+    dictionaries, so callers never see a job changing under them.
+    '''
+
+    def __init__(self, run: Callable[[dict, CancelToken, Callable[[dict], None]], dict], workers: Optional[int] = None,
+                 max_queued: int = DEFAULT_MAX_QUEUED, max_kept: int = DEFAULT_MAX_KEPT):
+        '''
+        @param run: The function that carries out a job
+        @param workers: The number of jobs run at once, by default the number of CPUs
+        @param max_queued: The largest number of jobs waiting for a worker
+        @param max_kept: The largest number of ended jobs kept
+        '''
+
+        self._run = run
+        self.workers = workers or os.cpu_count() or 1
+        self.max_queued = max_queued
+        self.max_kept = max_kept
+        self._jobs = OrderedDict()
+        self._queued = 0
+        self._lock = threading.Lock()
+        self._pool = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='translator-job')
+
+    def submit(self, request: dict, timeout: Optional[float] = None) -> dict:
+        '''
+        Queue a job.
+
+        @param request: The arguments of the job, passed to the run function
+        @param timeout: Seconds the job may run for once started, or None for no limit
+        @return: A snapshot of the queued job
+        @raise QueueFull: If max_queued jobs are already waiting
+        '''
+
+        with self._lock:
+            if self._queued >= self.max_queued:
+                raise QueueFull(f"{self._queued} jobs are already waiting, try again later")
+            job = Job(request, timeout)
+            self._jobs[job.id] = job
+            self._queued += 1
+            self._forget()
+            snapshot = job.to_dict()
+        self._pool.submit(self._execute, job)
+        return snapshot
+
+    def get(self, job_id: str) -> Optional[dict]:
+        '''
+        @param job_id: The id of a job
+        @return: A snapshot of the job, or None if there is no such job
+        '''
+
+        with self._lock:
+            job = self._jobs.get(job_id)
+            return None if job is None else job.to_dict()
+
+    def delete(self, job_id: str) -> Optional[dict]:
+        '''
+        Cancel a job that is queued or running, or forget a job that has ended. A cancelled
+        job that was running keeps whatever results it found before it stopped.
+
+        @param job_id: The id of a job
+        @return: A snapshot of the job, or None if there is no such job
+        '''
+
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is None:
+                return None
+            if job.state == QUEUED:
+                self._queued -= 1
+                job.state = CANCELLED
+                job.ended = time.time()
+            elif job.state == RUNNING:
+                job.state = CANCELLED
+                job.cancel.cancel()
+            else:
+                del self._jobs[job_id]
+            return job.to_dict()
+
+    def stats(self) -> dict:
+        '''
+        @return: A dictionary with the number of workers, the queue limit and the number of
+                 jobs in each state
+        '''
+
+        with self._lock:
+            states = {state: 0 for state in (QUEUED, RUNNING, DONE, FAILED, CANCELLED)}
+            for job in self._jobs.values():
+                states[job.state] += 1
+            return {'workers': self.workers, 'max_queued': self.max_queued, 'jobs': states}
+
+    def shutdown(self, wait: bool = True):
+        '''
+        Cancel every job that has not ended and stop the workers.
+
+        @param wait: Whether to wait for the running jobs to stop
+        '''
+
+        with self._lock:
+            for job in self._jobs.values():
+                if job.state in (QUEUED, RUNNING):
+                    if job.state == QUEUED:
+                        self._queued -= 1
+                        job.ended = time.time()
+                    else:
+                        job.cancel.cancel()
+                    job.state = CANCELLED
+        self._pool.shutdown(wait=wait)
+
+    def _forget(self):
+        # Drop the oldest ended jobs beyond max_kept. Called with the lock held.
+        ended = [job_id for job_id, job in self._jobs.items() if job.ended is not None]
+        for job_id in ended[:max(0, len(ended) - self.max_kept)]:
+            del self._jobs[job_id]
+
+    def _execute(self, job: Job):
+        # Runs on a worker thread. A job cancelled while it was queued is skipped.
+        with self._lock:
+            if job.state != QUEUED:
+                return
+            self._queued -= 1
+            job.state = RUNNING
+            job.started = time.time()
+            job.cancel = CancelToken(job.timeout)
+
+        def progress(snapshot):
+            with self._lock:
+                job.progress = snapshot
+
+        result = None
+        error = None
+        try:
+            result = self._run(job.request, job.cancel, progress)
+        except Exception as e:
+            error = str(e)
+
+        with self._lock:
+            job.result = result
+            job.error = error
+            job.ended = time.time()
+            if job.state == RUNNING:
+                job.state = DONE if error is None else FAILED
+            self._forget()
+
+    def __len__(self):
+        with self._lock:
+            return len(self._jobs)
+
+    def __repr__(self):
+        return f"JobManager(workers={self.workers}, max_queued={self.max_queued}, jobs={len(self)})"
@@ -0,0 +1,192 @@
+'''
+This module caches the results of the requests made to the web interface, so that
+identical requests, common when a team works on the same specification, are answered
+without searching again.
+
+Results are kept in memory for a limited time and evicted least recently used first.
+Identical requests that arrive while the first is still being computed are coalesced:
+they wait for that computation and share its result rather than each starting their own.
+The form and the stream of the web interface key their results alike, so either can
+answer the other.
+'''
+
+
+
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Hashable, Optional, Set
+
+
+# Largest number of results kept
+DEFAULT_MAX_ENTRIES = 128
+
+# Seconds a result is kept for after it is computed
+DEFAULT_TTL = 600.0
+
+
+def request_key(formula: str, operators: Set[str], complexity: float, depth: int, timeout: float, limit: Optional[int]) -> tuple:
+    '''
+    @param formula: The formula string to transform
+    @param operators: The set of allowed operator symbols
+    @param complexity: The complexity threshold
+    @param depth: The maximum depth to apply equivalences
+    @param timeout: The number of seconds to allow the search
+    @param limit: The limit on filtered equivalences, or None
+    @return: The key of the result of a request of the web interface
+    '''
+
+    return (formula, tuple(sorted(operators)), complexity, depth, timeout, limit)
+
+
+def is_complete(result: tuple) -> bool:
+    '''
+    @param result: A tuple returned by collect_equivalences
+    @return: Whether the search ran to completion without error, so its result may be kept
+    '''
+
+    return result[2] and result[3] is None
+
+
+class _Flight:
+    # A computation in progress, which other requests for the same key wait on
+    def __init__(self):
+        self.done = threading.Event()
+        self.value = None
+        self.error = None
+        self.waiting = 0
+
+
+class ResultCache:
+    '''
+    Thread-safe LRU cache whose entries expire after a time to live, and which coalesces
+    concurrent computations of the same key.
+    '''
+
+    def __init__(self, max_entries: int = DEFAULT_MAX_ENTRIES, ttl: Optional[float] = DEFAULT_TTL,
+                 clock: Callable[[], float] = time.monotonic):
+        '''
+        @param max_entries: The largest number of results kept
+        @param ttl: Seconds a result is kept for, or None to keep results until evicted
+        @param clock: The function giving the current time in seconds
+        '''
+
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._clock = clock
+        self._entries = OrderedDict()
+        self._flights = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def get_or_compute(self, key: Hashable, compute: Callable[[], Any], cacheable: Callable[[Any], bool] = lambda value: True) -> Any:
+        '''
+        Return the result for a key, computing it if it is not cached. If the same key is
+        already being computed by another thread, wait for that computation instead.
+
+        @param key: The key of the result
+        @param compute: The function computing the result
+        @param cacheable: Function telling whether a computed result may be kept; a result
+                          that is not kept is still shared with the requests that waited for it
+        @return: The result
+        @raise Exception: Whatever compute raised, in the computing thread and in every thread
+                          that waited for it. Nothing is kept for the key.
+        '''
+
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                value, expires = entry
+                if expires is None or self._clock() < expires:
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return value
+                del self._entries[key]
+                self.expirations += 1
+
+            flight = self._flights.get(key)
+            leader = flight is None
+            if leader:
+                flight = self._flights[key] = _Flight()
+                self.misses += 1
+            else:
+                flight.waiting += 1
+                self.coalesced += 1
+
+        if not leader:
+            flight.done.wait()
+            if flight.error is not None:
+                raise flight.error
+            return flight.value
+
+        computed = False
+        try:
+            flight.value = compute()
+            computed = True
+        except Exception as e:
+            flight.error = e
+            raise
+        finally:
+            if not computed and flight.error is None:
+                flight.error = RuntimeError("The computation of the result was interrupted")
+            with self._lock:
+                del self._flights[key]
+                if computed and cacheable(flight.value):
+                    expires = None if self.ttl is None else self._clock() + self.ttl
+                    self._entries[key] = (flight.value, expires)
+                    self._entries.move_to_end(key)
+                    while len(self._entries) > self.max_entries:
+                        self._entries.popitem(last=False)
+                        self.evictions += 1
+            flight.done.set()
+        return flight.value
+
+    def waiting(self, key: Hashable) -> int:
+        '''
+        @param key: The key of the result
+        @return: The number of requests that joined the computation of the key in progress,
+                 or 0 if the key is not being computed
+        '''
+
+        with self._lock:
+            flight = self._flights.get(key)
+            return 0 if flight is None else flight.waiting
+
+    def stats(self) -> dict:
+        '''
+        @return: A dictionary with the hits, misses, coalesced requests, evictions, expirations,
+                 hit rate (the share of requests answered without computing), number of entries
+                 and number of computations in progress
+        '''
+
+        with self._lock:
+            requests = self.hits + self.misses + self.coalesced
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'coalesced': self.coalesced,
+                'evictions': self.evictions,
+                'expirations': self.expirations,
+                'hit_rate': (self.hits + self.coalesced) / requests if requests else 0.0,
+                'entries': len(self._entries),
+                'in_flight': len(self._flights),
+            }
+
+    def clear(self):
+        '''
+        Remove every result. Computations in progress are not affected.
+        '''
+
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self):
+        with self._lock:
+            return len(self._entries)
+
+    def __repr__(self):
+        return f"ResultCache(entries={len(self)}, max_entries={self.max_entries}, ttl={self.ttl})"
@@ -0,0 +1,163 @@
+'''
+This module serves the web interface with a pool of preforked worker processes, for use
+in production instead of Flask's development server.
+
+The parent process binds the listening socket and forks the workers, which all accept
+connections from it. Each worker builds its own application after the fork, warms it up,
+and then serves requests on threads of its own, so searches in different workers run on
+different CPUs. The parent only watches the workers, starting a new one in place of any
+that exits, and stops them all when it is interrupted or terminated.
+
+Every worker has its own caches and job queue, so a job submitted to the job API can only
+be found by the worker that accepted it. worker_count therefore only allows one worker for
+an application keeping such state, and the job API has to be turned off to use more.
+
+Forking is not available on Windows, where a single process serves the application.
+'''
+
+
+
+import logging
+import multiprocessing
+import os
+import signal
+import socket
+import sys
+import time
+from typing import Callable, Optional
+
+
+logger = logging.getLogger(__name__)
+
+# Connections waiting to be accepted before further ones are refused
+BACKLOG = 128
+
+# Signals that stop the server
+STOP_SIGNALS = {signal.SIGINT, signal.SIGTERM}
+
+# Shortest time, in seconds, a worker must run for before it is restarted straight away,
+# so that a worker failing at start does not make the parent fork in a tight loop
+RESTART_DELAY = 1.0
+
+
+def worker_count(workers: Optional[int], stateful: bool) -> int:
+    '''
+    Choose the number of worker processes to serve an application with.
+
+    @param workers: The number of workers asked for, or None for the default
+    @param stateful: Whether requests must reach the worker that served an earlier one, as
+                     the requests of the job API do
+    @return: The number of workers: as asked for, or by default the number of CPUs, or 1 for
+             a stateful application
+    @raise ValueError: If more than one worker is asked for a stateful application, or fewer
+                       than one
+    '''
+
+    if workers is None:
+        return 1 if stateful else os.cpu_count() or 1
+    if workers < 1:
+        raise ValueError("The number of workers must be at least 1.")
+    if workers > 1 and stateful:
+        raise ValueError(f"{workers} workers cannot share the jobs of the job API, which are kept by the worker that accepted them.")
+    return workers
+
+
+def _serve_worker(listener: socket.socket, create_app: Callable, forked: bool = True):
+    # Runs in a worker process, or in the only process if forked is False, and never returns
+    from werkzeug.serving import make_server
+
+    status = 0
+    app = None
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+    if forked:
+        # Interrupting the parent from a terminal interrupts the workers too, so they leave
+        # it to the parent to stop them
+        signal.signal(signal.SIGINT, signal.SIG_IGN)
+        signal.pthread_sigmask(signal.SIG_UNBLOCK, STOP_SIGNALS)
+    try:
+        app = create_app()
+        host, port = listener.getsockname()[:2]
+        server = make_server(host, port, app, threaded=True, fd=listener.fileno())
+        logger.info("Worker %d serving http://%s:%d/", os.getpid(), host, port)
+        server.serve_forever()
+    except (SystemExit, KeyboardInterrupt):
+        pass
+    except Exception:
+        logger.exception("Worker %d failed", os.getpid())
+        status = 1
+    finally:
+        # Stop the jobs and kill the searches running in child processes, which would
+        # otherwise outlive the worker
+        if getattr(app, 'jobs', None) is not None:
+            app.jobs.shutdown(wait=False)
+        for child in multiprocessing.active_children():
+            child.terminate()
+        logging.shutdown()
+        os._exit(status)
+
+
+def serve(create_app: Callable, host: str = '127.0.0.1', port: int = 8080, workers: int = 1):
+    '''
+    Serve an application with preforked worker processes until interrupted or terminated.
+
+    @param create_app: Function building the WSGI application, called once in every worker
+    @param host: The address to listen on
+    @param port: The port to listen on
+    @param workers: The number of worker processes, which must be 1 if the application keeps
+                    state that later requests must find again, as chosen by worker_count
+    '''
+
+    listener = socket.socket(socket.AF_INET6 if ':' in host else socket.AF_INET, socket.SOCK_STREAM)
+    listener.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    listener.bind((host, port))
+    listener.listen(BACKLOG)
+    listener.set_inheritable(True)
+
+    if not hasattr(os, 'fork'):
+        logger.warning("Forking is not supported on this platform, serving from a single process")
+        _serve_worker(listener, create_app, forked=False)
+
+    children = {}
+
+    def spawn():
+        # The signals that stop the parent are held back until the worker has set up its own
+        # handlers, so that it cannot be stopped as if it were the parent
+        signal.pthread_sigmask(signal.SIG_BLOCK, STOP_SIGNALS)
+        pid = os.fork()
+        if pid == 0:
+            _serve_worker(listener, create_app)
+        signal.pthread_sigmask(signal.SIG_UNBLOCK, STOP_SIGNALS)
+        children[pid] = time.monotonic()
+
+    def stop(signum, frame):
+        raise SystemExit(0)
+
+    signal.signal(signal.SIGINT, stop)
+    signal.signal(signal.SIGTERM, stop)
+
+    print(f"Serving http://{host}:{port}/ with {workers} worker processes", file=sys.stderr)
+    try:
+        for _ in range(workers):
+            spawn()
+        while True:
+            pid, status = os.waitpid(-1, 0)
+            started = children.pop(pid, None)
+            if started is None:
+                continue
+            code = os.WEXITSTATUS(status) if os.WIFEXITED(status) else -os.WTERMSIG(status)
+            logger.warning("Worker %d exited with status %d, starting another", pid, code)
+            if time.monotonic() - started < RESTART_DELAY:
+                time.sleep(RESTART_DELAY)
+            spawn()
+    finally:
+        for pid in children:
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+        for pid in children:
+            try:
+                os.waitpid(pid, 0)
+            except ChildProcessError:
+                pass
+        listener.close()
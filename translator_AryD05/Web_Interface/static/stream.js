@@ -0,0 +1,136 @@
+// Streams the results of the form from the /stream endpoint as they are found, adding
+// rows to the page as each batch arrives, instead of posting the form and waiting for
+// the whole page. Browsers without EventSource post the form as before.
+(function () {
+    var form = document.querySelector('form');
+    if (!form || !window.EventSource) {
+        return;
+    }
+    var results = document.getElementById('results');
+    var progress = document.getElementById('progress');
+    var button = form.querySelector('button');
+    var source = null;
+
+    // Show an error or warning above the form fields, as the rendered page does
+    function message(kind, text) {
+        var div = document.createElement('div');
+        div.className = kind;
+        div.textContent = text;
+        form.insertBefore(div, form.querySelector('label'));
+    }
+
+    // Find the list of filtered or unfiltered results, adding it the first time
+    function section(id, title) {
+        var div = document.getElementById(id);
+        if (!div) {
+            div = document.createElement('div');
+            div.id = id;
+            var heading = document.createElement('h2');
+            heading.textContent = title;
+            div.appendChild(heading);
+            results.appendChild(div);
+        }
+        return div;
+    }
+
+    function addRows(div, texts) {
+        var fragment = document.createDocumentFragment();
+        texts.forEach(function (text) {
+            var row = document.createElement('p');
+            row.textContent = text;
+            fragment.appendChild(row);
+        });
+        div.appendChild(fragment);
+    }
+
+    function showCounts(data) {
+        var text = 'Generated ' + data.generated + ' equivalences, ' + data.kept + ' using only the allowed operators';
+        var search = data.search;
+        if (search && !search.done) {
+            text += ' (' + Math.round(search.rate) + '/s; ' + search.frontier + ' waiting, ' + search.seen + ' seen, ' +
+                search.rejected + ' over the complexity limit, level ' + search.level + ', about ' +
+                (search.memory / 1048576).toFixed(1) + ' MB)';
+        }
+        progress.textContent = text;
+    }
+
+    function finish() {
+        source.close();
+        source = null;
+        button.disabled = false;
+    }
+
+    form.addEventListener('submit', function (event) {
+        event.preventDefault();
+        if (source) {
+            source.close();
+        }
+        form.querySelectorAll('.error, .warning').forEach(function (div) {
+            div.remove();
+        });
+        results.innerHTML = '';
+        progress.hidden = false;
+        progress.textContent = 'Generating equivalences...';
+        button.disabled = true;
+
+        var params = new URLSearchParams(new FormData(form));
+        var timeout = params.get('timeout');
+        // The filtered results are listed before the unfiltered ones, as on the rendered page
+        section('filtered', 'Filtered Results');
+        if (params.get('show_unfiltered') === 'y') {
+            section('unfiltered', 'Unfiltered Results');
+        }
+
+        source = new EventSource(form.dataset.stream + '?' + params.toString());
+
+        source.addEventListener('start', function (event) {
+            var data = JSON.parse(event.data);
+            if (data.unreachable.length) {
+                message('warning', 'Warning: The following operators might not always be reachable: ' + data.unreachable.join(', ') + '.');
+            }
+        });
+
+        source.addEventListener('formulae', function (event) {
+            var data = JSON.parse(event.data);
+            addRows(section('filtered', 'Filtered Results'), data.filtered);
+            if (data.unfiltered.length) {
+                addRows(section('unfiltered', 'Unfiltered Results'), data.unfiltered);
+            }
+            showCounts(data);
+        });
+
+        source.addEventListener('progress', function (event) {
+            showCounts(JSON.parse(event.data));
+        });
+
+        source.addEventListener('done', function (event) {
+            var data = JSON.parse(event.data);
+            finish();
+            showCounts(data);
+            if (data.error) {
+                message('error', 'An error occurred: ' + data.error);
+            } else if (!data.finished) {
+                var timeoutMessage = 'Timeout: Equivalence generation took longer than ' + timeout + ' seconds.';
+                if (data.generated) {
+                    timeoutMessage += ' Showing the ' + data.generated + ' equivalences generated so far.';
+                }
+                message('error', timeoutMessage);
+            } else if (data.kept === 0) {
+                message('error', 'No equivalent statements generated after filtering.');
+            }
+            if (data.kept === 0) {
+                document.getElementById('filtered').remove();
+            }
+        });
+
+        // Sent by the server for an invalid request, or raised by the browser when the
+        // connection is lost, in which case there is no data
+        source.addEventListener('error', function (event) {
+            if (!source) {
+                return;
+            }
+            finish();
+            message('error', event.data ? JSON.parse(event.data).error : 'Error: The connection to the server was lost.');
+        });
+    });
+})();
@@ -0,0 +1,187 @@
+'''
+This module streams the results of a transformation to the browser as Server-Sent Events
+while the search is still running, instead of rendering them all once it has finished.
+
+The search runs on a thread of its own and hands each formula to the response through a
+bounded queue. The response sends what is waiting in batches, each with the number of
+formulae generated and kept so far, so a fast search is not sent one event per formula
+and a slow client holds the search up rather than letting the queue grow. When the client
+goes away the search is cancelled, unless other requests are waiting for its result.
+
+Given a ResultCache, a stream whose result is cached, or is being computed for another
+request, does not search again: it waits for that result and replays it as the same events.
+
+The events are:
+- start: {"formula", "unreachable"} once the request has been read
+- formulae: {"filtered", "unfiltered", "generated", "kept", "search"} with the formulae
+  found since the previous event; unfiltered is empty unless unfiltered results were asked for
+- progress: {"generated", "kept", "search"} when the search has moved on but no formulae are
+  to be sent
+- done: {"generated", "kept", "search", "finished", "truncated", "error"} when the search has ended
+
+search holds the latest SearchStats of the search as a dictionary, with the size of its
+frontier, the formulae seen and rejected for their complexity, the level being expanded,
+the rate and the memory estimate, or is null until the search first reports.
+- error: {"error"} if the request is invalid, in place of every other event
+'''
+
+
+
+import json
+import queue
+import threading
+from typing import Iterator, Optional
+from ..command_line import check_dependencies, collect_equivalences
+from ..Equivalence_Applier.applier import CancelToken, SearchStats
+from ..Equivalence_Applier.cache import ClosureCache, RenamingMemo
+from .result_cache import ResultCache, request_key, is_complete
+
+
+# Largest number of formulae sent in one event
+BATCH_SIZE = 200
+
+# Formulae waiting to be sent before the search is held up for the client to catch up
+QUEUE_SIZE = 2000
+
+# Longest time, in seconds, the response waits for formulae before sending the counts so far
+PROGRESS_INTERVAL = 0.25
+
+
+def format_event(event: str, data) -> str:
+    '''
+    Format a Server-Sent Event.
+
+    @param event: The name of the event
+    @param data: The payload of the event, sent as JSON
+    @return: The event as it is written to the response
+    '''
+
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+def stream_equivalences(formula: str, operators: set, complexity: float, depth: int, show_unfiltered: bool, timeout: float,
+                        limit: Optional[int] = None, subprocess: bool = False, cache: Optional[ClosureCache] = None,
+                        memo: Optional[RenamingMemo] = None, results: Optional[ResultCache] = None, **options) -> Iterator[str]:
+    '''
+    Generate and filter equivalences like collect_equivalences, producing Server-Sent Events
+    as the formulae are found. Closing the iterator cancels the search.
+
+    @param formula: The formula string to transform
+    @param operators: The set of allowed operator symbols
+    @param complexity: The complexity threshold
+    @param depth: The maximum depth to apply equivalences
+    @param show_unfiltered: Whether to send the formulae that use operators which are not allowed
+    @param timeout: The number of seconds to allow the search
+    @param limit: Stop once this many filtered equivalences have been found, or None for no limit
+    @param subprocess: Run the search in a child process that is killed when it is cancelled
+    @param cache: Optional ClosureCache, as for collect_equivalences
+    @param memo: Optional RenamingMemo, as for collect_equivalences
+    @param results: Optional ResultCache the result is looked up in, shared with identical
+                    requests in progress, and kept in once the search has run to completion.
+                    The key does not cover options, so it is only given without them.
+    @param options: Further keyword arguments for iter_equivalences
+    @return: An iterator over the events, formatted by format_event
+    '''
+
+    pending = queue.Queue(QUEUE_SIZE)
+    closed = threading.Event()
+    cancel = CancelToken(timeout)
+    counts = {'generated': 0, 'kept': 0}
+    latest = {'search': None}
+    key = request_key(formula, operators, complexity, depth, timeout, limit)
+
+    def snapshot():
+        return dict(counts, search=latest['search'])
+
+    def on_stats(stats):
+        latest['search'] = stats.to_dict()
+
+    def put(item):
+        # Wait for the response to catch up, unless the client has gone away
+        while not closed.is_set():
+            try:
+                pending.put(item, timeout=PROGRESS_INTERVAL)
+                return
+            except queue.Full:
+                pass
+
+    def on_equivalent(equivalent, allowed):
+        counts['generated'] += 1
+        if allowed:
+            counts['kept'] += 1
+        if allowed or show_unfiltered:
+            put(('formula', (equivalent._str(), allowed)))
+
+    def search():
+        stats = SearchStats(on_stats, PROGRESS_INTERVAL)
+        computed = []
+
+        def compute():
+            computed.append(True)
+            return collect_equivalences(formula, operators, complexity, depth, timeout, limit, subprocess, cache, memo,
+                                        on_equivalent=on_equivalent, cancel=cancel, stats=stats, **options)
+
+        if results is None:
+            equivalents, filtered, finished, error = compute()
+        else:
+            try:
+                equivalents, filtered, finished, error = results.get_or_compute(key, compute, cacheable=is_complete)
+            except Exception as e:
+                equivalents, filtered, finished, error = [], [], True, e
+        if not computed:
+            # Another request searched, so its result is replayed as if it had been found here
+            kept = set(filtered)
+            for equivalent in equivalents:
+                on_equivalent(equivalent, equivalent in kept)
+            stats.generated = len(equivalents)
+            stats.finish()
+        put(('done', dict(snapshot(), finished=finished, truncated=limit is not None and len(filtered) >= limit,
+                          error=None if error is None else str(error))))
+
+    yield format_event('start', {'formula': formula, 'unreachable': sorted(check_dependencies(operators))})
+
+    thread = threading.Thread(target=search, name='translator-stream', daemon=True)
+    thread.start()
+    try:
+        sent = snapshot()
+        summary = None
+        while summary is None:
+            try:
+                kind, payload = pending.get(timeout=PROGRESS_INTERVAL)
+            except queue.Empty:
+                current = snapshot()
+                if current != sent:
+                    sent = current
+                    yield format_event('progress', sent)
+                continue
+
+            # Send everything already waiting, up to a batch, in one event
+            batch = {'filtered': [], 'unfiltered': []}
+            size = 0
+            while True:
+                if kind == 'done':
+                    summary = payload
+                    break
+                text, allowed = payload
+                if allowed:
+                    batch['filtered'].append(text)
+                if show_unfiltered:
+                    batch['unfiltered'].append(text)
+                size += 1
+                if size >= BATCH_SIZE:
+                    break
+                try:
+                    kind, payload = pending.get_nowait()
+                except queue.Empty:
+                    break
+
+            if size:
+                sent = snapshot()
+                yield format_event('formulae', dict(batch, **sent))
+        yield format_event('done', summary)
+    finally:
+        # Stop the search if the client went away before it ended, unless other requests
+        # are waiting for its result
+        closed.set()
+        if results is None or not results.waiting(key):
+            cancel.cancel()
@@ -7,20 +7,69 @@ Run python3 web_interface.py from command line to run, and then open http://127.
 
 
 
-from flask import Flask, request, render_template
-import threading
-from ..Equivalence_Applier.filter import filter_equivalences
-from ..Equivalence_Applier.applier import apply_equivalences
-from ..command_line import check_dependencies, parse_command
+from flask import Flask, Response, request, render_template, jsonify, url_for
+from ..command_line import check_dependencies, parse_command, collect_equivalences
+from ..batch import ALL_OPERATORS, parse_record, validate_record, read_records
+from ..Equivalence_Applier.applier import SearchStats
+from ..Equivalence_Applier.cache import ClosureCache, RenamingMemo
+from ..Formula.parser import parse_formula
+from .jobs import JobManager, QueueFull, DEFAULT_MAX_QUEUED
+from .streaming import format_event, stream_equivalences
+from .result_cache import ResultCache, DEFAULT_MAX_ENTRIES, DEFAULT_TTL, request_key, is_complete
+from .server import serve, worker_count
+import argparse
+import logging
 import os
 
 
-def create_app():
+logger = logging.getLogger(__name__)
+
+# Values used for the fields a job submitted to the API leaves out, as in translator_batch
+JOB_DEFAULTS = {
+    'operators': ALL_OPERATORS,
+    'complexity': 2.0,
+    'depth': 2,
+    'timeout': 10.0,
+    'limit': None,
+    'show_unfiltered': False,
+}
+
+# Seconds a client is asked to wait before submitting again when the job queue is full
+RETRY_AFTER = 5
+
+# Error of the job API routes when the application is served without it
+JOB_API_OFF = "Error: The job API is turned off. Launch with a single worker and without --no-job-api to use it."
+
+# Formulae every worker transforms when it starts in production mode, before any request
+WARM_UP = [dict(JOB_DEFAULTS, formula="A <-> B")]
+
+
+def create_app(subprocess=False, cache=None, memo=None, job_workers=None, max_queued_jobs=DEFAULT_MAX_QUEUED, results=None, warm=(), job_api=True):
     '''
     Creates and configures the Flask application.
 
+    Args:
+        subprocess (bool): Run each search in a child process that is killed when it times out,
+            instead of cancelling it cooperatively in the request thread.
+        cache (ClosureCache): Optional on-disk cache that completed searches are stored in
+            and read back from.
+        memo (RenamingMemo): In-memory memo shared by all requests, which also answers for
+            formulae differing only in their variable names. By default a new one.
+        job_workers (int): The number of jobs submitted to the job API that run at once, by
+            default the number of CPUs.
+        max_queued_jobs (int): The number of jobs that may wait for a worker before further
+            submissions are refused.
+        results (ResultCache): Cache of the results of the form, which also makes identical
+            requests made at the same time share one search. By default a new one.
+        warm (list): Records, as read by translator_batch, of formulae transformed before the
+            application is returned, which fills the memo and the tables the search builds as
+            it goes, so that the first requests are not slower than the rest.
+        job_api (bool): Whether to serve the job API. Its jobs are kept in this process, so
+            an application served by several worker processes must be created without it.
+
     Returns:
-        Flask: The configured Flask application.
+        Flask: The configured Flask application, with its JobManager as app.jobs, or None
+            without the job API, and its ResultCache as app.results.
     '''
     
     base_dir = os.path.abspath(os.path.dirname(__file__))
@@ -30,10 +79,44 @@ def create_app():
     static_dir = os.path.join(base_dir, 'static')
     
     app = Flask(__name__, template_folder=template_dir, static_folder=static_dir)
+
+    if memo is None:
+        memo = RenamingMemo()
+    if results is None:
+        results = ResultCache()
+    app.results = results
+
+    def run_job(record, cancel, progress):
+        # The search of every job runs in a child process, so that jobs run in parallel
+        # and a cancelled job stops straight away
+        formula, operators, complexity, depth, show_unfiltered, timeout = validate_record(record)
+        stats = SearchStats(lambda stats: progress(stats.to_dict()))
+        equivalents, filtered_equivalents, finished, error = collect_equivalences(formula, operators, complexity, depth, timeout, record['limit'],
+                                                                                  True, cache, memo, cancel=cancel, stats=stats)
+        if error is not None:
+            raise error
+
+        result = {
+            'unreachable': sorted(check_dependencies(operators)),
+            'generated': len(equivalents),
+            'filtered': [eq._str() for eq in filtered_equivalents],
+            'finished': finished,
+        }
+        if show_unfiltered:
+            result['unfiltered'] = [eq._str() for eq in equivalents]
+        return result
+
+    jobs = JobManager(run_job, job_workers, max_queued_jobs) if job_api else None
+    app.jobs = jobs
+
+    for record in warm:
+        formula, operators, complexity, depth, _, timeout = validate_record(record)
+        equivalents, _, finished, _ = collect_equivalences(formula, operators, complexity, depth, timeout, record['limit'], False, cache, memo)
+        logger.debug("Warmed up with %d equivalences of %s%s", len(equivalents), formula, "" if finished else " before timing out")
     
-    print(f"Base directory: {base_dir}")
-    print(f"Template directory: {template_dir}")
-    print(f"Static directory: {static_dir}")
+    logger.debug("Base directory: %s", base_dir)
+    logger.debug("Template directory: %s", template_dir)
+    logger.debug("Static directory: %s", static_dir)
     
     @app.route('/', methods=['GET', 'POST'])
 
@@ -65,35 +148,32 @@ def create_app():
             if unreachable:
                 warning_message = f"Warning: The following operators might not always be reachable: {', '.join(unreachable)}."
 
-            # Prepare to store the result or any exception that might occur
-            result = []
-            exception = []
-
-            def run_apply_equivalences():
-                '''
-                Run the equivalence application function in a separate thread.
-                Stores the result in the 'result' list or any exception in the 'exception' list.
-                '''
-                
-                try:
-                    result.append(apply_equivalences(formula, complexity, depth))
-                except Exception as e:
-                    exception.append(e)
-
-            # Run the equivalence application in a separate thread with a timeout
-            thread = threading.Thread(target=run_apply_equivalences)
-            thread.start()
-            thread.join(timeout)
+            # An empty limit means no limit
+            limit = request.form.get("limit", "").strip()
+            try:
+                limit = int(limit) if limit else None
+            except ValueError:
+                return render_template('index.html', error="Error: Result limit must be an integer.", warning=warning_message)
 
-            if thread.is_alive():
-                # Render the form with a timeout error if the operation takes too long
-                return render_template('index.html', error=f"Timeout: Equivalence generation took longer than {timeout} seconds.", warning=warning_message)
+            # Run the equivalence generation with a timeout, after which it is cancelled and the
+            # results found so far are kept. Identical requests share the search, and its result
+            # is kept for the next one if the search ran to completion.
+            key = request_key(formula, operators, complexity, depth, timeout, limit)
+            equivalents, filtered_equivalents, finished, error = results.get_or_compute(
+                key, lambda: collect_equivalences(formula, operators, complexity, depth, timeout, limit, subprocess, cache, memo),
+                cacheable=is_complete)
 
-            if exception:
+            if error is not None:
                 # Render the form with an error message if an exception occurred
-                return render_template('index.html', error=f"An error occurred: {exception[0]}", warning=warning_message)
+                return render_template('index.html', error=f"An error occurred: {error}", warning=warning_message)
 
-            equivalents = result[0]
+            timeout_message = None
+            if not finished:
+                # Report the timeout, along with any partial results
+                timeout_message = f"Timeout: Equivalence generation took longer than {timeout} seconds."
+                if not equivalents:
+                    return render_template('index.html', error=timeout_message, warning=warning_message)
+                timeout_message += f" Showing the {len(equivalents)} equivalences generated so far."
 
             if show_unfiltered:
                 # Show unfiltered results if requested
@@ -101,35 +181,198 @@ def create_app():
             else:
                 unfiltered_results = None
 
-            # Filter the equivalences based on the selected operators
-            filtered_equivalents = filter_equivalences(equivalents, operators)
-
             if len(filtered_equivalents) == 0:
                 # Render the form with a message if no results are found after filtering
-                return render_template('index.html', error="No equivalent statements generated after filtering.", warning=warning_message, unfiltered=unfiltered_results)
+                return render_template('index.html', error=timeout_message or "No equivalent statements generated after filtering.", warning=warning_message, unfiltered=unfiltered_results)
 
             # Render the form with the filtered and unfiltered results
             filtered_results = [eq._str() for eq in filtered_equivalents]
-            return render_template('index.html', filtered=filtered_results, unfiltered=unfiltered_results, warning=warning_message)
+            return render_template('index.html', error=timeout_message, filtered=filtered_results, unfiltered=unfiltered_results, warning=warning_message)
 
         # Render the form for GET requests
         return render_template('index.html')
 
 
+    @app.route('/stream')
+    def stream():
+        '''
+        Stream the results of a transformation as Server-Sent Events while the search runs.
+        Takes the fields of the form as query parameters, as an EventSource can only make
+        GET requests. The page uses it in place of posting the form, so it shares the form's
+        result cache: a cached result is replayed, and identical requests share one search.
+
+        Returns:
+            - A text/event-stream response, whose events are described in the streaming module.
+        '''
+
+        raw_command = f'transform "{request.args.get("formula")}" {request.args.get("operators")} {request.args.get("complexity")} {request.args.get("depth")} {request.args.get("show_unfiltered")} {request.args.get("timeout")}'
+        limit = request.args.get("limit", "").strip()
+        try:
+            formula, operators, complexity, depth, show_unfiltered, timeout = parse_command(raw_command)
+            try:
+                limit = int(limit) if limit else None
+            except ValueError:
+                raise ValueError("Result limit must be an integer.")
+        except ValueError as e:
+            # Sent as an event, as the browser does not pass the body of an error response on
+            events = [format_event('error', {'error': f"Error: {e}"})]
+        else:
+            events = stream_equivalences(formula, operators, complexity, depth, show_unfiltered, timeout, limit, subprocess, cache, memo, results)
+
+        return Response(events, mimetype='text/event-stream', headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+
+    @app.route('/stats')
+    def stats():
+        '''
+        Report the hits and misses of the caches and the state of the job queue.
+
+        Returns:
+            - A JSON object with the statistics of the result cache, the renaming memo, the
+              on-disk cache if there is one, and the jobs if the job API is served.
+        '''
+
+        return jsonify(results=results.stats(), memo=memo.stats(),
+                       cache=None if cache is None else cache.stats(), jobs=None if jobs is None else jobs.stats())
+
+
+    @app.route('/jobs', methods=['GET', 'POST'])
+    def submit_job():
+        '''
+        Handle the job API.
+        - GET: Returns the number of workers, the queue limit and the number of jobs in each state.
+        - POST: Queues a transformation given as a JSON object with a "formula" and any of
+          "operators", "complexity", "depth", "timeout", "limit" and "show_unfiltered".
+
+        Returns:
+            - The queued job with status 202, 400 if the request or its formula is invalid, 503 if the
+              queue is full, or 404 if the job API is turned off.
+        '''
+
+        if jobs is None:
+            return jsonify(error=JOB_API_OFF), 404
+        if request.method == 'GET':
+            return jsonify(jobs.stats())
+
+        try:
+            record = parse_record(request.get_json(silent=True), JOB_DEFAULTS)
+            validate_record(record)
+            # The formula is parsed now so that a syntax error is refused rather than queued
+            parse_formula(record['formula'])
+        except ValueError as e:
+            return jsonify(error=f"Error: {e}"), 400
+
+        try:
+            job = jobs.submit(record, record['timeout'])
+        except QueueFull as e:
+            return jsonify(error=f"Error: {e}"), 503, {'Retry-After': str(RETRY_AFTER)}
+
+        logger.debug("Queued job %s for %s", job['id'], record['formula'])
+        return jsonify(job), 202, {'Location': url_for('job', job_id=job['id'])}
+
+
+    @app.route('/jobs/<job_id>', methods=['GET', 'DELETE'])
+    def job(job_id):
+        '''
+        Handle a single job of the job API.
+        - GET: Returns the job, with its result once it has ended.
+        - DELETE: Cancels the job if it is queued or running, keeping any results found so
+          far, or forgets it if it has ended.
+
+        Returns:
+            - The job, or 404 if there is no such job or the job API is turned off.
+        '''
+
+        if jobs is None:
+            return jsonify(error=JOB_API_OFF), 404
+        if request.method == 'GET':
+            snapshot = jobs.get(job_id)
+        else:
+            snapshot = jobs.delete(job_id)
+        if snapshot is None:
+            return jsonify(error=f"Error: No job with id {job_id}."), 404
+        return jsonify(snapshot)
+
+
     return app
 
 
-def run_web_interface():
+def run_web_interface(argv=None):
     '''
     Runs the web interface application.
 
-    This function creates the Flask app and runs it on localhost
-    with debugging enabled. It's designed to be called from the
-    command line or as an entry point.
+    By default this function creates the Flask app and runs it on localhost
+    with debugging enabled. With --production it is served by preforked
+    worker processes instead, with debugging off. It's designed to be called
+    from the command line or as an entry point.
+
+    Args:
+        argv (list): The command line arguments, by default sys.argv[1:].
     '''
-    app = create_app()
-    print(f"Template folder: {app.template_folder}")  # Debug print
-    app.run(host='127.0.0.1', port=8080, debug=True)
+    parser = argparse.ArgumentParser(prog='translator_launch', description="Run the equivalence applier web interface.")
+    parser.add_argument('--host', default='127.0.0.1', help="Address to listen on (default: 127.0.0.1)")
+    parser.add_argument('--port', type=int, default=8080, help="Port to listen on (default: 8080)")
+    parser.add_argument('--production', action='store_true',
+                        help="Serve with preforked worker processes and debugging off, instead of the development server")
+    parser.add_argument('--workers', type=int, default=None,
+                        help="Number of worker processes in production mode (default: number of CPUs with --no-job-api, otherwise 1). "
+                             "Each worker keeps its own jobs, so more than one needs --no-job-api")
+    parser.add_argument('--warm', default=None,
+                        help="File of formulae, in the format of translator_batch, each worker transforms when it starts in production mode")
+    parser.add_argument('--no-cache', action='store_true', help="Neither read nor store results in the on-disk cache")
+    parser.add_argument('--cache-dir', default=None,
+                        help="Directory of the on-disk cache (default: $TRANSLATOR_CACHE_DIR or ~/.cache/translator_AryD05)")
+    parser.add_argument('--job-workers', type=int, default=None,
+                        help="Number of jobs of the job API run at once (default: number of CPUs, shared out between the workers)")
+    parser.add_argument('--no-job-api', action='store_true',
+                        help="Do not serve the job API, so that production mode can run more than one worker")
+    parser.add_argument('--max-queued-jobs', type=int, default=DEFAULT_MAX_QUEUED,
+                        help=f"Number of jobs that may wait for a worker before more are refused (default: {DEFAULT_MAX_QUEUED})")
+    parser.add_argument('--result-cache-size', type=int, default=DEFAULT_MAX_ENTRIES,
+                        help=f"Number of results of the form kept in memory (default: {DEFAULT_MAX_ENTRIES})")
+    parser.add_argument('--result-ttl', type=float, default=DEFAULT_TTL,
+                        help=f"Seconds a result of the form is kept in memory for (default: {DEFAULT_TTL:g})")
+    parser.add_argument('--verbose', action='store_true', help="Log debugging messages to standard error")
+    arguments = parser.parse_args(argv)
+    if arguments.verbose:
+        logging.basicConfig(level=logging.DEBUG, format="%(name)s: %(message)s")
+
+    cache = None if arguments.no_cache else ClosureCache(arguments.cache_dir)
+    job_workers = arguments.job_workers
+
+    def build_app(warm=()):
+        return create_app(cache=cache, job_workers=job_workers, max_queued_jobs=arguments.max_queued_jobs,
+                          results=ResultCache(arguments.result_cache_size, arguments.result_ttl), warm=warm,
+                          job_api=not arguments.no_job_api)
+
+    if not arguments.production:
+        app = build_app()
+        logger.debug("Template folder: %s", app.template_folder)
+        app.run(host=arguments.host, port=arguments.port, debug=True)
+        return
+
+    # The warm-up formulae are checked before any worker starts, so a mistake stops the launch
+    warm = list(WARM_UP)
+    if arguments.warm is not None:
+        with open(arguments.warm) as lines:
+            for record in read_records(lines, JOB_DEFAULTS):
+                try:
+                    if 'error' in record:
+                        raise ValueError(record['error'])
+                    validate_record(record)
+                except ValueError as e:
+                    parser.error(f"{arguments.warm}, line {record['line']}: {e}")
+                warm.append(record)
+
+    try:
+        workers = worker_count(arguments.workers, stateful=not arguments.no_job_api)
+    except ValueError as e:
+        parser.error(f"{e} Pass --no-job-api to serve with more than one worker." if arguments.workers > 1 else str(e))
+    cpus = os.cpu_count() or 1
+    if job_workers is None:
+        job_workers = max(1, cpus // workers)
+    serve(lambda: build_app(warm), arguments.host, arguments.port, workers)
+
 
 if __name__ == '__main__':
-    run_web_interface()
\ No newline at end of file
+    run_web_interface()
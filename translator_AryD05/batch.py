@@ -0,0 +1,293 @@
+'''
+This module provides the translator_batch command, which generates and filters equivalences
+for a whole file of formulae, such as the guarantees of a Spectra specification, in one
+process launch.
+
+Each line of the input is either a formula, transformed with the options given on the
+command line, or a JSON object with a "formula" and any of "operators", "complexity",
+"depth", "timeout", "limit" and "show_unfiltered" to override them for that formula. Blank
+lines and lines starting with # are skipped. The formulae are spread over a pool of worker
+processes and one JSON object is written per formula as soon as it is done, so results come
+out in the order they finish; each carries the line number of its formula.
+'''
+
+
+
+import argparse
+import json
+import logging
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+from typing import Iterable, Iterator, Optional, TextIO
+from .command_line import parse_command, collect_equivalences, check_dependencies, add_search_options, search_options, format_cache_stats
+from .Equivalence_Applier.cache import ClosureCache, RenamingMemo
+
+
+# Operators used when none are given, so that nothing is filtered out
+ALL_OPERATORS = '!,&,|,->,<->,X,F,G,U,R,1,0'
+
+# Fields a JSON input line may set, and the type each is converted to
+RECORD_FIELDS = {
+    'operators': str,
+    'complexity': float,
+    'depth': int,
+    'timeout': float,
+    'limit': int,
+    'show_unfiltered': bool,
+}
+
+# Formulae handed to the pool ahead of the results written, per worker process
+QUEUE_DEPTH = 4
+
+# Caches of the current process, set up by _initialise_worker
+_cache = None
+_memo = None
+
+
+def _field_value(name: str, value):
+    # Convert a JSON value to the type of a field of RECORD_FIELDS, refusing values that
+    # would only convert by losing their meaning, such as "false" as a bool or 2.7 as an int
+    kind = RECORD_FIELDS[name]
+    if kind is bool:
+        if isinstance(value, bool):
+            return value
+    elif kind is not str and isinstance(value, bool):
+        pass
+    elif kind is int and isinstance(value, float):
+        if value.is_integer():
+            return int(value)
+    else:
+        try:
+            return kind(value)
+        except (TypeError, ValueError):
+            pass
+    raise ValueError(f"invalid value for {name}: {value!r}")
+
+
+def parse_record(fields, defaults: dict) -> dict:
+    '''
+    Read a formula given as a JSON object, with the fields of RECORD_FIELDS it sets.
+
+    @param fields: The decoded JSON object
+    @param defaults: The value of each of RECORD_FIELDS used when the object does not set it
+    @return: A dictionary with the formula and every field of RECORD_FIELDS
+    @raise ValueError: If the object has no formula, unknown fields or values of the wrong type
+    '''
+
+    if not isinstance(fields, dict) or not isinstance(fields.get('formula'), str):
+        raise ValueError("expected a JSON object with a \"formula\" string")
+    unknown = set(fields) - set(RECORD_FIELDS) - {'formula'}
+    if unknown:
+        raise ValueError(f"unknown fields {', '.join(sorted(unknown))}")
+
+    record = dict(defaults)
+    for name, value in fields.items():
+        if name == 'operators' and isinstance(value, list):
+            value = ','.join(value)
+        if name == 'formula' or value is None:
+            record[name] = value
+        else:
+            record[name] = _field_value(name, value)
+    return record
+
+
+def validate_record(record: dict) -> tuple:
+    '''
+    Check the fields of a record the same way as a transform command.
+
+    @param record: A record produced by read_records or parse_record
+    @return: The tuple (formula, operators, complexity, depth, show_unfiltered, timeout) of parse_command
+    @raise ValueError: If any field is invalid
+    '''
+
+    show_unfiltered = 'y' if record['show_unfiltered'] else 'n'
+    return parse_command(f'transform "{record["formula"]}" {record["operators"]} {record["complexity"]} '
+                         f'{record["depth"]} {show_unfiltered} {record["timeout"]}')
+
+
+def read_records(lines: Iterable[str], defaults: dict) -> Iterator[dict]:
+    '''
+    Read the formulae to transform from the lines of a batch file.
+
+    @param lines: The lines of the input
+    @param defaults: The value of each of RECORD_FIELDS used when a line does not set it
+    @return: An iterator over dictionaries with the line number, formula and every field of
+             RECORD_FIELDS, or with an error if the line cannot be read
+    '''
+
+    for number, line in enumerate(lines, 1):
+        line = line.strip()
+        if not line or line.startswith('#'):
+            continue
+
+        if not line.startswith('{'):
+            yield dict(defaults, line=number, formula=line)
+            continue
+
+        try:
+            record = parse_record(json.loads(line), defaults)
+        except ValueError as e:
+            yield {'line': number, 'formula': None, 'error': f"Invalid input line: {e}"}
+            continue
+        record['line'] = number
+        yield record
+
+
+def _initialise_worker(use_cache: bool, cache_dir: Optional[str]):
+    # Every process keeps its own memo, and its own connections to the shared on-disk cache
+    global _cache, _memo
+    _cache = ClosureCache(cache_dir) if use_cache else None
+    _memo = RenamingMemo()
+
+
+def transform_record(record: dict, options: dict) -> dict:
+    '''
+    Generate and filter the equivalences of one formula of a batch.
+
+    @param record: A record produced by read_records
+    @param options: Keyword arguments for iter_equivalences, plus subprocess
+    @return: A dictionary describing the result, ready to be written as JSON
+    '''
+
+    start = time.perf_counter()
+    result = {'line': record['line'], 'formula': record['formula']}
+    if 'error' in record:
+        return dict(result, error=record['error'], seconds=0.0)
+
+    try:
+        formula, operators, complexity, depth, _, timeout = validate_record(record)
+    except ValueError as e:
+        return dict(result, error=str(e), seconds=round(time.perf_counter() - start, 6))
+
+    options = dict(options)
+    subprocess = options.pop('subprocess', False)
+    equivalents, filtered, finished, error = collect_equivalences(formula, operators, complexity, depth, timeout, record['limit'],
+                                                                  subprocess, _cache, _memo, **options)
+
+    result.update({
+        'operators': sorted(operators),
+        'complexity': complexity,
+        'depth': depth,
+        'unreachable': sorted(check_dependencies(operators)),
+        'generated': len(equivalents),
+        'filtered': [eq._str() for eq in filtered],
+        'finished': finished,
+        'error': None if error is None else str(error),
+        'seconds': round(time.perf_counter() - start, 6),
+    })
+    if record['show_unfiltered']:
+        result['unfiltered'] = [eq._str() for eq in equivalents]
+    return result
+
+
+def run_batch(lines: Iterable[str], output: TextIO, defaults: dict, options: dict, jobs: int = 1,
+              use_cache: bool = True, cache_dir: Optional[str] = None) -> dict:
+    '''
+    Transform every formula of a batch, writing one JSON line per formula to output as
+    soon as it is done.
+
+    @param lines: The lines of the input
+    @param output: The stream results are written to
+    @param defaults: The value of each of RECORD_FIELDS used when a line does not set it
+    @param options: Keyword arguments for iter_equivalences, plus subprocess
+    @param jobs: The number of worker processes; 1 transforms the formulae in this process
+    @param use_cache: Whether to read and store results in the on-disk cache
+    @param cache_dir: The directory of the on-disk cache, or None for the default
+    @return: A summary with the number of formulae, errors and timeouts and the elapsed seconds
+    '''
+
+    summary = {'formulae': 0, 'errors': 0, 'timeouts': 0}
+    start = time.perf_counter()
+
+    def write(result):
+        summary['formulae'] += 1
+        if result['error'] is not None:
+            summary['errors'] += 1
+        elif not result['finished']:
+            summary['timeouts'] += 1
+        output.write(json.dumps(result) + '\n')
+        output.flush()
+
+    records = read_records(lines, defaults)
+    if jobs <= 1:
+        _initialise_worker(use_cache, cache_dir)
+        for record in records:
+            write(transform_record(record, options))
+    else:
+        with ProcessPoolExecutor(max_workers=jobs, initializer=_initialise_worker, initargs=(use_cache, cache_dir)) as pool:
+            # Only a few formulae per worker are queued at a time, so a long input is read
+            # as the results are written rather than all at once
+            pending = set()
+            for record in records:
+                pending.add(pool.submit(transform_record, record, options))
+                if len(pending) >= jobs * QUEUE_DEPTH:
+                    done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        write(future.result())
+            while pending:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    write(future.result())
+
+    summary['seconds'] = round(time.perf_counter() - start, 6)
+    return summary
+
+
+def build_batch_argument_parser() -> argparse.ArgumentParser:
+    '''
+    Build the parser for the translator_batch command line.
+
+    @return: An ArgumentParser taking the input file, the defaults for each formula and the search options
+    '''
+
+    parser = argparse.ArgumentParser(prog='translator_batch', description="Generate and filter equivalences for a file of formulae.")
+    parser.add_argument('input', help="File with one formula or JSON object per line, or - for standard input")
+    parser.add_argument('--output', default='-', help="File to write the JSON results to, or - for standard output")
+    parser.add_argument('--jobs', type=int, default=None, help="Number of formulae transformed at once (default: number of CPUs)")
+    parser.add_argument('--operators', default=ALL_OPERATORS, help="Default comma-separated allowed operators")
+    parser.add_argument('--complexity', type=float, default=2.0, help="Default complexity threshold")
+    parser.add_argument('--depth', type=int, default=2, help="Default maximum depth")
+    parser.add_argument('--timeout', type=float, default=10.0, help="Default timeout in seconds for each formula")
+    parser.add_argument('--show-unfiltered', action='store_true', help="Include the unfiltered equivalences in the results")
+    add_search_options(parser)
+    return parser
+
+
+def run_batch_command():
+    '''
+    Runs the batch command from the command line. It's designed to be called as an entry
+    point for the translator_batch command. The summary is printed to standard error, so
+    that standard output only holds results.
+    '''
+
+    # Operator lists such as ->,& start with '-', so they are shielded as in parse_arguments
+    shielded = [f' {arg}' if arg.startswith('-') and len(arg) > 1 and not arg.startswith('--') else arg for arg in sys.argv[1:]]
+    arguments = build_batch_argument_parser().parse_args(shielded)
+    if arguments.verbose:
+        logging.basicConfig(level=logging.DEBUG, format="%(name)s: %(message)s")
+
+    defaults = {'operators': arguments.operators.strip(), 'complexity': arguments.complexity, 'depth': arguments.depth,
+                'timeout': arguments.timeout, 'limit': arguments.limit, 'show_unfiltered': arguments.show_unfiltered}
+    options = dict(search_options(arguments), subprocess=arguments.subprocess)
+    jobs = arguments.jobs or os.cpu_count() or 1
+
+    source = sys.stdin if arguments.input == '-' else open(arguments.input)
+    output = sys.stdout if arguments.output == '-' else open(arguments.output, 'w')
+    try:
+        summary = run_batch(source, output, defaults, options, jobs, not arguments.no_cache, arguments.cache_dir)
+    finally:
+        if source is not sys.stdin:
+            source.close()
+        if output is not sys.stdout:
+            output.close()
+
+    print(f"Transformed {summary['formulae']} formulae in {summary['seconds']:.2f} seconds with {jobs} jobs: "
+          f"{summary['errors']} errors, {summary['timeouts']} timed out", file=sys.stderr)
+    if arguments.cache_stats and not arguments.no_cache:
+        print(format_cache_stats(ClosureCache(arguments.cache_dir)), file=sys.stderr)
+
+
+if __name__ == "__main__":
+    run_batch_command()
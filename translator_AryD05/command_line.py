@@ -4,14 +4,23 @@ This module provides a command-line tool for generating and filtering equivalenc
 
 
 
+import argparse
 import cmd
-import threading
+import json
+import logging
+import time
 from itertools import chain, combinations
-from .Equivalence_Applier.filter import filter_equivalences
-from .Equivalence_Applier.applier import apply_equivalences
+from .Equivalence_Applier.filter import is_allowed, operator_mask
+from .Equivalence_Applier.applier import iter_equivalences, CancelToken, RuleProfile, SearchStats, STATS_INTERVAL, ENGINES, REWRITING_MODES
+from .Equivalence_Applier.isolation import iter_equivalences_in_subprocess
+from .Equivalence_Applier.egraph import EXTRACTIONS
+from .Equivalence_Applier.cache import ClosureCache, RenamingMemo
 import sys
 
 
+logger = logging.getLogger(__name__)
+
+
 def powerset(iterable):
     s = list(iterable)
     return chain.from_iterable(combinations(s, r) for r in range(len(s)+1))
@@ -99,11 +108,178 @@ def parse_command(command: str) -> tuple:
     return formula, operators, complexity, depth, show_unfiltered == 'y', timeout
 
 
+def collect_equivalences(formula: str, operators: set, complexity: float, depth: int, timeout: float, limit: int = None, subprocess: bool = False, cache: ClosureCache = None, memo: RenamingMemo = None, on_equivalent=None, cancel: CancelToken = None, **options) -> tuple:
+    '''
+    Generate and filter equivalences for at most timeout seconds, keeping whatever has been
+    found when the time runs out. The search is cancelled at the timeout, so nothing keeps
+    running afterwards. Formulae that print the same as an earlier one, such as
+    (A & B) & C and A & (B & C), are only reported once.
+
+    @param formula: The formula string to transform
+    @param operators: The set of allowed operator symbols
+    @param complexity: The complexity threshold
+    @param depth: The maximum depth to apply equivalences
+    @param timeout: The number of seconds to allow the search
+    @param limit: Stop once this many filtered equivalences have been found, or None for no limit
+    @param subprocess: Run the search in a child process that is killed at the timeout,
+                       instead of stopping it cooperatively in this process
+    @param cache: Optional ClosureCache to look the search up in first, and to store it in
+                  when it runs to completion
+    @param memo: Optional RenamingMemo, consulted before the cache and kept in step with it,
+                 that also answers for formulae differing only in their variable names
+    @param on_equivalent: Optional function called with each formula as it is generated, and
+                          whether it uses only allowed operators
+    @param cancel: Optional CancelToken to stop the search with, from another thread, used
+                   instead of a new token whose deadline is the timeout
+    @param options: Further keyword arguments for iter_equivalences
+    @return: A tuple (equivalents, filtered, finished, error) of the formulae generated that
+             print differently from each other, those using only allowed operators, whether
+             the search ended within the timeout, and the exception raised by the search or None
+    '''
+
+    # The search keeps structurally different formulae apart, and the stores are given all
+    # of them, but only the first formula printing as each text is reported
+    generated = []
+    printed = set()
+    equivalents = []
+    filtered = []
+    if cancel is None:
+        cancel = CancelToken(timeout)
+    allowed_mask = operator_mask(operators)
+
+    # The memo is checked first, as it is cheaper and matches renamed formulae too
+    stores = [store for store in (memo, cache) if store is not None]
+
+    try:
+        cached = None
+        for index, store in enumerate(stores):
+            cached = store.get(formula, complexity, depth, allowed_operators=operators, **options)
+            if cached is not None:
+                logger.debug("Found %d equivalences of %s in %r", len(cached), formula, store)
+                for earlier in stores[:index]:
+                    earlier.put(formula, complexity, depth, cached, allowed_operators=operators, **options)
+                break
+        if cached is not None:
+            search = iter(cached)
+        elif subprocess:
+            search = iter_equivalences_in_subprocess(formula, complexity, depth, cancel=cancel, allowed_operators=operators, **options)
+        else:
+            search = iter_equivalences(formula, complexity, depth, allowed_operators=operators, cancel=cancel, **options)
+        complete = True
+        for equivalent in search:
+            generated.append(equivalent)
+            text = str(equivalent)
+            if text in printed:
+                continue
+            printed.add(text)
+            equivalents.append(equivalent)
+            allowed = is_allowed(equivalent, allowed_mask)
+            if on_equivalent is not None:
+                on_equivalent(equivalent, allowed)
+            if allowed:
+                filtered.append(equivalent)
+                if limit is not None and len(filtered) >= limit:
+                    complete = False
+                    break
+    except Exception as e:
+        return equivalents, filtered, True, e
+
+    if cached is not None:
+        stats = options.get('stats')
+        if stats is not None:
+            stats.generated = len(generated)
+            stats.finish()
+        return equivalents, filtered, True, None
+
+    # Only a search that ran to the end is stored, so that a hit always gives every formula
+    finished = not cancel.cancelled
+    if finished and complete:
+        for store in stores:
+            store.put(formula, complexity, depth, generated, allowed_operators=operators, **options)
+    return equivalents, filtered, finished, None
+
+
+# Output formats of the transform command: human-readable text, or one JSON object per line
+OUTPUT_FORMATS = ('text', 'jsonl')
+
+
 class EquivalenceApplier(cmd.Cmd):
     intro = "Welcome to the equivalence applier. Type help or ? to list commands.\n"
     prompt = "(equivalence) "
+
+    def __init__(self, engine='bfs', rewriting='product', extraction='all', count=None, workers=None, limit=None, subprocess=False, cache=None, memo=None, format='text', profile_rules=False, progress=None, **kwargs):
+        '''
+        @param engine: The search engine passed to iter_equivalences, 'bfs', 'egraph' or 'goal'
+        @param rewriting: The rewriting mode used by the bfs engine
+        @param extraction: How the egraph engine extracts formulae: 'all', 'smallest' or 'best'
+        @param count: The number of formulae extracted with 'smallest', the original included
+        @param workers: The number of processes the bfs engine expands the search across
+        @param limit: Stop after this many filtered equivalences, or None for no limit
+        @param subprocess: Run each search in a child process that is killed on timeout
+        @param cache: Optional ClosureCache that completed searches are stored in and read back from
+        @param memo: RenamingMemo kept for the session, by default a new one
+        @param format: 'text' to print results for people, or 'jsonl' to stream one JSON object
+                       per formula as it is generated, followed by a summary object
+        @param profile_rules: Profile each equivalence during the search and print a table of
+                              the calls, changes, new formulae and time of each. The caches are
+                              not used, so that the search always runs.
+        @param progress: Seconds between reports of the progress of the search, written as a
+                         line on standard error, or as progress objects in jsonl format; None
+                         for no reports
+        '''
+
+        super().__init__(**kwargs)
+        self.engine = engine
+        self.rewriting = rewriting
+        self.extraction = extraction
+        self.count = count
+        self.workers = workers
+        self.limit = limit
+        self.subprocess = subprocess
+        self.cache = cache
+        self.memo = memo if memo is not None else RenamingMemo()
+        self.format = format
+        self.profile_rules = profile_rules
+        self.profile = None
+        self.progress = progress
+
+    def search(self, formula, operators, complexity, depth, timeout, on_equivalent=None) -> tuple:
+        '''
+        Run collect_equivalences with the options of the session, profiling the equivalences
+        into self.profile and reporting progress if asked to.
+
+        @return: The tuple returned by collect_equivalences
+        '''
+
+        options = {'rewriting': self.rewriting, 'engine': self.engine, 'extraction': self.extraction,
+                   'count': self.count, 'workers': self.workers}
+        if self.progress is not None:
+            options['stats'] = SearchStats(self.report_progress, self.progress)
+        if not self.profile_rules:
+            return collect_equivalences(formula, operators, complexity, depth, timeout, self.limit, self.subprocess,
+                                        self.cache, self.memo, on_equivalent, **options)
+        self.profile = RuleProfile()
+        return collect_equivalences(formula, operators, complexity, depth, timeout, self.limit, self.subprocess,
+                                    on_equivalent=on_equivalent, counter=self.profile, **options)
     
 
+    def report_progress(self, stats: SearchStats):
+        '''
+        Report the progress of a search: in text format, by rewriting one line of standard
+        error in place when it is a terminal, or writing a line per report when it is not;
+        in jsonl format, as a {"type": "progress", ...} object.
+
+        @param stats: The SearchStats of the search
+        '''
+
+        if self.format == 'jsonl':
+            print(json.dumps(dict({'type': 'progress'}, **stats.to_dict())), flush=True)
+        elif sys.stderr.isatty():
+            end = '\n' if stats.done else ''
+            print(f"\r\033[K{format_progress(stats)}", end=end, file=sys.stderr, flush=True)
+        else:
+            print(format_progress(stats), file=sys.stderr, flush=True)
+
     def do_transform(self, arg):
         '''
         Generate and filter equivalences.
@@ -117,6 +293,10 @@ class EquivalenceApplier(cmd.Cmd):
         if not arg:
             print("Please provide arguments. Use 'help transform' for usage information.")
             return
+
+        if self.format == 'jsonl':
+            self.transform_jsonl(arg)
+            return
         
         try:
             formula, operators, complexity, depth, show_unfiltered, timeout = parse_command(arg)
@@ -129,37 +309,23 @@ class EquivalenceApplier(cmd.Cmd):
             print(f"Error in command: {str(e)}")
             return
 
-        result = []
-        exception = []
-
-        def run_apply_equivalences():
-            try:
-                result.append(apply_equivalences(formula, complexity, depth))
-            except Exception as e:
-                exception.append(e)
+        equivalents, filtered_equivalents, finished, error = self.search(formula, operators, complexity, depth, timeout)
 
-        thread = threading.Thread(target=run_apply_equivalences)
-        thread.start()
-        thread.join(timeout)
-
-        if thread.is_alive():
-            print(f"Timeout: Equivalence generation took longer than {timeout} seconds. Consider reducing complexity and/or depth.")
+        if error is not None:
+            print(f"An error occurred: {error}")
             return
 
-        if exception:
-            print(f"An error occurred: {exception[0]}")
-            return
-
-        equivalents = result[0]
+        if not finished:
+            print(f"Timeout: Equivalence generation took longer than {timeout} seconds. Consider reducing complexity and/or depth.")
+            if not equivalents:
+                return
+            print(f"Showing the {len(equivalents)} equivalences generated so far.")
 
         if show_unfiltered:
             print(f"\nBefore filtering: {len(equivalents)}")
             for eq in equivalents:
                 print(eq._str())
 
-        # Filter equivalences
-        filtered_equivalents = filter_equivalences(equivalents, operators)
-
         if len(filtered_equivalents) == 0:
             print(f"No equivalent statements generated after filtering. Consider increasing complexity and/or depth, or increasing the list of available operators.")
         else:
@@ -167,6 +333,61 @@ class EquivalenceApplier(cmd.Cmd):
             for eq in filtered_equivalents:
                 print(eq._str())
 
+        if self.profile is not None:
+            print()
+            print(format_rule_profile(self.profile))
+
+
+    def transform_jsonl(self, arg):
+        '''
+        Generate and filter equivalences, printing one JSON object per line as each formula is
+        generated: {"type": "formula", ...} for every formula using only allowed operators, or
+        for every formula if show_unfiltered is set, then one {"type": "summary", ...} with the
+        counts, the time taken and whether the search timed out or stopped at the limit. When
+        profiling, a {"type": "profile", "rules": [...]} object comes before the summary.
+
+        @param arg: The arguments of the transform command
+        '''
+
+        start = time.perf_counter()
+
+        def emit(record):
+            print(json.dumps(record), flush=True)
+
+        try:
+            formula, operators, complexity, depth, show_unfiltered, timeout = parse_command(arg)
+        except ValueError as e:
+            emit({'type': 'summary', 'error': str(e)})
+            return
+
+        generated = 0
+
+        def on_equivalent(equivalent, allowed):
+            nonlocal generated
+            generated += 1
+            if allowed or show_unfiltered:
+                emit({'type': 'formula', 'index': generated - 1, 'formula': equivalent._str(), 'allowed': allowed,
+                      'seconds': round(time.perf_counter() - start, 6)})
+
+        equivalents, filtered_equivalents, finished, error = self.search(formula, operators, complexity, depth, timeout, on_equivalent)
+
+        if self.profile is not None:
+            emit({'type': 'profile', 'rules': self.profile.report()})
+        emit({
+            'type': 'summary',
+            'formula': formula,
+            'operators': sorted(operators),
+            'complexity': complexity,
+            'depth': depth,
+            'unreachable': sorted(check_dependencies(operators)),
+            'generated': len(equivalents),
+            'filtered': len(filtered_equivalents),
+            'timed_out': not finished,
+            'truncated': self.limit is not None and len(filtered_equivalents) >= self.limit,
+            'error': None if error is None else str(error),
+            'seconds': round(time.perf_counter() - start, 6),
+        })
+
 
     def do_exit(self, arg):
         '''
@@ -180,6 +401,140 @@ class EquivalenceApplier(cmd.Cmd):
         return True
     
 
+def add_search_options(parser: argparse.ArgumentParser):
+    '''
+    Add the options controlling the equivalence search, shared by translator_transform and
+    translator_batch, to a parser.
+
+    @param parser: The ArgumentParser to add the options to
+    '''
+
+    parser.add_argument('--engine', choices=ENGINES, default='bfs',
+                        help="bfs enumerates equivalent formulae; egraph saturates an e-graph and extracts from it; "
+                             "goal searches best-first towards formulae using only the given operators")
+    parser.add_argument('--rewriting', choices=tuple(REWRITING_MODES), default='product',
+                        help="How the bfs engine rewrites formulae in each step")
+    parser.add_argument('--extraction', choices=EXTRACTIONS, default='all',
+                        help="What the egraph engine extracts: all formulae, the --count smallest, or the best using only the given operators")
+    parser.add_argument('--count', type=int, default=None, help="Number of formulae extracted with --extraction smallest, or found by --engine goal before it stops")
+    parser.add_argument('--workers', type=int, default=None,
+                        help="Number of processes the bfs engine expands each level of the search across")
+    parser.add_argument('--limit', type=int, default=None,
+                        help="Stop once this many equivalences using only the given operators have been found")
+    parser.add_argument('--subprocess', action='store_true',
+                        help="Run the search in a child process that is killed when the timeout expires")
+    parser.add_argument('--no-cache', action='store_true',
+                        help="Neither read nor store results in the on-disk cache")
+    parser.add_argument('--cache-dir', default=None,
+                        help="Directory of the on-disk cache (default: $TRANSLATOR_CACHE_DIR or ~/.cache/translator_AryD05)")
+    parser.add_argument('--cache-stats', action='store_true',
+                        help="Print the hits, misses and size of the on-disk cache when done")
+    parser.add_argument('--verbose', action='store_true',
+                        help="Log debugging messages to standard error")
+
+
+def search_options(arguments: argparse.Namespace) -> dict:
+    '''
+    Collect the options for iter_equivalences from arguments parsed with add_search_options.
+
+    @param arguments: The parsed argparse.Namespace
+    @return: A dictionary of keyword arguments for iter_equivalences
+    '''
+
+    return {'engine': arguments.engine, 'rewriting': arguments.rewriting, 'extraction': arguments.extraction,
+            'count': arguments.count, 'workers': arguments.workers}
+
+
+def format_cache_stats(cache: ClosureCache) -> str:
+    '''
+    Describe the use of an on-disk cache in one line.
+
+    @param cache: The ClosureCache
+    @return: The hits, misses, entries and size of the cache
+    '''
+
+    stats = cache.stats()
+    return (f"Cache: {stats['hits']} hits, {stats['misses']} misses ({stats['hit_rate']:.0%} hit rate), "
+            f"{stats['entries']} entries, {stats['bytes']} bytes in {cache.path}")
+
+
+def format_progress(stats: SearchStats) -> str:
+    '''
+    Describe the progress of a search in one line.
+
+    @param stats: The SearchStats of the search
+    @return: The formulae generated and the rate, the frontier, seen and rejected formulae,
+             the level and complexity being expanded, and the memory estimate, or its peak
+             once the search is done
+    '''
+
+    if stats.done:
+        state, memory = "Done", f"peak ~{stats.peak_memory / 2 ** 20:.1f} MB"
+    else:
+        state, memory = "Searching", f"~{stats.memory / 2 ** 20:.1f} MB"
+    return (f"{state}: {stats.generated} generated ({stats.rate:.0f}/s), {stats.frontier} in frontier, "
+            f"{stats.seen} seen, {stats.rejected} over complexity, level {stats.level}, "
+            f"complexity {stats.complexity}, {memory}, {stats.elapsed:.1f}s")
+
+
+def format_rule_profile(profile: RuleProfile) -> str:
+    '''
+    Lay a rule profile out as a table, slowest equivalence first.
+
+    @param profile: The RuleProfile of a search
+    @return: The table, with the calls, changed formulae, new formulae and milliseconds of each equivalence
+    '''
+
+    rows = profile.report()
+    if not rows:
+        return "Rule profile: no equivalences were called"
+    width = max(len('Rule'), max(len(row['rule']) for row in rows))
+    lines = [f"{'Rule':<{width}}  {'Calls':>8}  {'Changed':>8}  {'New':>8}  {'ms':>10}"]
+    for row in rows:
+        lines.append(f"{row['rule']:<{width}}  {row['calls']:>8}  {row['changed']:>8}  {row['new']:>8}  {row['seconds'] * 1000:>10.2f}")
+    total = sum(row['seconds'] for row in rows)
+    lines.append(f"{'Total':<{width}}  {profile.invoked:>8}  {sum(row['changed'] for row in rows):>8}  "
+                 f"{sum(row['new'] for row in rows):>8}  {total * 1000:>10.2f}")
+    return '\n'.join(lines)
+
+
+def build_argument_parser() -> argparse.ArgumentParser:
+    '''
+    Build the parser for the translator_transform command line.
+
+    @return: An ArgumentParser taking the six transform arguments and the search options
+    '''
+
+    parser = argparse.ArgumentParser(prog='translator_transform', description="Generate and filter equivalences for a formula.")
+    for name in ('formula', 'operators', 'complexity', 'depth', 'show_unfiltered', 'timeout'):
+        parser.add_argument(name)
+    parser.add_argument('--format', choices=OUTPUT_FORMATS, default='text',
+                        help="text prints the results when done; jsonl streams one JSON object per formula, then a summary")
+    parser.add_argument('--progress', action='store_true',
+                        help="Report the progress of the search on standard error, or as progress objects in jsonl format")
+    parser.add_argument('--progress-interval', type=float, default=STATS_INTERVAL,
+                        help=f"Seconds between progress reports (default: {STATS_INTERVAL})")
+    parser.add_argument('--profile-rules', action='store_true',
+                        help="Time each equivalence and count its calls, changes and new formulae, bypassing the cache")
+    add_search_options(parser)
+    return parser
+
+
+def parse_arguments(argv):
+    '''
+    Parse command line arguments. Operator lists such as ->,& start with '-', so arguments
+    that are not --options are shielded from argparse with a leading space.
+
+    @param argv: The command line arguments, without the program name
+    @return: The parsed argparse.Namespace
+    '''
+
+    shielded = [f' {arg}' if arg.startswith('-') and not arg.startswith('--') else arg for arg in argv]
+    arguments = build_argument_parser().parse_args(shielded)
+    arguments.operators = arguments.operators.strip()
+    return arguments
+
+
 def run_transform_command():
     '''
     Runs the transform command from the command line.
@@ -190,21 +545,29 @@ def run_transform_command():
     translator_transform command.
     '''
     
-    if len(sys.argv) != 7:
+    try:
+        arguments = parse_arguments(sys.argv[1:])
+    except SystemExit:
         print("Invalid command format. Check that all arguments are included correctly e.g. transform \"A <-> B\" \\!,&,|,1,0 2.5 3 y 5.0")
         return
 
+    if arguments.profile_rules and arguments.subprocess:
+        print("--profile-rules cannot be combined with --subprocess, as the equivalences must be called in this process")
+        return
+
     try:
-        formula = sys.argv[1]
-        operators = sys.argv[2]
-        complexity = sys.argv[3]
-        depth = sys.argv[4]
-        show_unfiltered = sys.argv[5]
-        timeout = sys.argv[6]
-
-        command = f'transform "{formula}" {operators} {complexity} {depth} {show_unfiltered} {timeout}'
-        cmd = EquivalenceApplier()
+        command = (f'transform "{arguments.formula}" {arguments.operators} {arguments.complexity} '
+                   f'{arguments.depth} {arguments.show_unfiltered} {arguments.timeout}')
+        cache = None if arguments.no_cache else ClosureCache(arguments.cache_dir)
+        if arguments.verbose:
+            logging.basicConfig(level=logging.DEBUG, format="%(name)s: %(message)s")
+        cmd = EquivalenceApplier(limit=arguments.limit, subprocess=arguments.subprocess, cache=cache, format=arguments.format,
+                                 profile_rules=arguments.profile_rules, progress=arguments.progress_interval if arguments.progress else None,
+                                 **search_options(arguments))
         cmd.onecmd(command)
+        if arguments.cache_stats and cache is not None:
+            # Keep standard output to JSON objects in jsonl mode
+            print(format_cache_stats(cache), file=sys.stderr if arguments.format == 'jsonl' else sys.stdout)
     except Exception as e:
         print(f"An error occurred: {e}")
 
@@ -1,9 +1,12 @@
-from Testing.test_structure import test_structure
-from Testing.test_parser import test_parser
-from Testing.test_equivalence_applier import test_equivalence_applier
-from Testing.test_filter import test_filter
-from Testing.test_equivalences import test_equivalences
-from Testing.performance_test import run_performance_tests
+from Testing.test_structure import test_structure, test_hash_consing, test_concurrent_interning, test_cached_measures, test_serialization, test_ac_canonical, test_alpha_normal
+from Testing.test_parser import test_parser, test_parser_cases
+from Testing.test_equivalence_applier import test_equivalence_applier, test_rewriting_modes, test_egraph_engine, test_parallel_expansion, test_iter_equivalences, test_cancellation, test_goal_directed_search, test_ac_rewriting, test_equivalence_index, test_closure_cache, test_renaming_memo, test_rewrite_memo, test_rule_profile, test_search_stats
+from Testing.test_filter import test_filter, test_filter_masks, test_filter_logging
+from Testing.test_equivalences import test_equivalences, test_equivalence_operations
+from Testing.test_command_line import test_batch, test_jsonl_output, test_text_output
+from Testing.test_web_interface import test_job_manager, test_event_stream, test_result_cache, test_worker_count, test_job_api
+from Testing.test_benchmark import test_formula_generator, test_benchmark_comparison
+from Testing.performance_test import run_performance_tests, run_parser_benchmark, run_search_benchmark, run_parallel_benchmark, run_filter_benchmark, run_rewrite_memo_benchmark
 from translator_AryD05.command_line import EquivalenceApplier
 
 
@@ -11,24 +14,108 @@ def main():
     
     input = "A <-> B"
 
+    print("Testing Structure:")
+    test_structure()
+    passed, failed = test_hash_consing()
+    print(f"\nHash-consing Tests - Passed: {passed}, Failed: {failed}")
+    passed, failed = test_concurrent_interning()
+    print(f"\nConcurrent Interning Tests - Passed: {passed}, Failed: {failed}")
+    passed, failed = test_cached_measures()
+    print(f"\nCached Measure Tests - Passed: {passed}, Failed: {failed}")
+    passed, failed = test_serialization()
+    print(f"\nSerialization Tests - Passed: {passed}, Failed: {failed}")
+    passed, failed = test_ac_canonical()
+    print(f"\nAC-normal Form Tests - Passed: {passed}, Failed: {failed}")
+    passed, failed = test_alpha_normal()
+    print(f"\nAlpha-normal Form Tests - Passed: {passed}, Failed: {failed}")
+    print("\n" + "="*50 + "\n")
+
     print("Testing Parser:")  
     test_parser(input)
+    passed, failed = test_parser_cases()
+    print(f"\nParser Tests - Passed: {passed}, Failed: {failed}")
     print("\n" + "="*50 + "\n")
 
     print("Testing Equivalence Applier:")    
     test_equivalence_applier(input)
+    passed, failed = test_rewriting_modes()
+    print(f"\nRewriting Mode Tests - Passed: {passed}, Failed: {failed}")
+    passed, failed = test_egraph_engine()
+    print(f"\nE-graph Engine Tests - Passed: {passed}, Failed: {failed}")
+    passed, failed = test_parallel_expansion()
+    print(f"\nParallel Expansion Tests - Passed: {passed}, Failed: {failed}")
+    passed, failed = test_iter_equivalences()
+    print(f"\nStreaming Tests - Passed: {passed}, Failed: {failed}")
+    passed, failed = test_cancellation()
+    print(f"\nCancellation Tests - Passed: {passed}, Failed: {failed}")
+    passed, failed = test_goal_directed_search()
+    print(f"\nGoal-directed Search Tests - Passed: {passed}, Failed: {failed}")
+    passed, failed = test_ac_rewriting()
+    print(f"\nAC Rewriting Tests - Passed: {passed}, Failed: {failed}")
+    passed, failed = test_equivalence_index()
+    print(f"\nEquivalence Index Tests - Passed: {passed}, Failed: {failed}")
+    passed, failed = test_closure_cache()
+    print(f"\nClosure Cache Tests - Passed: {passed}, Failed: {failed}")
+    passed, failed = test_renaming_memo()
+    print(f"\nRenaming Memo Tests - Passed: {passed}, Failed: {failed}")
+    passed, failed = test_rewrite_memo()
+    print(f"\nRewrite Memo Tests - Passed: {passed}, Failed: {failed}")
+    passed, failed = test_rule_profile()
+    print(f"\nRule Profile Tests - Passed: {passed}, Failed: {failed}")
+    passed, failed = test_search_stats()
+    print(f"\nSearch Statistics Tests - Passed: {passed}, Failed: {failed}")
     print("\n" + "="*50 + "\n")
 
     print("Testing Filter:")
     test_filter(input)
+    passed, failed = test_filter_masks()
+    print(f"\nFilter Mask Tests - Passed: {passed}, Failed: {failed}")
+    passed, failed = test_filter_logging()
+    print(f"\nFilter Logging Tests - Passed: {passed}, Failed: {failed}")
     print("\n" + "="*50 + "\n")
 
     print("Testing Equivalences:")
     passed, failed = test_equivalences()
     print(f"\nEquivalence Tests - Passed: {passed}, Failed: {failed}")
+    passed, failed = test_equivalence_operations()
+    print(f"\nEquivalence Dispatch Tests - Passed: {passed}, Failed: {failed}")
+    print("\n" + "="*50 + "\n")
+
+    print("Testing Command Line:")
+    passed, failed = test_batch()
+    print(f"\nBatch Tests - Passed: {passed}, Failed: {failed}")
+    passed, failed = test_jsonl_output()
+    print(f"\nJSONL Output Tests - Passed: {passed}, Failed: {failed}")
+    passed, failed = test_text_output()
+    print(f"\nText Output Tests - Passed: {passed}, Failed: {failed}")
+    print("\n" + "="*50 + "\n")
+
+    print("Testing Web Interface:")
+    passed, failed = test_job_manager()
+    print(f"\nJob Manager Tests - Passed: {passed}, Failed: {failed}")
+    passed, failed = test_event_stream()
+    print(f"\nEvent Stream Tests - Passed: {passed}, Failed: {failed}")
+    passed, failed = test_result_cache()
+    print(f"\nResult Cache Tests - Passed: {passed}, Failed: {failed}")
+    passed, failed = test_worker_count()
+    print(f"\nWorker Count Tests - Passed: {passed}, Failed: {failed}")
+    passed, failed = test_job_api()
+    print(f"\nJob API Tests - Passed: {passed}, Failed: {failed}")
+    print("\n" + "="*50 + "\n")
+
+    print("Testing Benchmarks:")
+    passed, failed = test_formula_generator()
+    print(f"\nFormula Generator Tests - Passed: {passed}, Failed: {failed}")
+    passed, failed = test_benchmark_comparison()
+    print(f"\nBenchmark Comparison Tests - Passed: {passed}, Failed: {failed}")
     
     print("Performance test:")
     run_performance_tests()
+    run_parser_benchmark()
+    run_search_benchmark()
+    run_parallel_benchmark()
+    run_filter_benchmark()
+    run_rewrite_memo_benchmark()
 
 
 if __name__ == '__main__':